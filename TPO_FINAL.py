@@ -1,8 +1,36 @@
-import json
+import bisect
+import multiprocessing
 import os
-import re
+import pickle
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, datetime
 from functools import reduce
 import log.logger as logger
+import indices.busqueda_productos as busqueda_productos
+import indices.catalogo as catalogo
+import indices.claves_idempotencia as claves_idempotencia
+import indices.resumen_ventas as resumen_ventas
+import indices.stock_bajo as stock_bajo
+import modelos.historial_columnar as historial_columnar
+import modelos.historial_precios as historial_precios
+import modelos.ventas as modelo_ventas
+import negocio.ajustes_precios as ajustes_precios
+import negocio.promociones as promociones
+import negocio.usuarios as reglas_usuarios
+import persistencia.codec as codec
+import persistencia.snapshot as snapshot
+import persistencia.wal as wal
+import persistencia.historial_segmentado as historial_segmentado
+import persistencia.indice_ventas as indice_ventas
+import persistencia.parches as parches
+import persistencia.inventario_csv as inventario_csv
+import persistencia.inventario_particionado as inventario_particionado
+import persistencia.libro_ventas as libro_ventas
 
 # ==============================================================================
 # Definición de Rutas para Archivos JSON 
@@ -12,52 +40,192 @@ RUTA_STOCK = "stock.json"
 RUTA_PRECIOS = "precios.json"
 RUTA_HISTORIAL_VENTAS = "historial_ventas.json"
 RUTA_VENTAS_REALIZADAS = "ventas_realizadas.json"
-
-def cargar_datos(ruta_archivo, tipo_dato_default):
+RUTA_RESUMEN_VENTAS = "resumen_ventas.json"
+# Libro binario del historial (ver persistencia/libro_ventas.py). Se usa solo si existe;
+# se crea con: python -m persistencia.libro_ventas importar historial_ventas.json historial_ventas.libro
+RUTA_LIBRO_VENTAS = "historial_ventas.libro"
+# Historial partido en segmentos con manifiesto (ver persistencia/historial_segmentado.py).
+# También se usa solo si existe; se crea con:
+#   python -m persistencia.historial_segmentado historial_ventas.json historial
+# Una vez creado, los segmentos son el historial: las ventas nuevas se agregan solo ahí y
+# historial_ventas.json y ventas_realizadas.json dejan de escribirse (los totales que
+# daban las ventas realizadas salen del manifiesto).
+RUTA_HISTORIAL_SEGMENTADO = "historial"
+SEGMENTADOS = {
+    RUTA_HISTORIAL_VENTAS: RUTA_HISTORIAL_SEGMENTADO,
+    RUTA_VENTAS_REALIZADAS: RUTA_HISTORIAL_SEGMENTADO,
+}
+# Registro de compras confirmadas que todavía no se volcaron a los archivos de datos
+# (ver persistencia/wal.py). Se vuelca cuando supera este tamaño y al salir.
+RUTA_WAL = "compras.wal"
+# Stock y precios con un archivo por categoría (ver persistencia/inventario_particionado.py).
+# Si existe el directorio se usa en lugar del JSON único; se crea con:
+#   python -m persistencia.inventario_particionado stock.json inventario/stock
+#   python -m persistencia.inventario_particionado precios.json inventario/precios
+# (el JSON único queda renombrado a stock.json.particionado / precios.json.particionado).
+PARTICIONES_INVENTARIO = {
+    RUTA_STOCK: os.path.join("inventario", "stock"),
+    RUTA_PRECIOS: os.path.join("inventario", "precios"),
+}
+# Parches de stock (ver persistencia/parches.py): cada compra agrega solo los productos
+# que cambiaron y el stock completo se reescribe cuando el registro supera este tamaño.
+RUTA_PARCHES_STOCK = parches.ruta_de(RUTA_STOCK)
+MAX_BYTES_PARCHES = 64 * 1024
+PARCHES = {RUTA_STOCK: RUTA_PARCHES_STOCK}
+# Cambios de precio de cada producto a lo largo del tiempo (ver modelos/historial_precios.py).
+RUTA_HISTORIAL_PRECIOS = "historial_precios.json"
+# Reglas de promociones que se aplican al confirmar la compra (ver negocio/promociones.py).
+RUTA_PROMOCIONES = "promociones.json"
+# Claves de idempotencia de las compras ya confirmadas (ver indices/claves_idempotencia.py).
+RUTA_CLAVES_IDEMPOTENCIA = "claves_idempotencia.log"
+# Umbrales de reposición para el reporte de stock bajo (ver indices/stock_bajo.py).
+RUTA_UMBRALES_STOCK = "umbrales_stock.json"
+MAX_BYTES_WAL = 256 * 1024
+
+# Si está activo, los datos de la aplicación se guardan también como snapshot binario
+# (ver persistencia/snapshot.py) y los arranques siguientes evitan parsear el JSON.
+USAR_SNAPSHOTS = True
+
+# Archivos que se guardan en JSON compacto (sin sangría): son los que crecen con cada venta.
+# El resto se sigue guardando legible para poder revisarlo a mano.
+ARCHIVOS_COMPACTOS = {RUTA_HISTORIAL_VENTAS, RUTA_VENTAS_REALIZADAS}
+
+# Archivos más grandes que esto se interpretan en un proceso aparte durante la precarga,
+# para no competir por el GIL con la lectura de los demás archivos.
+# Todos esos archivos comparten un mismo pool de procesos, que se crea la primera vez. Con
+# una sola CPU no hay con quién repartir el trabajo y se interpretan en este proceso.
+UMBRAL_PARSEO_EN_PROCESO = 32 * 1024 * 1024
+MAX_PROCESOS_PARSEO = 2
+_pool_parseo = None
+
+def pool_de_parseo():
+    global _pool_parseo
+    if _pool_parseo is None:
+        # "spawn" funciona igual en Windows y Linux, y el hijo importa el módulo sin leer datos.
+        _pool_parseo = ProcessPoolExecutor(max_workers=MAX_PROCESOS_PARSEO, mp_context=multiprocessing.get_context("spawn"))
+    return _pool_parseo
+
+def decodificar_en_proceso(contenido):
+    """
+    Interpreta el JSON en un proceso del pool y devuelve el resultado ya armado. Si el pool
+    no está disponible o el resultado no se puede pasar de vuelta, se interpreta acá mismo.
+    """
+    global _pool_parseo
+    if (os.cpu_count() or 1) < 2:
+        return codec.decodificar(contenido)
+    try:
+        return pool_de_parseo().submit(codec.decodificar, contenido).result()
+    except (BrokenProcessPool, pickle.PicklingError, OSError, RuntimeError) as e:
+        logger.error(f"No se pudo interpretar el archivo en otro proceso, se interpreta en este: {e}")
+        if _pool_parseo is not None:
+            _pool_parseo.shutdown(wait=False, cancel_futures=True)
+            _pool_parseo = None
+        return codec.decodificar(contenido)
+
+def escribir_json(ruta_archivo, datos, compacto=None):
+    """Escribe `datos` en `ruta_archivo` y devuelve los bytes escritos."""
+    if compacto is None:
+        compacto = ruta_archivo in ARCHIVOS_COMPACTOS
+    contenido = codec.codificar(datos, legible=not compacto)
+    with open(ruta_archivo, 'wb') as archivo:
+        archivo.write(contenido)
+    return contenido
+
+def cargar_datos(ruta_archivo, tipo_dato_default, usar_snapshot=False, decodificar=codec.decodificar):
     """
     Carga datos desde un archivo JSON.
     Si el archivo no existe, devuelve el tipo de dato por defecto (lista o diccionario vacío).
+    Con usar_snapshot=True primero intenta usar la copia binaria, si sigue vigente.
+    El archivo se lee una sola vez y el contenido se interpreta con `decodificar`.
     """
+    if usar_snapshot:
+        datos = snapshot.leer(ruta_archivo)
+        if datos is not None:
+            logger.info(f"Los datos de {ruta_archivo} se cargaron desde el snapshot.")
+            return datos
+
     if not os.path.exists(ruta_archivo):
-        with open(ruta_archivo, 'w', encoding='utf-8') as archivo_nuevo:
-            json.dump(tipo_dato_default, archivo_nuevo, indent=4, ensure_ascii=False)
+        escribir_json(ruta_archivo, tipo_dato_default)
         logger.info(f"El archivo {ruta_archivo} no existía. Se creó con datos por defecto.")
         logger.debug(f"Datos por defecto usados para {ruta_archivo}: {tipo_dato_default}")
         return tipo_dato_default
 
     try:
-        with open(ruta_archivo, 'r', encoding='utf-8') as archivo:
+        with open(ruta_archivo, 'rb') as archivo:
             contenido = archivo.read()
-            if not contenido:
-                logger.debug(f"El archivo {ruta_archivo} estaba vacío. Se usaron datos por defecto: {tipo_dato_default}")
-                return tipo_dato_default
-            archivo.seek(0)
-            datos = json.load(archivo)
-            logger.info(f"Los datos de {ruta_archivo} se cargaron correctamente.")
-            logger.debug(f"Contenido cargado desde {ruta_archivo}: {datos}")
-            return datos
-    except (json.JSONDecodeError, FileNotFoundError) as e:
+        if not contenido:
+            logger.debug(f"El archivo {ruta_archivo} estaba vacío. Se usaron datos por defecto: {tipo_dato_default}")
+            return tipo_dato_default
+        datos = decodificar(contenido)
+        logger.info(f"Los datos de {ruta_archivo} se cargaron correctamente.")
+        logger.debug(f"Se cargaron {len(datos)} elementos desde {ruta_archivo}.")
+        if usar_snapshot:
+            snapshot.escribir(ruta_archivo, datos, contenido)
+        return datos
+    except (ValueError, FileNotFoundError) as e:
+        # ValueError incluye JSON inválido (de json y de orjson) y UTF-8 inválido.
         logger.error(f"No se pudo cargar el archivo {ruta_archivo} o está corrupto. Se usarán datos por defecto.")
         logger.debug(f"Excepción: {e}")
         print(f"⚠️ No se pudo cargar el archivo {ruta_archivo} o está corrupto. Se usarán datos por defecto.")
-        with open(ruta_archivo, 'w', encoding='utf-8') as archivo_nuevo:
-            json.dump(tipo_dato_default, archivo_nuevo, indent=4, ensure_ascii=False)
+        escribir_json(ruta_archivo, tipo_dato_default)
         return tipo_dato_default
 
-def guardar_datos(ruta_archivo, datos):
+# Por archivo, qué datos se guardaron en el último guardado exitoso y cómo quedó el archivo
+# (tamaño y fecha de modificación). Al salir solo se hace snapshot de los datos que siguen
+# siendo lo que tiene el archivo (ver ContextoDatos.actualizar_snapshots).
+_ultimos_guardados = {}
+
+def coincide_con_lo_guardado(ruta_archivo, datos):
+    """True si `datos` es lo último que se guardó bien en `ruta_archivo` y el archivo no cambió desde entonces."""
+    if ruta_archivo not in _ultimos_guardados or not os.path.exists(ruta_archivo):
+        return False
+    estado = os.stat(ruta_archivo)
+    return _ultimos_guardados[ruta_archivo] == (id(datos), estado.st_size, estado.st_mtime_ns)
+
+def guardar_datos(ruta_archivo, datos, compacto=None):
     """
     Guarda los datos proporcionados en un archivo JSON.
+    Por defecto los archivos de ARCHIVOS_COMPACTOS se escriben sin sangría.
     """
     try:
-        with open(ruta_archivo, 'w', encoding='utf-8') as archivo:
-            json.dump(datos, archivo, indent=4, ensure_ascii=False)
+        if hasattr(datos, "guardar_cambios"):
+            # Datos particionados: se reescriben solo las partes que cambiaron.
+            datos.guardar_cambios()
+            contenido = b""
+        else:
+            _ultimos_guardados.pop(ruta_archivo, None)
+            contenido = escribir_json(ruta_archivo, datos, compacto)
+            estado = os.stat(ruta_archivo)
+            _ultimos_guardados[ruta_archivo] = (id(datos), estado.st_size, estado.st_mtime_ns)
+
+        # Lo que había en el registro de parches ya quedó incluido en lo que se guardó.
+        # El snapshot queda desactualizado (su firma ya no coincide) y se rehace una sola vez
+        # al salir, con ContextoDatos.actualizar_snapshots, en vez de en cada guardado.
+        if ruta_archivo in PARCHES:
+            parches.descartar(PARCHES[ruta_archivo])
 
         logger.info(f"Los datos de {ruta_archivo} se guardaron correctamente.")
-        logger.debug(f"Contenido guardado en {ruta_archivo}: {datos}")
+        logger.debug(f"Se escribieron {len(contenido)} bytes en {ruta_archivo}.")
+        return True
     except IOError as e:
         logger.error(f"Error: No se pudieron guardar los datos en {ruta_archivo}.")
         logger.debug(f"Excepción al guardar {ruta_archivo}: {e}")
         print(f"❌ Error: No se pudieron guardar los datos en {ruta_archivo}.")
+        return False
+
+def exportar_datos_legibles(ruta_archivo, ruta_destino=None):
+    """
+    Exporta un archivo de datos con sangría, para leerlo o editarlo a mano.
+    Por defecto escribe al lado del original, con sufijo "_legible".
+    """
+    if ruta_destino is None:
+        base, extension = os.path.splitext(ruta_archivo)
+        ruta_destino = f"{base}_legible{extension}"
+    with open(ruta_archivo, 'rb') as archivo:
+        datos = codec.decodificar(archivo.read())
+    escribir_json(ruta_destino, datos, compacto=False)
+    logger.info(f"Se exportó {ruta_archivo} en formato legible a {ruta_destino}.")
+    return ruta_destino
 
 def registrar_usuario_en_memoria(email, nombre, contraseña, usuarios, sesion_activa, ruta_guardado=RUTA_USUARIOS):
     rol = "cliente"
@@ -74,11 +242,203 @@ def registrar_usuario_en_memoria(email, nombre, contraseña, usuarios, sesion_ac
 # ===============
 # Carga de Datos
 # ===============
-usuarios = cargar_datos(RUTA_USUARIOS, {})
-stock = cargar_datos(RUTA_STOCK, {})
-precios = cargar_datos(RUTA_PRECIOS, {})
-historial_ventas = cargar_datos(RUTA_HISTORIAL_VENTAS, [])
-ventas_realizadas = cargar_datos(RUTA_VENTAS_REALIZADAS, [])
+ARCHIVOS_DE_DATOS = {
+    "usuarios": (RUTA_USUARIOS, dict),
+    "stock": (RUTA_STOCK, dict),
+    "precios": (RUTA_PRECIOS, dict),
+    "historial_ventas": (RUTA_HISTORIAL_VENTAS, list),
+    "ventas_realizadas": (RUTA_VENTAS_REALIZADAS, list),
+    "resumen_ventas": (RUTA_RESUMEN_VENTAS, resumen_ventas.crear_resumen),
+    "historial_precios": (RUTA_HISTORIAL_PRECIOS, dict),
+}
+
+# Con historiales muy grandes, el historial se puede tener en memoria por columnas
+# (ver modelos/historial_columnar.py) en vez de leerlo del disco a medida que se pide.
+# Se activa con la variable de entorno TPO_HISTORIAL_COLUMNAR=1.
+HISTORIAL_COLUMNAR = os.environ.get("TPO_HISTORIAL_COLUMNAR") == "1"
+
+def convertir_historial(historial):
+    if HISTORIAL_COLUMNAR:
+        return historial_columnar.HistorialColumnar.desde_formato_disco(historial)
+    return modelo_ventas.ventas_desde_disco(historial)
+
+# Si no, el historial no se carga en memoria: contexto.historial_ventas lee las ventas del
+# JSON por el índice de posiciones y agrega las nuevas al final del archivo sin reescribirlo
+# (ver persistencia/indice_ventas.py).
+def se_guarda_al_agregar(historial_ventas):
+    """True si el historial escribe cada venta al agregarla (en disco o segmentado): no se guarda entero."""
+    return isinstance(historial_ventas, (indice_ventas.HistorialEnDisco, historial_segmentado.HistorialSegmentado))
+
+def resumen_al_dia(resumen, historial, ruta):
+    """
+    Devuelve el resumen de ventas, o uno reconstruido desde el historial (y guardado en
+    `ruta`) si no registra la misma cantidad de ventas: por ejemplo si no existía el archivo
+    o si el programa se cortó entre guardar una venta y guardar el resumen.
+    """
+    if resumen_ventas.al_dia(resumen, historial):
+        return resumen
+    logger.info(f"El resumen de ventas tiene {resumen.get('cantidad_ventas', 0)} ventas y el historial "
+                f"{len(historial)}: se reconstruye.")
+    resumen = resumen_ventas.reconstruir(historial)
+    guardar_datos(ruta, resumen)
+    return resumen
+
+# Datos que en memoria se guardan como registros compactos en vez de diccionarios
+# (ver modelos/ventas.py). Al guardarlos, el codec los vuelve a pasar al formato del JSON.
+CONVERTIR_AL_CARGAR = {
+    "historial_ventas": convertir_historial,
+    "historial_precios": historial_precios.HistorialPrecios.desde_formato_disco,
+}
+
+class ContextoDatos:
+    """
+    Agrupa los datos de la aplicación y carga cada archivo recién la primera vez
+    que se lo pide (por ejemplo contexto.stock), así importar el módulo no lee nada.
+    """
+
+    def __init__(self, archivos=ARCHIVOS_DE_DATOS):
+        self._archivos = dict(archivos)
+        self._pendientes = {}
+        self._segmentos = {}
+        self._lock_segmentos = threading.Lock()
+        self.tiempos_carga = {}
+
+    def __getattr__(self, nombre):
+        # Solo se llama cuando el atributo todavía no existe, es decir, cuando no se cargó.
+        if nombre.startswith("_") or nombre not in self._archivos:
+            raise AttributeError(nombre)
+        futuro = self._pendientes.pop(nombre, None)
+        datos = futuro.result() if futuro else self._cargar(nombre)
+        setattr(self, nombre, datos)
+        return datos
+
+    def _segmentado(self, nombre):
+        directorio = SEGMENTADOS.get(self.ruta(nombre))
+        return directorio if directorio and historial_segmentado.existe(directorio) else None
+
+    def abrir_segmentos(self, directorio):
+        """
+        El historial segmentado de `directorio` (None si no existe). Se abre una sola vez y
+        se comparte: abrirlo vuelve a leer el segmento activo, y dos instancias que agregan
+        ventas se pisarían el manifiesto.
+        """
+        with self._lock_segmentos:
+            if not historial_segmentado.existe(directorio):
+                self._segmentos.pop(directorio, None)
+                return None
+            if directorio not in self._segmentos:
+                self._segmentos[directorio] = historial_segmentado.HistorialSegmentado(directorio)
+            return self._segmentos[directorio]
+
+    def guardar_segmentos(self):
+        """Escribe el manifiesto de los historiales segmentados abiertos que tengan ventas nuevas."""
+        return sum(segmentos.guardar() for directorio, segmentos in self._segmentos.items()
+                   if historial_segmentado.existe(directorio))
+
+    def _cargar(self, nombre):
+        ruta, tipo_default = self._archivos[nombre]
+        particion = PARTICIONES_INVENTARIO.get(ruta)
+        if particion and inventario_particionado.existe(particion):
+            # Solo se listan las categorías: cada una se lee la primera vez que se usa.
+            self.tiempos_carga[nombre] = 0.0
+            datos = inventario_particionado.DiccionarioParticionado(particion)
+            if ruta in PARCHES and parches.aplicar(PARCHES[ruta], datos):
+                # Parches que quedaron de antes de particionar: se pasan a la partición.
+                datos.guardar_cambios()
+                parches.descartar(PARCHES[ruta])
+            return datos
+        directorio = self._segmentado(nombre)
+        if directorio:
+            # El historial se lee de los segmentos a medida que se pide; las ventas
+            # realizadas no se cargan, sus totales están en el manifiesto.
+            self.tiempos_carga[nombre] = 0.0
+            return self.abrir_segmentos(directorio) if ruta == RUTA_HISTORIAL_VENTAS else []
+        if nombre == "historial_ventas" and not HISTORIAL_COLUMNAR:
+            self.tiempos_carga[nombre] = 0.0
+            return indice_ventas.HistorialEnDisco(ruta)
+        decodificar = codec.decodificar
+        if os.path.exists(ruta) and os.path.getsize(ruta) > UMBRAL_PARSEO_EN_PROCESO:
+            decodificar = decodificar_en_proceso
+
+        inicio = time.perf_counter()
+        datos = cargar_datos(ruta, tipo_default(), usar_snapshot=USAR_SNAPSHOTS, decodificar=decodificar)
+        if ruta in PARCHES:
+            parches.aplicar(PARCHES[ruta], datos)
+        if nombre in CONVERTIR_AL_CARGAR:
+            datos = CONVERTIR_AL_CARGAR[nombre](datos)
+        if nombre == "resumen_ventas" and "historial_ventas" in self._archivos:
+            datos = resumen_al_dia(datos, self.historial_ventas, ruta)
+        self.tiempos_carga[nombre] = time.perf_counter() - inicio
+        logger.info(f"'{nombre}' cargado desde {ruta} en {self.tiempos_carga[nombre]:.3f} s.")
+        return datos
+
+    def precargar(self, esperar=False):
+        """
+        Empieza a cargar en paralelo todos los archivos que todavía no se pidieron.
+        Sin esperar=True vuelve enseguida: el primer acceso a cada dato espera solo su archivo.
+        Devuelve los tiempos de carga por archivo (completos solo si se esperó).
+        """
+        nombres = [n for n in self._archivos if not self.esta_cargado(n) and n not in self._pendientes]
+        if nombres:
+            hilos = ThreadPoolExecutor(max_workers=len(nombres), thread_name_prefix="carga")
+            for nombre in nombres:
+                self._pendientes[nombre] = hilos.submit(self._cargar, nombre)
+            hilos.shutdown(wait=esperar)
+
+        if esperar:
+            for nombre in list(self._pendientes):
+                getattr(self, nombre)
+        return dict(self.tiempos_carga)
+
+    def esta_cargado(self, nombre):
+        return nombre in self.__dict__
+
+    def ruta(self, nombre):
+        return self._archivos[nombre][0]
+
+    def guardar_cargados(self):
+        """
+        Guarda solo los datos que se llegaron a cargar: lo que no se leyó no cambió. El
+        historial en disco o segmentado ya escribió sus ventas al agregarlas.
+        Devuelve True si todos se guardaron bien.
+        """
+        guardados = [guardar_datos(self.ruta(nombre), getattr(self, nombre))
+                     for nombre in self._archivos if self.esta_cargado(nombre) and not self._segmentado(nombre)
+                     and not se_guarda_al_agregar(getattr(self, nombre))]
+        return all(guardados)
+
+    def actualizar_snapshots(self):
+        """
+        Rehace los snapshots de los datos cargados cuyo archivo cambió durante la sesión.
+        Se llama al salir, cuando todo ya está guardado. Solo se escriben los de datos que se
+        guardaron bien y cuyo archivo no cambió después: si el último guardado falló, lo que
+        hay en memoria no es lo que tiene el archivo. Devuelve cuántos se escribieron.
+        """
+        if not USAR_SNAPSHOTS:
+            return 0
+        escritos = 0
+        for nombre in self._archivos:
+            ruta = self.ruta(nombre)
+            if (not self.esta_cargado(nombre) or self._segmentado(nombre) or snapshot.vigente(ruta)
+                    or not os.path.exists(ruta)):
+                continue
+            datos = getattr(self, nombre)
+            # El inventario particionado no usa el archivo y el historial en disco no está en
+            # memoria; con parches pendientes el archivo todavía no tiene lo que hay en memoria.
+            if (hasattr(datos, "guardar_cambios") or se_guarda_al_agregar(datos)
+                    or (ruta in PARCHES and os.path.exists(PARCHES[ruta])) or not coincide_con_lo_guardado(ruta, datos)):
+                continue
+            snapshot.escribir(ruta, datos)
+            escritos += 1
+        return escritos
+
+contexto = ContextoDatos()
+
+def __getattr__(nombre):
+    # Mantiene `from TPO_FINAL import usuarios` funcionando sin cargar nada al importar.
+    if nombre in ARCHIVOS_DE_DATOS:
+        return getattr(contexto, nombre)
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
 
 sesion_activa = {
     "email": None,
@@ -95,20 +455,18 @@ def pedir_input_con_cancelar(mensaje):
 
 # VALIDACIONES PARA INICIO DE SESION Y REGISTRO
 def es_email_valido(email):
-    # Expresión regular para validar el formato del email
-    patron_email = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(patron_email, email) is not None and email not in usuarios
+    # Los patrones están compilados en negocio/usuarios.py
+    return reglas_usuarios.formato_email_valido(email) and email not in contexto.usuarios
 
 def es_contraseña_valida(contraseña):
     # Valida: 6 caracteres o mas, debe contener, mayus, caracter especial
-    patron_contraseña = r'^(?=.*[A-Z])(?=.*\d)(?=.*[@$!%*?&()])[A-Za-z\d@$!%*?&()]{6,}$'
-    return re.match(patron_contraseña, contraseña) is not None
+    return reglas_usuarios.contraseña_valida(contraseña)
 
 def es_email_registrado(email):
-    return email in usuarios
+    return email in contexto.usuarios
 
 def es_contraseña_correcta(email, contraseña):
-    return usuarios[email]["contraseña"] == contraseña
+    return contexto.usuarios[email]["contraseña"] == contraseña
 
 def obtener_email_valido():
     while True:
@@ -118,7 +476,7 @@ def obtener_email_valido():
 
         email = email_input.lower()
 
-        if email in usuarios:
+        if email in contexto.usuarios:
             print("⚠️ Ya existe un usuario registrado con ese email. Intentá con otro.")
         elif not es_email_valido(email):
             print("⚠️ El email debe contener '@' y '.'. Intentá de nuevo.")
@@ -194,7 +552,7 @@ def crear_usuario(stock, precios, sesion_activa, historial_ventas, ventas_realiz
             logger.info(f"Registro cancelado por el usuario {email} al ingresar la contraseña.")
             return
 
-        registrar_usuario_en_memoria(email, nombre, contraseña, usuarios, sesion_activa)
+        registrar_usuario_en_memoria(email, nombre, contraseña, contexto.usuarios, sesion_activa)
 
         logger.info(f"Usuario {email} redirigido al menú cliente después del registro.")
 
@@ -224,18 +582,18 @@ def iniciar_sesion():
             return
 
         sesion_activa["email"] = email
-        sesion_activa["rol"] = usuarios[email]["rol"]
+        sesion_activa["rol"] = contexto.usuarios[email]["rol"]
 
-        logger.info(f"Inicio de sesión exitoso: {email} (rol: {usuarios[email]['rol']})")
+        logger.info(f"Inicio de sesión exitoso: {email} (rol: {contexto.usuarios[email]['rol']})")
 
         print()
-        print(f"✅ ¡Bienvenido/a, {usuarios[email]['nombre']}!")
-        print(f"Rol: {usuarios[email]['rol'].capitalize()}")
+        print(f"✅ ¡Bienvenido/a, {contexto.usuarios[email]['nombre']}!")
+        print(f"Rol: {contexto.usuarios[email]['rol'].capitalize()}")
 
-        if usuarios[email]["rol"] == "administrador":
-            menu_administrador(stock, precios, usuarios, historial_ventas)
+        if contexto.usuarios[email]["rol"] == "administrador":
+            menu_administrador(contexto.stock, contexto.precios, contexto.usuarios, historial_para_admin())
         else:
-            menu_cliente(stock, precios, sesion_activa, historial_ventas, ventas_realizadas, email)
+            menu_cliente(contexto.stock, contexto.precios, sesion_activa, contexto.historial_ventas, contexto.ventas_realizadas, email)
 
     except Exception as e:
         logger.error(f"Error inesperado durante el inicio de sesión: {e}")
@@ -244,7 +602,7 @@ def iniciar_sesion():
 def cerrar_sesion():
     try:
         if sesion_activa["email"]:
-            nombre_usuario = usuarios.get(sesion_activa["email"], {}).get("nombre", sesion_activa["email"])
+            nombre_usuario = contexto.usuarios.get(sesion_activa["email"], {}).get("nombre", sesion_activa["email"])
             print(f"\n🔒 Sesión cerrada para {nombre_usuario}.")
             logger.info(f"Sesión cerrada para {sesion_activa['email']}.")
             sesion_activa["email"] = None
@@ -317,6 +675,7 @@ def mostrar_categorias_disponibles(lista_categorias):
         print(f"{i + 1}) {cat_key.capitalize()}")
     print(f"\n{len(lista_categorias) + 1}) ✅ Finalizar compra y ver carrito")
     print(f"{len(lista_categorias) + 2}) ❌ Cancelar compra y volver al menú")
+    print(f"{len(lista_categorias) + 3}) 🔎 Buscar un producto por nombre")
 
 def interpretar_opcion_categoria(opcion, lista_categorias):
     if 1 <= opcion <= len(lista_categorias):
@@ -325,6 +684,8 @@ def interpretar_opcion_categoria(opcion, lista_categorias):
         return "FINALIZAR_COMPRA"
     elif opcion == len(lista_categorias) + 2:
         return "CANCELAR_COMPRA_TOTAL"
+    elif opcion == len(lista_categorias) + 3:
+        return "BUSCAR_PRODUCTO"
     else:
         print("⚠️ Opción de categoría inválida. Intentá de nuevo.")
         return None
@@ -406,6 +767,45 @@ def seleccionar_producto_para_compra(categoria_key, productos_en_categoria, prec
         except ValueError:
             print("⚠️ Entrada inválida. Por favor, ingresá un número.")
 
+def mostrar_resultados_busqueda(resultados, stock, precios):
+    for i, (categoria, producto) in enumerate(resultados):
+        clave_precio = catalogo.buscar_producto(precios, categoria, producto)
+        precio_unitario = precios[categoria][clave_precio] if clave_precio is not None else 0.0
+        print(f"  {i + 1}) {producto.capitalize()} - {categoria.capitalize()} (Stock: {stock[categoria][producto]}, Precio: ${precio_unitario:.2f})")
+
+def buscar_producto_para_compra(indice_busqueda, stock, precios):
+    """
+    Pide parte del nombre de un producto (o de su categoría) y muestra los productos con
+    stock que coinciden. Devuelve (categoria, producto) elegidos o (None, None) para volver.
+    """
+    texto = pedir_input_con_cancelar("\n🔎 Escribí el comienzo del nombre del producto (o Enter para volver): ")
+    if texto is None:
+        return None, None
+
+    resultados = busqueda_productos.buscar(indice_busqueda, texto, stock)
+    if not resultados:
+        print(f"ℹ️ No hay productos con stock que coincidan con '{texto}'.")
+        return None, None
+
+    mostrar_resultados_busqueda(resultados, stock, precios)
+    mostrar_opcion_volver(len(resultados) + 1)
+
+    while True:
+        try:
+            opcion_str = pedir_input_con_cancelar("  → Elegí el producto (o Enter para volver a categorías): ")
+            if opcion_str is None:
+                return None, None
+            opcion = int(opcion_str)
+
+            if 1 <= opcion <= len(resultados):
+                return resultados[opcion - 1]
+            elif opcion == len(resultados) + 1:
+                return None, None
+            else:
+                print("⚠️ Opción de producto inválida. Intentá de nuevo.")
+        except ValueError:
+            print("⚠️ Entrada inválida. Por favor, ingresá un número.")
+
 def validar_cantidad(cantidad_str, stock_para_agregar):
     try:
         if cantidad_str is None:
@@ -448,13 +848,7 @@ def calcular_subtotal(cantidad, precio_unitario):
     return cantidad * precio_unitario
 
 def armar_item_para_historial(categoria, producto, cantidad, precio_unitario, subtotal):
-    return {
-        "categoria": categoria,
-        "producto": producto,
-        "cantidad": cantidad,
-        "precio_unitario": precio_unitario,
-        "subtotal": subtotal
-    }
+    return modelo_ventas.ItemVenta(categoria, producto, cantidad, precio_unitario, subtotal)
 
 def calcular_costo_total(items_historial):
     return reduce(lambda acc, item: acc + item['subtotal'], items_historial, 0.0)
@@ -472,9 +866,10 @@ def mostrar_pie_resumen(costo_total):
     print(f"{'Costo Total:':<58} ${costo_total:.2f}")
     print("-" * 70)
 
-def mostrar_resumen_carrito_modificado(carrito_actual_cliente):
+def mostrar_resumen_carrito_modificado(carrito_actual_cliente, reglas_promociones=None):
     """
-    Muestra el resumen del carrito y calcula el costo total.
+    Muestra el resumen del carrito y calcula el costo total, con los descuentos de las
+    promociones vigentes como ítems de precio negativo.
     """
     if not carrito_actual_cliente:
         print("El carrito está vacío.")
@@ -482,6 +877,7 @@ def mostrar_resumen_carrito_modificado(carrito_actual_cliente):
 
     mostrar_encabezado()
     items_para_historial = []
+    lineas = []
 
     for clave_carrito, detalles_item in sorted(carrito_actual_cliente.items()):
         categoria, producto_original = clave_carrito.split(":", 1)
@@ -497,9 +893,17 @@ def mostrar_resumen_carrito_modificado(carrito_actual_cliente):
         items_para_historial.append(
             armar_item_para_historial(categoria, producto_original, cantidad, precio_unitario, subtotal)
         )
+        lineas.append((categoria, producto_original, cantidad, precio_unitario))
 
         mostrar_linea_producto(producto_display, categoria_display, cantidad, precio_unitario, subtotal)
 
+    if reglas_promociones is None:
+        reglas_promociones = promociones.cargar(RUTA_PROMOCIONES)
+    for nombre, monto in promociones.aplicar(reglas_promociones, lineas):
+        logger.debug(f"Promoción '{nombre}' aplicada: -${monto:.2f}")
+        items_para_historial.append(promociones.item_de_descuento(nombre, monto))
+        print(f"- 🏷️ {nombre:<60} | -${monto:<8.2f}")
+
     costo_total_venta = calcular_costo_total(items_para_historial) if items_para_historial else 0.0
     logger.debug(f"Costo total del carrito para resumen: ${costo_total_venta:.2f}")
     
@@ -524,6 +928,7 @@ def actualizar_stock(carrito_actual, stock):
                     f"Stock negativo detectado para '{producto_original}' en '{categoria}'. Ajustado a 0."
                 )
                 stock[categoria][producto_original] = 0
+            stock_bajo.actualizar(stock, categoria, producto_original)
         else:
             print(f"⚠️ ADVERTENCIA CRÍTICA: El producto '{producto_original}' de la categoría '{categoria}' no fue encontrado en el stock para actualizar.")
             logger.error(
@@ -540,24 +945,256 @@ def confirmar_compra():
         print("⚠️ Por favor, ingresá 's' para sí o 'n' para no.")
 
 # VENTAS
-def procesar_venta(email_cliente, items_para_historial, costo_total_venta, historial_ventas, ventas_realizadas, guardar_datos_func, rutas):
+def siguiente_id_venta(historial_ventas):
+    """Las ventas viejas no tienen id: en ese caso se numera por posición."""
+    if hasattr(historial_ventas, "ultimo_id"):
+        # Libro o historial segmentado: el último id sale sin leer la última venta.
+        return (historial_ventas.ultimo_id() or len(historial_ventas)) + 1
+    if historial_ventas and "id_venta" in historial_ventas[-1]:
+        return historial_ventas[-1]["id_venta"] + 1
+    return len(historial_ventas) + 1
+
+def armar_venta(email_cliente, items_para_historial, costo_total_venta, historial_ventas):
+    return modelo_ventas.Venta(
+        id_venta=siguiente_id_venta(historial_ventas),
+        fecha=datetime.now().isoformat(timespec="seconds"),
+        cliente_email=email_cliente,
+        items=items_para_historial,
+        costo_total=costo_total_venta,
+    )
+
+def armar_venta_realizada(venta):
+    return {"id_venta": venta["id_venta"], "fecha": venta["fecha"], "subtotal": venta["costo_total"]}
+
+def historial_en_segmentos(rutas):
+    """True si el historial está segmentado: entonces es el único lugar donde se guardan las ventas."""
+    ruta_segmentos = rutas.get("historial_segmentado")
+    return bool(ruta_segmentos) and historial_segmentado.existe(ruta_segmentos)
+
+def agregar_a_historiales_alternativos(venta, rutas):
+    """
+    Agrega la venta al historial segmentado si existe, o si no al libro binario si existe.
+    Las que ya estén (por id) no se repiten, así se puede llamar de nuevo al recuperar
+    compras del WAL.
+    """
+    segmentado = contexto.abrir_segmentos(rutas["historial_segmentado"]) if historial_en_segmentos(rutas) else None
+    if segmentado is not None:
+        if segmentado.ultimo_id() < venta["id_venta"]:
+            segmentado.append(venta)
+        return
+
+    ruta_libro = rutas.get("libro_ventas")
+    if ruta_libro and os.path.exists(ruta_libro):
+        libro = libro_ventas.LibroVentas(ruta_libro)
+        if libro.ultimo_id() < venta["id_venta"]:
+            libro.agregar(venta)
+        libro.cerrar()
+
+def procesar_venta(email_cliente, items_para_historial, costo_total_venta, historial_ventas, ventas_realizadas, guardar_datos_func, rutas, resumen=None):
+    """
+    Registra la venta en el historial, en las ventas realizadas y, si se pasa `resumen`
+    (el resumen de ventas), también en él; se guarda si `rutas` tiene "resumen_ventas".
+    Devuelve True si la venta quedó registrada.
+    """
     try:
-        venta_registrada = {
-            "cliente_email": email_cliente,
-            "items": items_para_historial,
-            "costo_total": costo_total_venta,
-        }
+        venta_registrada = armar_venta(email_cliente, items_para_historial, costo_total_venta, historial_ventas)
 
         historial_ventas.append(venta_registrada)
-        guardar_datos_func(rutas["historial_ventas"], historial_ventas)
+        ventas_realizadas.append(armar_venta_realizada(venta_registrada))
+        if not historial_en_segmentos(rutas):
+            if not se_guarda_al_agregar(historial_ventas):
+                guardar_datos_func(rutas["historial_ventas"], historial_ventas)
+            guardar_datos_func(rutas["ventas_realizadas"], ventas_realizadas)
+
+        if resumen is not None:
+            resumen_ventas.registrar_venta(resumen, venta_registrada)
+            if "resumen_ventas" in rutas:
+                guardar_datos_func(rutas["resumen_ventas"], resumen)
 
-        ventas_realizadas.append({"subtotal": costo_total_venta})
-        guardar_datos_func(rutas["ventas_realizadas"], ventas_realizadas)
+        agregar_a_historiales_alternativos(venta_registrada, rutas)
 
         logger.info(f"Venta procesada correctamente para {email_cliente}. Total: ${costo_total_venta:.2f}")
+        return True
     
     except Exception as e:
         logger.error(f"Error al procesar la venta para {email_cliente}: {e}")
+        return False
+
+def restaurar_stock(stock, stock_previo):
+    """Vuelve los productos de `stock_previo` ({categoria: {producto: cantidad}}) a esas cantidades."""
+    for categoria, productos in stock_previo.items():
+        stock[categoria].update(productos)
+        for producto in productos:
+            stock_bajo.actualizar(stock, categoria, producto)
+
+def cambios_de_stock(carrito_actual, stock):
+    """{categoria: {producto: stock actual}} de los productos del carrito."""
+    cambios = {}
+    for clave in carrito_actual:
+        categoria, producto = clave.split(":", 1)
+        if categoria in stock and producto in stock[categoria]:
+            cambios.setdefault(categoria, {})[producto] = stock[categoria][producto]
+    return cambios
+
+def guardar_stock(stock, cambios, guardar_datos_func, rutas):
+    """
+    Guarda el stock después de una compra. Con registro de parches solo se agregan los
+    productos que cambiaron, y el stock completo se escribe cuando el registro crece.
+    """
+    ruta_parches = rutas.get("parches_stock")
+    # El inventario particionado ya reescribe solo las categorías que cambiaron.
+    if not ruta_parches or hasattr(stock, "guardar_cambios"):
+        return guardar_datos_func(rutas["stock"], stock)
+    if parches.agregar(ruta_parches, cambios) < MAX_BYTES_PARCHES:
+        return True
+    if guardar_datos_func(rutas["stock"], stock) is False:
+        return False
+    parches.descartar(ruta_parches)
+    logger.info(f"Stock completo guardado en {rutas['stock']}; registro de parches vaciado.")
+    return True
+
+# COMPRAS CON WAL
+def aplicar_entrada_wal(entrada, stock, historial_ventas, ventas_realizadas, resumen=None):
+    """
+    Aplica en memoria una compra del WAL. Se puede aplicar dos veces sin efecto: el stock
+    trae valores absolutos y la venta se agrega solo donde todavía no está su id.
+    """
+    claves_nuevas = False
+    for categoria, productos in entrada["stock"].items():
+        claves_nuevas = claves_nuevas or categoria not in stock or not productos.keys() <= stock[categoria].keys()
+        stock.setdefault(categoria, {}).update(productos)
+    if claves_nuevas:
+        # Un producto que se había borrado vuelve a aparecer: el índice de nombres no lo tiene.
+        catalogo.invalidar(stock)
+
+    venta = modelo_ventas.Venta.desde_formato_disco(entrada["venta"])
+    if siguiente_id_venta(historial_ventas) <= venta["id_venta"]:
+        historial_ventas.append(venta)
+    if not ventas_realizadas or ventas_realizadas[-1].get("id_venta", 0) < venta["id_venta"]:
+        ventas_realizadas.append(armar_venta_realizada(venta))
+    if resumen is not None and resumen.get("ultimo_id_venta", 0) < venta["id_venta"]:
+        resumen_ventas.registrar_venta(resumen, venta)
+    return venta
+
+def volcar_wal(stock, historial_ventas, ventas_realizadas, guardar_datos_func, rutas, resumen=None):
+    """
+    Escribe los archivos de datos con las compras del WAL (ya aplicadas en memoria) y,
+    si todo se guardó bien, vacía el WAL. Devuelve la cantidad de compras volcadas.
+    """
+    entradas = wal.leer(rutas["wal"])
+    if not entradas:
+        return 0
+
+    cambios_stock = {}
+    for entrada in entradas:
+        for categoria, productos in entrada["stock"].items():
+            cambios_stock.setdefault(categoria, {}).update(productos)
+    stock_guardado = guardar_stock(stock, cambios_stock, guardar_datos_func, rutas)
+
+    archivos = []
+    if not historial_en_segmentos(rutas):
+        archivos = [(rutas["ventas_realizadas"], ventas_realizadas)]
+        if not se_guarda_al_agregar(historial_ventas):
+            archivos.insert(0, (rutas["historial_ventas"], historial_ventas))
+    if resumen is not None and "resumen_ventas" in rutas:
+        archivos.append((rutas["resumen_ventas"], resumen))
+    if stock_guardado is False or any(guardar_datos_func(ruta, datos) is False for ruta, datos in archivos):
+        logger.error(f"No se pudo volcar el WAL {rutas['wal']}: se conserva para reintentar.")
+        return 0
+
+    for entrada in entradas:
+        agregar_a_historiales_alternativos(modelo_ventas.Venta.desde_formato_disco(entrada["venta"]), rutas)
+    wal.vaciar(rutas["wal"])
+    logger.info(f"WAL volcado: {len(entradas)} compras escritas en los archivos de datos.")
+    return len(entradas)
+
+def registrar_compra_con_wal(carrito_actual, email_cliente, items_para_historial, costo_total_venta, stock, historial_ventas, ventas_realizadas, guardar_datos_func, rutas, clave_idempotencia=None, resumen=None):
+    """
+    Confirma la compra con una sola escritura al WAL y la aplica en memoria. Los archivos
+    de datos se escriben después, cuando el WAL crece lo suficiente o al salir.
+    """
+    cambios_stock = cambios_de_stock(carrito_actual, stock)
+    venta = armar_venta(email_cliente, items_para_historial, costo_total_venta, historial_ventas)
+    entrada = {"venta": venta, "stock": cambios_stock}
+    if clave_idempotencia is not None:
+        entrada["clave_idempotencia"] = clave_idempotencia
+    tamaño_wal = wal.agregar(rutas["wal"], entrada)
+
+    aplicar_entrada_wal(entrada, stock, historial_ventas, ventas_realizadas, resumen)
+    logger.info(f"Venta {venta['id_venta']} confirmada en el WAL para {email_cliente}. Total: ${costo_total_venta:.2f}")
+
+    if tamaño_wal >= MAX_BYTES_WAL:
+        volcar_wal(stock, historial_ventas, ventas_realizadas, guardar_datos_func, rutas, resumen)
+
+def recuperar_compras_del_wal(rutas=None, guardar_datos_func=guardar_datos):
+    """
+    Al arrancar: vuelve a aplicar las compras que quedaron en el WAL sin volcar (por
+    ejemplo si el programa se cerró de golpe) y las escribe en los archivos de datos.
+    """
+    rutas = rutas or RUTAS_COMPRA
+    entradas = wal.leer(rutas["wal"])
+    if not entradas:
+        return 0
+    resumen = contexto.resumen_ventas if "resumen_ventas" in rutas else None
+    for entrada in entradas:
+        aplicar_entrada_wal(entrada, contexto.stock, contexto.historial_ventas, contexto.ventas_realizadas, resumen)
+        # La clave pudo no llegar a registrarse si el programa se cerró justo después del WAL.
+        if "clave_idempotencia" in entrada:
+            registrar_clave_idempotencia(entrada["clave_idempotencia"], rutas)
+    logger.info(f"Se recuperaron {len(entradas)} compras del WAL {rutas['wal']}.")
+    return volcar_wal(contexto.stock, contexto.historial_ventas, contexto.ventas_realizadas, guardar_datos_func, rutas, resumen)
+
+def volcar_compras_pendientes(rutas=None, guardar_datos_func=guardar_datos):
+    """
+    Escribe en los archivos de datos las compras que todavía están solo en el WAL (ya
+    aplicadas en memoria en esta sesión o al recuperarlas al arrancar). Se llama antes de
+    los reportes del administrador, que leen los archivos, y al salir.
+    """
+    rutas = rutas or RUTAS_COMPRA
+    if not os.path.exists(rutas["wal"]):
+        return 0
+    resumen = contexto.resumen_ventas if "resumen_ventas" in rutas else None
+    return volcar_wal(contexto.stock, contexto.historial_ventas, contexto.ventas_realizadas, guardar_datos_func, rutas, resumen)
+
+def guardar_al_salir():
+    """
+    Vuelca el WAL, escribe el manifiesto del historial segmentado y rehace los snapshots;
+    el resto de los datos se guarda al modificarlos.
+    """
+    volcar_compras_pendientes()
+    contexto.guardar_segmentos()
+    contexto.actualizar_snapshots()
+
+# IDEMPOTENCIA DE COMPRAS
+def compra_repetida(clave_idempotencia, rutas):
+    """True si ya se confirmó una compra con esta clave (y todavía no venció)."""
+    if "claves_idempotencia" not in rutas:
+        return False
+    return claves_idempotencia.abrir(rutas["claves_idempotencia"]).contiene(clave_idempotencia)
+
+def registrar_clave_idempotencia(clave_idempotencia, rutas):
+    """
+    Anota la clave de una compra confirmada. Si no se puede escribir solo se registra el
+    error: la compra ya quedó guardada y no se deshace por esto.
+    """
+    if "claves_idempotencia" not in rutas:
+        return
+    try:
+        claves_idempotencia.abrir(rutas["claves_idempotencia"]).registrar(clave_idempotencia)
+    except OSError as e:
+        logger.error(f"No se pudo registrar la clave de idempotencia {clave_idempotencia}: {e}")
+
+RUTAS_COMPRA = {
+    "stock": RUTA_STOCK,
+    "ventas_realizadas": RUTA_VENTAS_REALIZADAS,
+    "historial_ventas": RUTA_HISTORIAL_VENTAS,
+    "resumen_ventas": RUTA_RESUMEN_VENTAS,
+    "libro_ventas": RUTA_LIBRO_VENTAS,
+    "historial_segmentado": RUTA_HISTORIAL_SEGMENTADO,
+    "wal": RUTA_WAL,
+    "parches_stock": RUTA_PARCHES_STOCK,
+    "claves_idempotencia": RUTA_CLAVES_IDEMPOTENCIA
+}
 
 def confirmar_y_procesar_venta(
     carrito_actual,
@@ -567,14 +1204,19 @@ def confirmar_y_procesar_venta(
     historial_ventas,
     ventas_realizadas,
     guardar_datos_func=guardar_datos,
-    rutas={
-        "stock": RUTA_STOCK,
-        "ventas_realizadas": RUTA_VENTAS_REALIZADAS,
-        "historial_ventas": RUTA_HISTORIAL_VENTAS
-    },
+    rutas=RUTAS_COMPRA,
     mostrar_resumen_func=mostrar_resumen_carrito_modificado,
-    confirmar_func=confirmar_compra  
+    confirmar_func=confirmar_compra,
+    clave_idempotencia=None,
+    resumen=None
 ):
+    """
+    `clave_idempotencia` identifica el pedido: si ya se confirmó una compra con esa clave
+    (un reintento del mismo pedido) se rechaza sin tocar el stock. Sin clave se genera una.
+    La clave se registra solo si la venta quedó guardada; si no, el stock se devuelve y el
+    mismo pedido se puede reintentar con la misma clave.
+    `resumen` es el resumen de ventas a actualizar, si se usa.
+    """
     try:
         if not carrito_actual:
             print("\nℹ️ Tu carrito está vacío. No se procesó ninguna compra.")
@@ -582,6 +1224,13 @@ def confirmar_y_procesar_venta(
             logger.debug(f"Carrito recibido: {carrito_actual}")
             return False
 
+        if clave_idempotencia is None:
+            clave_idempotencia = uuid.uuid4().hex
+        elif compra_repetida(clave_idempotencia, rutas):
+            print("\nℹ️ Esta compra ya fue registrada. No se procesó de nuevo.")
+            logger.info(f"Compra repetida rechazada para {email_cliente}: clave {clave_idempotencia}.")
+            return False
+
         print("\n📋 --- Resumen Final de tu Carrito ---")
         costo_total_venta, items_para_historial = mostrar_resumen_func(carrito_actual)
 
@@ -594,22 +1243,41 @@ def confirmar_y_procesar_venta(
 
         if confirmar_func():
             logger.debug("El usuario confirmó la compra.")
+            stock_previo = cambios_de_stock(carrito_actual, stock)
             stock_actualizado = actualizar_stock(carrito_actual, stock)
             logger.debug(f"Stock actualizado: {stock_actualizado}")
 
-            guardar_datos_func(rutas["stock"], stock_actualizado)
-            logger.debug("Stock guardado correctamente.")
-
-            procesar_venta(
-                email_cliente,
-                items_para_historial,
-                costo_total_venta,
-                historial_ventas,
-                ventas_realizadas,
-                guardar_datos_func,
-                rutas
-            )
-
+            if "wal" in rutas:
+                try:
+                    registrar_compra_con_wal(carrito_actual, email_cliente, items_para_historial, costo_total_venta,
+                                             stock_actualizado, historial_ventas, ventas_realizadas, guardar_datos_func, rutas,
+                                             clave_idempotencia, resumen)
+                except OSError:
+                    # Sin la entrada en el WAL la compra no se confirmó: se deshace el descuento de stock.
+                    restaurar_stock(stock, stock_previo)
+                    raise
+            else:
+                guardar_stock(stock_actualizado, cambios_de_stock(carrito_actual, stock_actualizado), guardar_datos_func, rutas)
+                logger.debug("Stock guardado correctamente.")
+
+                venta_registrada = procesar_venta(
+                    email_cliente,
+                    items_para_historial,
+                    costo_total_venta,
+                    historial_ventas,
+                    ventas_realizadas,
+                    guardar_datos_func,
+                    rutas,
+                    resumen
+                )
+                if not venta_registrada:
+                    # La venta no quedó guardada: se devuelve el stock, así reintentar el
+                    # pedido no lo descuenta dos veces, y la clave queda sin registrar.
+                    restaurar_stock(stock, stock_previo)
+                    guardar_stock(stock, stock_previo, guardar_datos_func, rutas)
+                    raise RuntimeError("la venta no se pudo registrar")
+
+            registrar_clave_idempotencia(clave_idempotencia, rutas)
             logger.info(f"Compra confirmada por {email_cliente}. Total: ${costo_total_venta:.2f}")
             print("\n✅ ¡Gracias por tu compra!")
             return True
@@ -634,24 +1302,35 @@ def copiar_stock(stock_original):
 def ventas_reestructurada(stock, precios, sesion_activa, historial_ventas, ventas_realizadas):
     carrito_cliente = {}
     stock_temp = copiar_stock(stock)
+    indice_busqueda = busqueda_productos.crear_indice(stock_temp)
     seguir_comprando = True
+    clave_compra = None
 
     while seguir_comprando:
+        # Una clave de idempotencia por carrito: los reintentos de confirmar el mismo carrito
+        # llevan la misma, y después de una compra confirmada (carrito vacío) se usa otra.
+        if not carrito_cliente:
+            clave_compra = uuid.uuid4().hex
         mostrar_inicio_tienda(stock_temp, precios)
 
         accion_categoria = seleccionar_categoria_para_compra(stock_temp)
 
-        seguir_comprando = not manejar_accion_categoria(accion_categoria, carrito_cliente, sesion_activa, precios, historial_ventas, ventas_realizadas, stock)
+        seguir_comprando = not manejar_accion_categoria(accion_categoria, carrito_cliente, sesion_activa, precios, historial_ventas, ventas_realizadas, stock,
+                                                        clave_compra)
 
         if seguir_comprando:
-            categoria_elegida = accion_categoria
-            producto_elegido_key = seleccionar_producto_para_compra(categoria_elegida, stock_temp[categoria_elegida], precios.get(categoria_elegida, {}))
+            if accion_categoria == "BUSCAR_PRODUCTO":
+                categoria_elegida, producto_elegido_key = buscar_producto_para_compra(indice_busqueda, stock_temp, precios)
+            else:
+                categoria_elegida = accion_categoria
+                producto_elegido_key = seleccionar_producto_para_compra(categoria_elegida, stock_temp[categoria_elegida], precios.get(categoria_elegida, {}))
 
             if producto_elegido_key is not None:
                 manejar_agregado_producto_al_carrito(carrito_cliente, categoria_elegida, producto_elegido_key, stock_temp, precios)
                 mostrar_carrito_actual(carrito_cliente)
 
-                seguir_comprando = manejar_opcion_post_agregado(carrito_cliente, sesion_activa, precios, historial_ventas, ventas_realizadas, stock)
+                seguir_comprando = manejar_opcion_post_agregado(carrito_cliente, sesion_activa, precios, historial_ventas, ventas_realizadas, stock,
+                                                                clave_compra)
 
     print("\n👋 Saliendo del sistema de compras.")
 
@@ -659,7 +1338,8 @@ def mostrar_inicio_tienda(stock, precios):
     print("\n" + "="*15 + " TIENDA VIRTUAL " + "="*15)
     mostrar_stock_detallado(stock, precios)
 
-def manejar_accion_categoria(accion_categoria, carrito_cliente, sesion_activa, precios, historial_ventas, ventas_realizadas, stock_real):
+def manejar_accion_categoria(accion_categoria, carrito_cliente, sesion_activa, precios, historial_ventas, ventas_realizadas, stock_real,
+                             clave_idempotencia=None):
     if accion_categoria == "CANCELAR_COMPRA_TOTAL":
         print("\n↩️ Compra cancelada. Volviendo al menú principal del cliente...")
         return True
@@ -667,7 +1347,8 @@ def manejar_accion_categoria(accion_categoria, carrito_cliente, sesion_activa, p
         print("\n↩️ Volviendo al menú del cliente...")
         return True
     elif accion_categoria == "FINALIZAR_COMPRA":
-        if confirmar_y_procesar_venta(carrito_cliente, sesion_activa["email"], stock_real, precios, historial_ventas, ventas_realizadas):
+        if confirmar_y_procesar_venta(carrito_cliente, sesion_activa["email"], stock_real, precios, historial_ventas, ventas_realizadas,
+                                      clave_idempotencia=clave_idempotencia, resumen=contexto.resumen_ventas):
             carrito_cliente.clear()
         if not carrito_cliente or input("¿Desea realizar otra compra o agregar más ítems? (s/n): ").lower() != 's':
             return True
@@ -687,7 +1368,8 @@ def manejar_agregado_producto_al_carrito(
         cantidad_a_agregar = solicitar_cantidad_fn(producto_key, stock_disponible, cantidad_actual)
 
         if cantidad_a_agregar > 0:
-            precio_unitario = precios.get(categoria, {}).get(producto_key, precios.get(categoria, {}).get(producto_key.lower(), 0.0))
+            clave_precio = catalogo.buscar_producto(precios, categoria, producto_key)
+            precio_unitario = precios[categoria][clave_precio] if clave_precio is not None else 0.0
             carrito_cliente[clave_carrito] = {
                 "cantidad": cantidad_actual + cantidad_a_agregar,
                 "precio_unitario_registrado": precio_unitario,
@@ -716,13 +1398,14 @@ def mostrar_carrito_actual(carrito):
     else:
         print("\n🛒 Tu carrito está vacío.")
 
-def manejar_opcion_post_agregado(carrito, sesion, precios, historial, ventas, stock_real):
+def manejar_opcion_post_agregado(carrito, sesion, precios, historial, ventas, stock_real, clave_idempotencia=None):
     while True:
         op = input("¿Desea (a)gregar otro producto, (f)inalizar compra, o (c)ancelar toda la compra? (a/f/c): ").strip().lower()
         if op == 'a':
             return True
         elif op == 'f':
-            if confirmar_y_procesar_venta(carrito, sesion["email"], stock_real, precios, historial, ventas):
+            if confirmar_y_procesar_venta(carrito, sesion["email"], stock_real, precios, historial, ventas,
+                                          clave_idempotencia=clave_idempotencia, resumen=contexto.resumen_ventas):
                 carrito.clear()
             print("\n↩️ Volviendo al menú del cliente...")
             return False
@@ -735,7 +1418,7 @@ def manejar_opcion_post_agregado(carrito, sesion, precios, historial, ventas, st
 
 def mostrar_historial_compras(compras, email):
     """Imprime todas las compras del cliente."""
-    print(f"\n--- Historial de Compras para {usuarios[email]['nombre']} ---")
+    print(f"\n--- Historial de Compras para {contexto.usuarios[email]['nombre']} ---")
     for i, venta in enumerate(compras, start=1):
         mostrar_venta_individual(venta, i)
     print("-" * 60)
@@ -760,7 +1443,7 @@ def cuenta_cliente(email):
     '''
     Menú de gestión de cuenta del cliente con opciones para administrar su cuenta
     '''
-    usuario = usuarios.get(email)
+    usuario = contexto.usuarios.get(email)
     if not usuario:
         print("❌ Usuario no encontrado")
         return
@@ -788,7 +1471,7 @@ def menu_cliente(stock, precios, sesion_activa, historial_ventas, ventas_realiza
     ejecutando_cliente = True
     while ejecutando_cliente:
         print("\n━━━━━ MENÚ CLIENTE ━━━━━")
-        print(f"Bienvenido/a {usuarios.get(sesion_activa['email'], {}).get('nombre', 'Cliente')}")
+        print(f"Bienvenido/a {contexto.usuarios.get(sesion_activa['email'], {}).get('nombre', 'Cliente')}")
         print("1) Ver productos")
         print("2) Realizar compra")
         print("3) Ver mis compras (historial)")
@@ -828,7 +1511,10 @@ def ver_historial_compras_cliente():
 
 def obtener_compras_cliente(email):
     """Devuelve la lista de compras realizadas por el cliente."""
-    return [venta for venta in historial_ventas if venta.get("cliente_email") == email]
+    # Los emails del historial están internados: internando también el buscado, las
+    # ventas del cliente se reconocen por identidad sin comparar carácter por carácter.
+    email = sys.intern(email)
+    return [venta for venta in contexto.historial_ventas if venta.get("cliente_email") == email]
 
 def mostrar_item_historial(item):
     """Muestra un ítem dentro de una venta."""
@@ -838,6 +1524,23 @@ def mostrar_item_historial(item):
     subt = item.get('subtotal', 0.0)
     print(f"  - {prod_cat:<29} | {cant:<5} | ${p_unit:<9.2f} | ${subt:<9.2f}")
 
+def abrir_historial_segmentado():
+    return contexto.abrir_segmentos(RUTA_HISTORIAL_SEGMENTADO)
+
+def historial_para_admin():
+    """
+    El administrador pagina el historial desde disco: de los segmentos o del libro binario
+    si se crearon, y si no del JSON usando el índice de posiciones. Antes se vuelcan las
+    compras que quedaron en el WAL, para que estén en los archivos.
+    """
+    volcar_compras_pendientes()
+    segmentos = abrir_historial_segmentado()
+    if segmentos is not None:
+        return segmentos
+    if os.path.exists(RUTA_LIBRO_VENTAS):
+        return libro_ventas.LibroVentas(RUTA_LIBRO_VENTAS)
+    return indice_ventas.HistorialEnDisco(contexto.ruta("historial_ventas"))
+
 def menu_administrador(stock, precios, usuarios, historial_ventas):
     ejecutando_admin = True
     while ejecutando_admin:
@@ -852,6 +1555,8 @@ def menu_administrador(stock, precios, usuarios, historial_ventas):
         print("5) Crear nuevo administrador")
         print("6) Ver clientes eliminados")
         print("7) Ver administradores eliminados")
+        # Las opciones nuevas se numeran a partir de 12, así las de siempre conservan su número.
+        print("12) Importar clientes desde un archivo (CSV, JSON o JSONL)")
 
         print("\n---- GESTIÓN DE PRODUCTOS ----")
         print("8) Gestionar Inventario (Stock y Precios)")
@@ -859,6 +1564,8 @@ def menu_administrador(stock, precios, usuarios, historial_ventas):
         print("\n---- REPORTES ----")
         print("9) Ver historial de todas las ventas")
         print("10) Consultar porcentaje de cumplimiento de objetivo")
+        print("13) Ver impacto de los cambios de precio")
+        print("14) Ver productos con stock bajo")
 
         print("\n---- SESIÓN ----")
         print("11) Cerrar sesión")
@@ -884,10 +1591,20 @@ def menu_administrador(stock, precios, usuarios, historial_ventas):
         elif opcion == "9":
             ver_historial_ventas_admin(historial_ventas)
         elif opcion == "10":
-            porcentaje_objetivo_ganancias(ventas_realizadas)
+            segmentos = abrir_historial_segmentado()
+            # Con el historial segmentado el total sale del manifiesto y no hace falta cargar las ventas.
+            ventas = contexto.ventas_realizadas if segmentos is None else []
+            porcentaje_objetivo_ganancias(ventas, contexto.resumen_ventas, segmentos)
         elif opcion == "11":
             cerrar_sesion()
             ejecutando_admin = False
+        elif opcion == "12":
+            importar_usuarios(usuarios)
+        elif opcion == "13":
+            registrar_precios_base(precios)
+            ver_impacto_cambios_de_precio(contexto.historial_precios)
+        elif opcion == "14":
+            ver_stock_bajo(stock)
         else:
             print("⚠️ Opción inválida. Intentá nuevamente.")
 
@@ -896,7 +1613,7 @@ def ver_usuarios_por_rol(rol):
     try:
         usuarios_filtrados = [
             (email, data.get("nombre", "N/A"))
-            for email, data in usuarios.items()
+            for email, data in contexto.usuarios.items()
             if data.get("rol") == rol and data.get("activo", True)
         ]
 
@@ -931,6 +1648,10 @@ def mostrar_usuarios_en_tabla(lista_usuarios):
     
 
 def ver_historial_ventas_admin(historial_a_mostrar):
+    """
+    Pagina el historial de ventas. Acepta la lista en memoria o un HistorialEnDisco,
+    que lee del archivo solo las ventas de la página que se muestra.
+    """
     print("\n--- Historial Completo de Ventas (Admin) ---")
 
     if not historial_a_mostrar:
@@ -987,8 +1708,8 @@ def cambiar_contrasena(email):
             else:
                 contraseña_valida = True
 
-        usuarios[email]["contraseña"] = nueva_contraseña
-        guardar_datos(RUTA_USUARIOS, usuarios)
+        contexto.usuarios[email]["contraseña"] = nueva_contraseña
+        guardar_datos(RUTA_USUARIOS, contexto.usuarios)
         print("✅ Contraseña actualizada exitosamente")
         logger.info(f"Contraseña actualizada correctamente para {email}")
 
@@ -1008,8 +1729,8 @@ def actualizar_nombre(email):
                 logger.info(f"Actualización de nombre cancelada para {email}")
                 return
                 
-            usuarios[email]["nombre"] = nuevo_nombre
-            guardar_datos(RUTA_USUARIOS, usuarios)
+            contexto.usuarios[email]["nombre"] = nuevo_nombre
+            guardar_datos(RUTA_USUARIOS, contexto.usuarios)
             print(f"✅ Nombre actualizado a: {nuevo_nombre}")
             logger.info(f"Nombre actualizado para {email}: {nuevo_nombre}")
             return
@@ -1051,17 +1772,17 @@ def crear_nuevo_administrador():
         nombre = solicitar_nombre_valido()
         contraseña = solicitar_contraseña_valida()
 
-        if email in usuarios:
+        if email in contexto.usuarios:
             logger.warning(f"Intento de crear un administrador con email ya existente: {email}")
 
-        usuarios[email] = {
+        contexto.usuarios[email] = {
             "nombre": nombre,
             "contraseña": contraseña,
             "rol": "administrador",
             "activo": True
         }
 
-        guardar_datos(RUTA_USUARIOS, usuarios)
+        guardar_datos(RUTA_USUARIOS, contexto.usuarios)
         print(f"✅ Administrador '{nombre}' creado exitosamente.")
         logger.info(f"Administrador creado: {email} ({nombre})")
 
@@ -1069,6 +1790,34 @@ def crear_nuevo_administrador():
         logger.error(f"Error al guardar nuevo administrador {email}: {e}")
         print("❌ Ocurrió un error al crear el nuevo administrador.")
 
+def importar_usuarios(usuarios, ruta=None, guardar_datos_func=guardar_datos):
+    """
+    Da de alta como clientes a los usuarios de un archivo CSV (email,nombre,contraseña),
+    JSONL o JSON (un arreglo). Los aceptados se guardan juntos en una sola escritura de usuarios.json y el
+    detalle de los rechazados queda en <archivo>.rechazados.csv.
+    """
+    ruta = ruta or pedir_input_con_cancelar("Ruta del archivo de usuarios (Enter para cancelar): ")
+    if not ruta:
+        return None
+    try:
+        nuevos, rechazados = reglas_usuarios.importar(ruta, usuarios)
+    except (OSError, ValueError) as e:
+        print(f"❌ No se pudo leer el archivo '{ruta}'.")
+        logger.error(f"Error al importar usuarios desde '{ruta}': {e}")
+        return None
+
+    if rechazados:
+        ruta_rechazos = ruta + ".rechazados.csv"
+        reglas_usuarios.escribir_rechazos(ruta_rechazos, rechazados)
+        print(f"⚠️ {len(rechazados)} registros rechazados (detalle en '{ruta_rechazos}'):")
+        mostrar_rechazos(rechazados)
+    if nuevos:
+        usuarios.update(nuevos)
+        guardar_datos_func(RUTA_USUARIOS, usuarios)
+        logger.info(f"{len(nuevos)} clientes importados desde '{ruta}'.")
+    print(f"✅ {len(nuevos)} clientes importados.")
+    return nuevos, rechazados
+
 def administrar_inventario_menu(stock, precios):
     """Submenú para la gestión de stock y precios."""
 
@@ -1082,6 +1831,9 @@ def administrar_inventario_menu(stock, precios):
         print("6) Eliminar producto")
         print("7) Eliminar categoría (¡cuidado, elimina todos sus productos!)")
         print("8) Volver al menú de administrador")
+        print("9) Importar inventario desde CSV")
+        print("10) Exportar inventario a CSV")
+        print("11) Actualizar precios en bloque")
 
         opcion_inv = input("\n→ Ingresá tu opción: ").strip()
 
@@ -1101,6 +1853,12 @@ def administrar_inventario_menu(stock, precios):
             eliminar_categoria_inventario(stock, precios)
         elif opcion_inv == "8":
             break
+        elif opcion_inv == "9":
+            importar_inventario_csv(stock, precios)
+        elif opcion_inv == "10":
+            exportar_inventario_csv(stock, precios)
+        elif opcion_inv == "11":
+            actualizar_precios_en_bloque(precios)
         else:
             print("⚠️ Opción inválida.")
 
@@ -1188,7 +1946,7 @@ def gestionar_administradores():
         print("ℹ️ Búsqueda cancelada. No se ingresó un nombre.")
         return
 
-    encontrados = buscar_administradores(nombre, usuarios)
+    encontrados = buscar_administradores(nombre, contexto.usuarios)
     if not encontrados:
         print("⚠️ No se encontró ningún administrador con ese nombre.")
         return
@@ -1198,7 +1956,7 @@ def gestionar_administradores():
         return
 
     print(f"\n📄 Datos del administrador seleccionado:")
-    print(f"- Nombre: {usuarios[email].get('nombre')}")
+    print(f"- Nombre: {contexto.usuarios[email].get('nombre')}")
     print(f"- Email: {email}")
 
     print("\n¿Qué deseás hacer?")
@@ -1209,9 +1967,9 @@ def gestionar_administradores():
     opcion = input("\n→ Ingresá el número de la opción: ").strip()
 
     if opcion == "1":
-        eliminar_usuario_logicamente(email, nombre, usuarios, guardar_datos, RUTA_USUARIOS)
+        eliminar_usuario_logicamente(email, nombre, contexto.usuarios, guardar_datos, RUTA_USUARIOS)
     elif opcion == "2":
-        actualizar_administrador(email, usuarios)
+        actualizar_administrador(email, contexto.usuarios)
     elif opcion == "3":
         print("↩️ Volviendo al menú.")
     else:
@@ -1362,6 +2120,40 @@ def ver_clientes_inactivos(rol, usuarios):
 def ver_administradores_inactivos(rol, usuarios):
     ver_usuarios_inactivos_por_rol(rol, usuarios)
 
+# HISTORIAL DE PRECIOS
+def momento_actual():
+    return modelo_ventas.fecha_a_segundos(datetime.now().isoformat(timespec="seconds"))
+
+def registrar_cambios_de_precio(precios, productos=None, historial=None, guardar_datos_func=guardar_datos):
+    """
+    Anota en el historial de precios el precio actual de `productos` (pares categoria,
+    producto), o de todo el catálogo si no se indican, y lo guarda si hubo cambios.
+    """
+    historial = contexto.historial_precios if historial is None else historial
+    momento = momento_actual()
+    if productos is None:
+        cambios = historial.sincronizar(precios, momento)
+    else:
+        cambios = sum(historial.registrar(categoria, producto, precios[categoria][producto], momento)
+                      for categoria, producto in productos)
+    if cambios:
+        guardar_datos_func(RUTA_HISTORIAL_PRECIOS, historial)
+        logger.debug(f"{cambios} cambios de precio registrados en el historial.")
+    return cambios
+
+def registrar_precios_base(precios, historial=None):
+    """
+    Anota como precio de base el precio actual de los productos que todavía no están en el
+    historial de precios. Se llama antes de modificar precios, así el primer cambio de cada
+    producto queda con su precio anterior, y antes de los reportes que valorizan ventas.
+    Se guarda junto con los cambios que registre registrar_cambios_de_precio.
+    """
+    historial = contexto.historial_precios if historial is None else historial
+    registrados = historial.registrar_base(precios)
+    if registrados:
+        logger.debug(f"{registrados} precios de base registrados en el historial.")
+    return registrados
+
 # AGREGAR NUEVA CATEGORIA Y AGREGAR NUEVO PRODUCTO A CATEGORIA EXISTENTE
 def agregar_categoria_inventario(stock, precios):
     nombre_cat = input("Nombre de la nueva categoría: ").strip().lower()
@@ -1371,13 +2163,15 @@ def agregar_categoria_inventario(stock, precios):
         logger.debug("Intento fallido de agregar categoría: nombre vacío.")
         return
 
-    if nombre_cat.lower() in (k.lower() for k in stock.keys()):
+    if catalogo.buscar_categoria(stock, nombre_cat) is not None:
         print(f"⚠️ La categoría '{nombre_cat}' (o una similar) ya existe.")
         logger.info(f"Intento de duplicar categoría: '{nombre_cat}' ya existe.")
         return
 
     stock[nombre_cat] = {}
     precios[nombre_cat] = {}
+    catalogo.registrar_categoria(stock, nombre_cat)
+    catalogo.registrar_categoria(precios, nombre_cat)
 
     try:
         guardar_datos(RUTA_STOCK, stock)
@@ -1399,7 +2193,7 @@ def agregar_producto_inventario(stock, precios):
         logger.debug("Selección de categoría cancelada por el usuario.")
         return
 
-    nombre_prod = obtener_nombre_producto(stock[cat_elegida_key], cat_elegida_key)
+    nombre_prod = obtener_nombre_producto(stock, cat_elegida_key)
     if not nombre_prod:
         logger.debug(f"Entrada de nombre de producto cancelada para categoría '{cat_elegida_key}'.")
         return
@@ -1412,9 +2206,13 @@ def agregar_producto_inventario(stock, precios):
     try:
         stock[cat_elegida_key][nombre_prod.lower()] = cantidad_inicial
         precios[cat_elegida_key][nombre_prod.lower()] = precio_inicial
+        catalogo.registrar_producto(stock, cat_elegida_key, nombre_prod.lower())
+        catalogo.registrar_producto(precios, cat_elegida_key, nombre_prod.lower())
+        stock_bajo.actualizar(stock, cat_elegida_key, nombre_prod.lower())
 
         guardar_datos(RUTA_STOCK, stock)
         guardar_datos(RUTA_PRECIOS, precios)
+        registrar_cambios_de_precio(precios, [(cat_elegida_key, nombre_prod.lower())])
 
         print(f"✅ Producto '{nombre_prod}' agregado a '{cat_elegida_key}'.")
         logger.info(f"Producto agregado: '{nombre_prod}' a categoría '{cat_elegida_key}' - Cantidad: {cantidad_inicial}, Precio: {precio_inicial}")
@@ -1422,12 +2220,12 @@ def agregar_producto_inventario(stock, precios):
         print("❌ Error al guardar el nuevo producto.")
         logger.error(f"Error al agregar producto '{nombre_prod}' en '{cat_elegida_key}': {e}")
 
-def obtener_nombre_producto(stock_categoria, cat_elegida_key):
+def obtener_nombre_producto(stock, cat_elegida_key):
     nombre_prod = input(f"Nombre del nuevo producto para '{cat_elegida_key}': ").strip()
     if not nombre_prod:
         print("⚠️ El nombre no puede estar vacío.")
         return None
-    if nombre_prod.lower() in (p.lower() for p in stock_categoria.keys()):
+    if catalogo.buscar_producto(stock, cat_elegida_key, nombre_prod) is not None:
         print(f"⚠️ El producto '{nombre_prod}' (o similar) ya existe en '{cat_elegida_key}'.")
         return None
     return nombre_prod
@@ -1445,6 +2243,134 @@ def obtener_stock_y_precio(nombre_prod):
         print("⚠️ Cantidad o precio inválido.")
         return None, None
 
+# IMPORTAR Y EXPORTAR INVENTARIO EN CSV
+MAX_RECHAZOS_MOSTRADOS = 20
+
+def mostrar_rechazos(rechazados):
+    for numero, motivo in rechazados[:MAX_RECHAZOS_MOSTRADOS]:
+        print(f"  - Línea {numero}: {motivo}")
+    if len(rechazados) > MAX_RECHAZOS_MOSTRADOS:
+        print(f"  ... y {len(rechazados) - MAX_RECHAZOS_MOSTRADOS} más (ver el log).")
+
+def importar_inventario_csv(stock, precios, ruta_csv=None, guardar_datos_func=guardar_datos, historial=None):
+    """
+    Carga productos desde un CSV (categoria,producto,stock,precio). Los productos que ya
+    existen se actualizan y los archivos de stock y precios se escriben una sola vez al final.
+    """
+    ruta_csv = ruta_csv or pedir_input_con_cancelar("Ruta del archivo CSV a importar (Enter para cancelar): ")
+    if not ruta_csv:
+        return None
+    registrar_precios_base(precios, historial)
+    try:
+        agregados, actualizados, rechazados = inventario_csv.importar_csv(ruta_csv, stock, precios)
+    except OSError as e:
+        print(f"❌ No se pudo leer el archivo '{ruta_csv}'.")
+        logger.error(f"Error al importar inventario desde '{ruta_csv}': {e}")
+        return None
+
+    if rechazados:
+        print(f"⚠️ {len(rechazados)} filas rechazadas:")
+        mostrar_rechazos(rechazados)
+        for numero, motivo in rechazados:
+            logger.debug(f"Fila {numero} de '{ruta_csv}' rechazada: {motivo}")
+    if agregados or actualizados:
+        stock_bajo.invalidar(stock)
+        guardar_datos_func(RUTA_STOCK, stock)
+        guardar_datos_func(RUTA_PRECIOS, precios)
+        registrar_cambios_de_precio(precios, historial=historial, guardar_datos_func=guardar_datos_func)
+    print(f"✅ Importación terminada: {agregados} productos agregados, {actualizados} actualizados.")
+    return agregados, actualizados, rechazados
+
+def exportar_inventario_csv(stock, precios, ruta_csv=None):
+    ruta_csv = ruta_csv or pedir_input_con_cancelar("Ruta del archivo CSV a generar (Enter para cancelar): ")
+    if not ruta_csv:
+        return None
+    try:
+        filas = inventario_csv.exportar_csv(ruta_csv, stock, precios)
+    except OSError as e:
+        print(f"❌ No se pudo escribir el archivo '{ruta_csv}'.")
+        logger.error(f"Error al exportar inventario a '{ruta_csv}': {e}")
+        return None
+    print(f"✅ {filas} productos exportados a '{ruta_csv}'.")
+    return filas
+
+# ACTUALIZAR PRECIOS EN BLOQUE
+def pedir_categorias_a_ajustar(precios):
+    """Devuelve [categoria] si se elige una, None para todo el catálogo o False si no existe."""
+    cat_input = input("Categoría a ajustar (Enter para todo el catálogo): ").strip()
+    if not cat_input:
+        return None
+    categoria = catalogo.buscar_categoria(precios, cat_input)
+    if categoria is None:
+        print(f"⚠ Categoría '{cat_input}' no encontrada.")
+        return False
+    return [categoria]
+
+def pedir_ajuste_precios(opcion):
+    tipo = "porcentaje" if opcion == "1" else "monto"
+    try:
+        valor = float(input(f"Ingresá el {tipo} a aplicar (negativo para bajar): ").replace(',', '.'))
+        ajuste = ajustes_precios.ajuste_porcentual(valor) if opcion == "1" else ajustes_precios.ajuste_fijo(valor)
+    except ValueError:
+        print(f"⚠️ {tipo.capitalize()} inválido.")
+        return None
+    if opcion == "1" and valor <= -100:
+        print("⚠️ El porcentaje tiene que ser mayor a -100.")
+        return None
+    return ajuste
+
+def actualizar_precios_en_bloque(precios, guardar_datos_func=guardar_datos, historial=None):
+    """
+    Ajusta muchos precios a la vez (porcentaje o monto fijo, por categoría o en todo el
+    catálogo, o desde un archivo CSV) y guarda precios.json una sola vez.
+    """
+    if not precios:
+        print("No hay precios definidos.")
+        return
+
+    print("\n--- Actualizar Precios en Bloque ---")
+    print("1) Ajustar un porcentaje")
+    print("2) Sumar o restar un monto fijo")
+    print("3) Cargar precios nuevos desde un archivo CSV (categoria,producto,precio)")
+    opcion = input("\n→ Ingresá tu opción (Enter para cancelar): ").strip()
+
+    if opcion in ("1", "2"):
+        ajuste = pedir_ajuste_precios(opcion)
+        if ajuste is None:
+            return
+        categorias = pedir_categorias_a_ajustar(precios)
+        if categorias is False:
+            return
+        registrar_precios_base(precios, historial)
+        modificados, omitidos = ajustes_precios.aplicar_ajuste(precios, *ajuste, categorias=categorias)
+        if omitidos:
+            print(f"⚠️ {len(omitidos)} precios quedarían negativos y no se modificaron:")
+            for categoria, producto in omitidos[:MAX_RECHAZOS_MOSTRADOS]:
+                print(f"  - {producto} ({categoria}): ${precios[categoria][producto]:.2f}")
+    elif opcion == "3":
+        ruta_csv = pedir_input_con_cancelar("Ruta del archivo CSV (Enter para cancelar): ")
+        if not ruta_csv:
+            return
+        registrar_precios_base(precios, historial)
+        try:
+            modificados, rechazados = ajustes_precios.aplicar_archivo(ruta_csv, precios)
+        except OSError as e:
+            print(f"❌ No se pudo leer el archivo '{ruta_csv}'.")
+            logger.error(f"Error al actualizar precios desde '{ruta_csv}': {e}")
+            return
+        if rechazados:
+            print(f"⚠️ {len(rechazados)} filas rechazadas:")
+            mostrar_rechazos(rechazados)
+    else:
+        print("↩️ Operación cancelada.")
+        return
+
+    if modificados:
+        guardar_datos_func(RUTA_PRECIOS, precios)
+        registrar_cambios_de_precio(precios, historial=historial, guardar_datos_func=guardar_datos_func)
+    print(f"✅ {modificados} precios actualizados.")
+    return modificados
+
 # FUNCIONES PARA ELIMINAR PRODUCTOS Y CATEGORÍAS
 def obtener_categoria_existente(diccionario, tipo="stock", mensaje_personalizado=None):
     if not diccionario:
@@ -1463,9 +2389,9 @@ def obtener_categoria_existente(diccionario, tipo="stock", mensaje_personalizado
         print(f"⚠ El nombre de la categoría no puede estar vacío.")
         return None
 
-    for key_original in diccionario.keys():
-        if key_original.lower() == cat_input_usuario:
-            return key_original
+    key_original = catalogo.buscar_categoria(diccionario, cat_input_usuario)
+    if key_original is not None:
+        return key_original
 
     print(f"⚠ Categoría '{cat_input_usuario}' no encontrada.")
     return None
@@ -1481,11 +2407,12 @@ def obtener_producto_existente(diccionario, categoria, tipo="stock"):
         print(f"⚠️ El nombre del producto no puede estar vacío.")
         return None
 
-    if prod_input not in diccionario[categoria]:
+    producto = catalogo.buscar_producto(diccionario, categoria, prod_input)
+    if producto is None:
         print(f"Producto '{prod_input}' no existe en la categoría '{categoria}'.")
         return None
 
-    return prod_input
+    return producto
 
 #MODIFICAR STOCK DE PRODUCTO
 def obtener_nuevo_stock(stock_actual):
@@ -1525,6 +2452,7 @@ def modificar_stock_producto(stock):
         return
 
     stock[categoria][producto] = nuevo_stock
+    stock_bajo.actualizar(stock, categoria, producto)
     guardar_datos(RUTA_STOCK, stock)
     print("✅ Stock actualizado.")
 
@@ -1601,8 +2529,10 @@ def modificar_precio_producto(precios):
     if nuevo_precio is None:
         return
 
+    registrar_precios_base(precios)
     precios[categoria][producto] = nuevo_precio
     guardar_datos(RUTA_PRECIOS, precios)
+    registrar_cambios_de_precio(precios, [(categoria, producto)])
     print("✅ Precio actualizado.")
 
 #ELIMINAR PRODUCTO
@@ -1621,10 +2551,13 @@ def ejecutar_eliminacion_producto(stock, precios, categoria, producto):
     Realiza la eliminación del producto del stock y del archivo de precios.
     """
     del stock[categoria][producto]
+    catalogo.quitar_producto(stock, categoria, producto)
+    stock_bajo.actualizar(stock, categoria, producto)
     print(f"✅ Producto '{producto}' eliminado del stock de la categoría '{categoria}'.")
 
     if categoria in precios and producto in precios[categoria]:
         del precios[categoria][producto]
+        catalogo.quitar_producto(precios, categoria, producto)
         print(f"✅ Precio para '{producto}' eliminado de la categoría '{categoria}'.")
     else:
         print(f"ℹ️ No se encontró un precio para '{producto}' en la categoría '{categoria}'.")
@@ -1680,11 +2613,13 @@ def ejecutar_eliminacion_categoria(stock, precios, categoria):
     Elimina la categoría y todos sus productos del stock y precios.
     """
     del stock[categoria]
+    catalogo.quitar_categoria(stock, categoria)
     guardar_datos(RUTA_STOCK, stock)
     print(f"✅ Categoría '{categoria}' y sus productos eliminados del stock.")
 
     if categoria in precios:
         del precios[categoria]
+        catalogo.quitar_categoria(precios, categoria)
         guardar_datos(RUTA_PRECIOS, precios)
         print(f"✅ Categoría '{categoria}' y sus precios eliminados de la lista de precios.")
     else:
@@ -1777,8 +2712,93 @@ def mostrar_pagina(historial, pagina_actual, ventas_por_pagina):
 
 
 # CONSULTAR PORCENTAJE DE CUMPLIMIENTO DE OBJETIVO DE GANANCIAS
-def porcentaje_objetivo_ganancias(ventas_realizadas):
-    """Consulta el porcentaje de cumplimiento según un objetivo ingresado."""
+def pedir_fecha(mensaje, valor_por_defecto):
+    while True:
+        fecha_str = input(mensaje).strip()
+        if not fecha_str:
+            return valor_por_defecto
+        try:
+            return date.fromisoformat(fecha_str)
+        except ValueError:
+            print("⚠ Fecha inválida. Usá el formato AAAA-MM-DD.")
+
+def pedir_rango_fechas():
+    """Devuelve (desde, hasta), o None si se quiere consultar todo el historial."""
+    desde = pedir_fecha("Desde qué fecha (AAAA-MM-DD, Enter para todo el historial): ", None)
+    if desde is None:
+        return None
+    hasta = pedir_fecha("Hasta qué fecha (AAAA-MM-DD, Enter para hoy): ", date.today())
+    return desde, hasta
+
+def ventas_desde_fecha(desde):
+    """
+    Ventas desde `desde` (date) hasta hoy. Con el historial segmentado se abren solo los
+    segmentos del período. El libro y el JSON indexado se leen de a una venta por posición:
+    como las ventas se agregan en orden de fecha, la primera del período se busca por
+    bisección y se leen solo las siguientes.
+    """
+    historial = historial_para_admin()
+    if isinstance(historial, historial_segmentado.HistorialSegmentado):
+        return list(historial.ventas_entre(desde, date.today()))
+    primera = bisect.bisect_left(historial, desde.isoformat(), key=lambda venta: venta.get("fecha") or "")
+    return list(historial[primera:])
+
+def ver_impacto_cambios_de_precio(historial, ventas=None):
+    """
+    Muestra los cambios de precio de un período con las unidades vendidas a cada precio nuevo
+    y la diferencia de ingresos contra el precio anterior, y cuánto habrían costado esas
+    ventas con los precios de hoy.
+    """
+    print("\n--- Impacto de los Cambios de Precio ---")
+    rango = pedir_rango_fechas()
+    desde, hasta = rango if rango else (date(1970, 1, 1), date.today())
+    segundos_desde = modelo_ventas.fecha_a_segundos(desde.isoformat())
+    segundos_hasta = modelo_ventas.fecha_a_segundos(hasta.isoformat()) + 24 * 60 * 60 - 1
+
+    ventas = ventas_desde_fecha(desde) if ventas is None else ventas
+    filas = historial_precios.impacto_cambios(historial, ventas, segundos_desde, segundos_hasta)
+    if not filas:
+        print("ℹ️ No hubo cambios de precio en ese período.")
+        return filas
+
+    print(f"  {'Fecha':<19} | {'Producto (Categoría)':<30} | {'Antes':>9} | {'Ahora':>9} | {'Uds.':>6} | {'Diferencia':>11}")
+    print("  " + "-" * 100)
+    for fila in filas:
+        producto = f"{fila['producto'].capitalize()} ({fila['categoria'].capitalize()})"
+        anterior = f"${fila['anterior']:.2f}" if fila["anterior"] is not None else "-"
+        print(f"  {modelo_ventas.segundos_a_fecha(fila['momento']):<19} | {producto:<30} | {anterior:>9} | "
+              f"${fila['nuevo']:>8.2f} | {fila['unidades']:>6} | ${fila['diferencia']:>10.2f}")
+
+    pagado, revalorizado, _ = historial_precios.revalorizar(historial, ventas, momento_actual())
+    print(f"\nVentas desde {desde.isoformat()}: se cobraron ${pagado:.2f}; con los precios de hoy serían ${revalorizado:.2f}.")
+    return filas
+
+def ver_stock_bajo(stock, umbrales=None):
+    """
+    Lista los productos con stock en su umbral de reposición o por debajo, los más escasos
+    primero. Los umbrales se leen de umbrales_stock.json si no se pasan.
+    """
+    print("\n--- Productos con Stock Bajo ---")
+    umbrales = stock_bajo.cargar_umbrales(RUTA_UMBRALES_STOCK) if umbrales is None else umbrales
+    filas = stock_bajo.productos_bajos(stock, umbrales)
+    if not filas:
+        print("✅ Ningún producto está por debajo de su umbral de reposición.")
+        return filas
+
+    print(f"  {'Producto (Categoría)':<40} | {'Stock':>9} | {'Umbral':>7}")
+    print("  " + "-" * 62)
+    for categoria, producto, cantidad, umbral in filas:
+        stock_str = "Sin stock" if cantidad <= 0 else str(cantidad)
+        print(f"  {f'{producto.capitalize()} ({categoria.capitalize()})':<40} | {stock_str:>9} | {umbral:>7}")
+    print(f"\n{len(filas)} productos para reponer.")
+    return filas
+
+def porcentaje_objetivo_ganancias(ventas_realizadas, resumen=None, segmentos=None):
+    """
+    Consulta el porcentaje de cumplimiento según un objetivo ingresado.
+    Si se pasa el resumen de ventas o el historial segmentado, permite limitar la consulta
+    a un rango de fechas. Con el historial segmentado los totales salen de su manifiesto.
+    """
     objetivo_str = ""
     objetivo = None
     objetivo_valido = False
@@ -1801,22 +2821,35 @@ def porcentaje_objetivo_ganancias(ventas_realizadas):
         else:
             print("⚠ El campo no puede estar vacío.")
 
-    subtotales = map(lambda venta: venta.get("subtotal", 0.0), ventas_realizadas)
-    ganancia_total = sum(subtotales) if ventas_realizadas else 0.0
+    rango = pedir_rango_fechas() if resumen is not None or segmentos is not None else None
+    if rango:
+        desde, hasta = rango
+        if segmentos is not None:
+            ganancia_total = segmentos.totales_entre(desde, hasta)["ingresos"]
+        else:
+            ganancia_total = resumen_ventas.totales_entre(resumen, desde, hasta)["ingresos"]
+        descripcion = f"entre {desde} y {hasta}"
+    elif segmentos is not None:
+        ganancia_total = segmentos.totales()["ingresos"]
+        descripcion = "actual acumulada"
+    else:
+        subtotales = map(lambda venta: venta.get("subtotal", 0.0), ventas_realizadas)
+        ganancia_total = sum(subtotales) if ventas_realizadas else 0.0
+        descripcion = "actual acumulada"
 
     porcentaje = (ganancia_total / objetivo) * 100 if objetivo > 0 else 0
 
-    print(f"\n💰 Ganancia actual acumulada: ${ganancia_total:.2f}")
+    print(f"\n💰 Ganancia {descripcion}: ${ganancia_total:.2f}")
     print(f"🎯 Objetivo ingresado: ${objetivo:.2f}")
     print(f"📈 Porcentaje de cumplimiento: {porcentaje:.2f}%")
 
 def menu_principal():
-    # Carga inicial de datos ya se hizo al inicio del script
+    # Los datos se cargan a demanda a través de `contexto` la primera vez que se usan
     ejecutando = True
     while ejecutando:
         print("\n━━━━━ MENÚ PRINCIPAL ━━━━━")
         if sesion_activa["email"]:
-            print(f"Sesión activa: {usuarios.get(sesion_activa['email'], {}).get('nombre', sesion_activa['email'])} ({sesion_activa['rol']})")
+            print(f"Sesión activa: {contexto.usuarios.get(sesion_activa['email'], {}).get('nombre', sesion_activa['email'])} ({sesion_activa['rol']})")
             if sesion_activa["rol"] == "administrador":
                 print("1) Ir al Menú Administrador")
             else: # Cliente
@@ -1833,29 +2866,25 @@ def menu_principal():
         if sesion_activa["email"]: # Hay sesión activa
             if opcion == "1":
                 if sesion_activa["rol"] == "administrador":
-                    menu_administrador(stock, precios, usuarios, historial_ventas)
+                    menu_administrador(contexto.stock, contexto.precios, contexto.usuarios, historial_para_admin())
                 else:
-                    menu_cliente(stock, precios, sesion_activa, historial_ventas, ventas_realizadas)
+                    menu_cliente(contexto.stock, contexto.precios, sesion_activa, contexto.historial_ventas, contexto.ventas_realizadas)
             elif opcion == "2":
                 cerrar_sesion()
             elif opcion == "3":
                 print("👋 ¡Gracias por usar la aplicación! Guardando datos...")
-                # Guardar todos los datos antes de salir (aunque ya se guardan incrementalmente)
-                guardar_datos(RUTA_USUARIOS, usuarios)
-                guardar_datos(RUTA_STOCK, stock)
-                guardar_datos(RUTA_PRECIOS, precios)
-                guardar_datos(RUTA_HISTORIAL_VENTAS, historial_ventas)
-                guardar_datos(RUTA_VENTAS_REALIZADAS, ventas_realizadas)
+                guardar_al_salir()
                 print("💾 ¡Datos guardados! ¡Hasta luego!")
                 ejecutando = False
             else:
                 print("⚠️ Esa no es una opción válida. Intentá de nuevo.")
         else: # No hay sesión activa
             if opcion == "1":
-                crear_usuario(stock, precios, sesion_activa, historial_ventas, ventas_realizadas)
+                crear_usuario(contexto.stock, contexto.precios, sesion_activa, contexto.historial_ventas, contexto.ventas_realizadas)
             elif opcion == "2":
                 iniciar_sesion()
             elif opcion == "3":
+                guardar_al_salir()
                 print("👋 ¡Gracias por usar la aplicación! ¡Hasta luego!")
                 ejecutando = False
             else:
@@ -1865,4 +2894,11 @@ def menu_principal():
 # Ejecutar el Programa
 # ======================
 if __name__ == "__main__":
-    menu_principal()
\ No newline at end of file
+    contexto.precargar()
+    recuperar_compras_del_wal()
+    try:
+        menu_principal()
+    except (KeyboardInterrupt, EOFError):
+        # Ctrl+C o fin de la entrada: las compras del WAL se vuelcan igual antes de salir.
+        print("\n💾 Guardando datos antes de salir...")
+        guardar_al_salir()
\ No newline at end of file
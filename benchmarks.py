@@ -0,0 +1,295 @@
+"""
+Mediciones de rendimiento de la persistencia de la tienda.
+
+Uso:
+    python benchmarks.py [cantidad_de_ventas]
+
+Genera un historial de ventas sintético en un directorio temporal, así no toca
+los archivos reales, y muestra los tiempos por pantalla.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import TPO_FINAL
+import modelos.historial_columnar as historial_columnar
+import modelos.ventas as modelo_ventas
+import negocio.conciliacion_stock as conciliacion_stock
+import persistencia.codec as codec
+import persistencia.historial_segmentado as historial_segmentado
+import persistencia.indice_ventas as indice_ventas
+import persistencia.libro_ventas as libro_ventas
+import persistencia.parches as parches
+import persistencia.snapshot as snapshot
+
+CATEGORIAS = {
+    "camisas": ["basica blanca", "basica negra", "manga larga"],
+    "pantalones": ["jean", "cargo", "algodon", "lino"],
+    "chaquetas": ["cuero", "americana", "blazer", "gabardina"],
+    "zapatos": ["botas", "zapatillas", "mocasines"],
+    "chanclas": ["playa", "piscina"],
+}
+
+
+def generar_historial(cantidad_ventas, semilla=1234):
+    azar = random.Random(semilla)
+    clientes = [f"cliente{i}@gmail.com" for i in range(500)]
+    historial = []
+    for _ in range(cantidad_ventas):
+        items = []
+        for _ in range(azar.randint(1, 4)):
+            categoria = azar.choice(list(CATEGORIAS))
+            producto = azar.choice(CATEGORIAS[categoria])
+            cantidad = azar.randint(1, 3)
+            precio = float(azar.choice([10, 25, 35, 40, 60, 80]))
+            items.append(TPO_FINAL.armar_item_para_historial(categoria, producto, cantidad, precio, cantidad * precio))
+        historial.append({
+            "cliente_email": azar.choice(clientes),
+            "items": items,
+            "costo_total": TPO_FINAL.calcular_costo_total(items),
+        })
+    return historial
+
+
+def medir(funcion, *args, **kwargs):
+    inicio = time.perf_counter()
+    resultado = funcion(*args, **kwargs)
+    return time.perf_counter() - inicio, resultado
+
+
+def mb(ruta):
+    return f"{os.path.getsize(ruta) / 1e6:.1f} MB"
+
+
+def bench_arranque_frio_vs_caliente(directorio, historial):
+    """Compara la carga desde JSON (arranque en frío) contra la carga desde el snapshot."""
+    ruta = os.path.join(directorio, "historial_ventas.json")
+    TPO_FINAL.guardar_datos(ruta, historial)
+    snapshot.eliminar(ruta)
+
+    tiempo_frio, _ = medir(TPO_FINAL.cargar_datos, ruta, [])
+    tiempo_primera, _ = medir(TPO_FINAL.cargar_datos, ruta, [], usar_snapshot=True)
+    tiempo_caliente, datos = medir(TPO_FINAL.cargar_datos, ruta, [], usar_snapshot=True)
+    assert len(datos) == len(historial)
+
+    print("Arranque en frío vs. caliente (historial_ventas.json)")
+    print(f"  {'JSON (' + mb(ruta) + ')':<32} {tiempo_frio:.3f} s")
+    print(f"  {'JSON + escribir snapshot':<32} {tiempo_primera:.3f} s")
+    print(f"  {'Snapshot (' + mb(snapshot.ruta_snapshot(ruta)) + ')':<32} {tiempo_caliente:.3f} s")
+    print(f"  Mejora: x{tiempo_frio / tiempo_caliente:.1f}")
+    snapshot.eliminar(ruta)
+
+
+def bench_codec_por_dataset(directorio, historial):
+    """Bytes escritos y tiempos de codificar/decodificar, por motor JSON y formato."""
+    def copia(ruta):
+        # Se trabaja sobre una copia en el directorio temporal: si el archivo real no
+        # existe, cargar_datos crea el vacío ahí y no en el directorio de la tienda.
+        destino = os.path.join(directorio, os.path.basename(ruta))
+        if os.path.exists(ruta):
+            shutil.copyfile(ruta, destino)
+        return destino
+
+    datasets = {
+        "usuarios": TPO_FINAL.cargar_datos(copia(TPO_FINAL.RUTA_USUARIOS), {}),
+        "stock": TPO_FINAL.cargar_datos(copia(TPO_FINAL.RUTA_STOCK), {}),
+        "precios": TPO_FINAL.cargar_datos(copia(TPO_FINAL.RUTA_PRECIOS), {}),
+        "historial_ventas": historial,
+        "ventas_realizadas": [{"subtotal": venta["costo_total"]} for venta in historial],
+    }
+
+    print("\nCodec JSON por dataset")
+    print(f"  {'Dataset':<18} {'Motor':<7} {'Formato':<8} {'Bytes':>12} {'Codificar':>10} {'Decodificar':>12}")
+    for nombre, datos in datasets.items():
+        for motor in codec.MOTORES:
+            for legible in (True, False):
+                tiempo_cod, contenido = medir(codec.codificar, datos, legible, motor)
+                tiempo_dec, _ = medir(codec.decodificar, contenido, motor)
+                formato = "legible" if legible else "compacto"
+                print(f"  {nombre:<18} {motor:<7} {formato:<8} {len(contenido):>12,} "
+                      f"{tiempo_cod * 1000:>8.1f} ms {tiempo_dec * 1000:>10.1f} ms")
+
+
+def medir_memoria(funcion, *args):
+    """Devuelve (segundos, pico de memoria en MB) de ejecutar la función."""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    funcion(*args)
+    tiempo = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tiempo, pico / 1e6
+
+
+def bench_paginado_historial(directorio, historial):
+    """Mostrar la última página cargando todo el historial vs. leyéndola con el índice."""
+    ruta = os.path.join(directorio, "historial_paginado.json")
+    TPO_FINAL.guardar_datos(ruta, historial, compacto=True)
+    pagina = len(historial) // 3
+
+    def con_lista():
+        TPO_FINAL.cargar_datos(ruta, [])[(pagina - 1) * 3:pagina * 3]
+
+    def con_indice():
+        indice_ventas.HistorialEnDisco(ruta)[(pagina - 1) * 3:pagina * 3]
+
+    ruta_libro = os.path.join(directorio, "historial_paginado.libro")
+
+    def con_libro():
+        libro = libro_ventas.LibroVentas(ruta_libro)
+        libro[(pagina - 1) * 3:pagina * 3]
+        libro.cerrar()
+
+    print(f"\nPaginado del historial (página {pagina})")
+    tiempo, pico = medir(indice_ventas.asegurar_indice, ruta)
+    print(f"  {'Construir índice (una vez)':<32} {tiempo:.3f} s")
+    tiempo, _ = medir(libro_ventas.importar_json, ruta, ruta_libro)
+    print(f"  {'Importar libro binario (una vez)':<32} {tiempo:.3f} s  ({mb(ruta_libro)} vs. JSON {mb(ruta)})")
+    opciones = (("Cargar todo el JSON", con_lista), ("HistorialEnDisco", con_indice), ("LibroVentas (mmap)", con_libro))
+    for nombre, funcion in opciones:
+        tiempo, pico = medir_memoria(funcion)
+        print(f"  {nombre:<32} {tiempo:.4f} s  pico {pico:.1f} MB")
+
+
+def medir_memoria_retenida(funcion, *args):
+    """Devuelve (segundos, MB que siguen ocupados por el resultado, resultado)."""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    tiempo = time.perf_counter() - inicio
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tiempo, actual / 1e6, resultado
+
+
+def bench_memoria_registros(historial):
+    """
+    Memoria que ocupa el historial cargado como diccionarios, como registros Venta/ItemVenta
+    (con __slots__ y los strings repetidos internados) y como HistorialColumnar.
+    Para la comparación a un millón de ventas: python benchmarks.py 1000000
+    """
+    contenido = codec.codificar(historial, legible=False)
+    cantidad_items = sum(len(venta["items"]) for venta in historial)
+
+    def como_registros(contenido):
+        return modelo_ventas.ventas_desde_disco(codec.decodificar(contenido))
+
+    def como_columnas(contenido):
+        return historial_columnar.HistorialColumnar(codec.decodificar(contenido))
+
+    print(f"\nMemoria del historial en memoria ({len(historial):,} ventas, {cantidad_items:,} ítems)")
+    resultados = {}
+    opciones = (("Diccionarios", codec.decodificar), ("Registros", como_registros), ("Columnas (array)", como_columnas))
+    for nombre, funcion in opciones:
+        tiempo, retenida, datos = medir_memoria_retenida(funcion, contenido)
+        resultados[nombre] = retenida
+        print(f"  {nombre:<32} {retenida:>8.1f} MB  ({retenida * 1e6 / len(historial):.0f} B/venta)  carga {tiempo:.2f} s")
+        del datos
+    for nombre in ("Registros", "Columnas (array)"):
+        print(f"  Ahorro {nombre.lower()}: {1 - resultados[nombre] / resultados['Diccionarios']:.0%}")
+
+
+def tamaño_directorio(directorio):
+    return sum(os.path.getsize(os.path.join(directorio, nombre)) for nombre in os.listdir(directorio))
+
+
+def bench_segmentos_comprimidos(directorio, historial):
+    """Espacio en disco y velocidad de recorrido del historial segmentado, plano vs. gzip."""
+    ruta = os.path.join(directorio, "historial_segmentos.json")
+    TPO_FINAL.guardar_datos(ruta, historial, compacto=True)
+
+    print(f"\nSegmentos del historial ({historial_segmentado.MAX_VENTAS_POR_SEGMENTO:,} ventas por segmento)")
+    for nombre, comprimir in (("Planos", False), ("Comprimidos (gzip)", True)):
+        destino = os.path.join(directorio, "segmentos_" + ("gz" if comprimir else "planos"))
+        tiempo_armado, _ = medir(historial_segmentado.segmentar_json, ruta, destino, comprimir=comprimir)
+        segmentado = historial_segmentado.HistorialSegmentado(destino, comprimir=comprimir)
+        tiempo_lectura, pico = medir_memoria(lambda: sum(1 for _ in segmentado))
+        tiempo_recorrido, cantidad = medir(lambda: sum(1 for _ in segmentado))
+        tamaño = tamaño_directorio(destino)
+        print(f"  {nombre:<20} {tamaño / 1e6:>7.1f} MB  armar {tiempo_armado:.2f} s  "
+              f"recorrer {tiempo_recorrido:.2f} s ({cantidad / tiempo_recorrido:,.0f} ventas/s, "
+              f"pico {pico:.1f} MB)")
+
+
+def bench_guardado_stock(directorio, categorias=500, productos_por_categoria=200, compras=200):
+    """Escritura del stock después de cada compra: archivo completo vs. registro de parches."""
+    stock = {f"categoria {c}": {f"producto {p}": 100 for p in range(productos_por_categoria)} for c in range(categorias)}
+    ruta = os.path.join(directorio, "stock_bench.json")
+    ruta_parches = ruta + ".parches"
+    azar = random.Random(1234)
+    carritos = [[(f"categoria {azar.randrange(categorias)}", f"producto {azar.randrange(productos_por_categoria)}")
+                 for _ in range(azar.randint(1, 4))] for _ in range(compras)]
+
+    def comprar(guardar):
+        escritos = 0
+        for carrito in carritos:
+            cambios = {}
+            for categoria, producto in carrito:
+                stock[categoria][producto] -= 1
+                cambios.setdefault(categoria, {})[producto] = stock[categoria][producto]
+            escritos += guardar(cambios)
+        return escritos
+
+    def completo(cambios):
+        TPO_FINAL.guardar_datos(ruta, stock, compacto=True)
+        return os.path.getsize(ruta)
+
+    def con_parches(cambios):
+        antes = os.path.getsize(ruta_parches) if os.path.exists(ruta_parches) else 0
+        return parches.agregar(ruta_parches, cambios) - antes
+
+    print(f"\nGuardado del stock ({categorias * productos_por_categoria:,} productos, {compras} compras)")
+    for nombre, guardar in (("Archivo completo", completo), ("Registro de parches", con_parches)):
+        tiempo, escritos = medir(comprar, guardar)
+        print(f"  {nombre:<22} {tiempo * 1000 / compras:>8.2f} ms/compra  {escritos / compras:>10,.0f} B escritos/compra")
+
+
+def bench_conciliacion_stock(directorio, historial):
+    """Suma de unidades vendidas por producto: lectura secuencial completa vs. fragmentos en procesos."""
+    ruta = os.path.join(directorio, "historial_conciliacion.json")
+    TPO_FINAL.guardar_datos(ruta, historial, compacto=True)
+
+    def secuencial():
+        with open(ruta, "rb") as archivo:
+            ventas = codec.decodificar(archivo.read())
+        unidades = {}
+        for venta in ventas:
+            for item in venta["items"]:
+                clave = (item["categoria"], item["producto"])
+                unidades[clave] = unidades.get(clave, 0) + item["cantidad"]
+        return unidades
+
+    tiempo_secuencial, _ = medir(secuencial)
+    tiempo_indice, tareas = medir(conciliacion_stock.fragmentos, ruta)
+    print(f"\nConciliación de stock ({len(historial)} ventas, {mb(ruta)}, {os.cpu_count()} CPU)")
+    print(f"  {'Lectura secuencial':<24} {tiempo_secuencial * 1000:>9.1f} ms")
+    print(f"  {'Índice del historial':<24} {tiempo_indice * 1000:>9.1f} ms  ({len(tareas)} fragmentos)")
+    for procesos in sorted({1, 2, os.cpu_count() or 1}):
+        tiempo, _ = medir(conciliacion_stock.unidades_vendidas, tareas, procesos)
+        print(f"  {f'{procesos} proceso(s)':<24} {tiempo * 1000:>9.1f} ms")
+
+
+def main():
+    cantidad_ventas = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"Generando {cantidad_ventas} ventas sintéticas...")
+    historial = generar_historial(cantidad_ventas)
+
+    directorio = tempfile.mkdtemp(prefix="bench_tienda_")
+    try:
+        bench_arranque_frio_vs_caliente(directorio, historial)
+        bench_codec_por_dataset(directorio, historial)
+        bench_paginado_historial(directorio, historial)
+        bench_memoria_registros(historial)
+        bench_segmentos_comprimidos(directorio, historial)
+        bench_guardado_stock(directorio)
+        bench_conciliacion_stock(directorio, historial)
+    finally:
+        shutil.rmtree(directorio)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import bisect
+import indices.catalogo as catalogo
+
+# Índice para buscar productos escribiendo el principio de su nombre. Cada producto se
+# guarda una vez por cada palabra de "categoria producto", con el texto desde esa palabra
+# hasta el final ("camisas basica blanca", "basica blanca", "blanca"), en listas
+# ordenadas. Las entradas que empiezan con lo que escribió el cliente quedan contiguas y
+# se ubican con dos búsquedas binarias, sin recorrer el catálogo.
+#
+# Hay una lista por nivel de relevancia: los términos que empiezan en el nombre del
+# producto, los que empiezan en el nombre de la categoría y los que empiezan en otra
+# palabra. Se recorren en ese orden y la búsqueda termina apenas junta los resultados
+# pedidos, así un prefijo corto que coincide con medio catálogo cuesta lo mismo que uno
+# largo. Dentro de cada nivel los resultados salen en orden alfabético, con lo que el
+# nombre exacto del producto aparece primero.
+#
+# Estructura: {"producto": ([terminos], [(categoria, producto)]), "categoria": (...), "otra_palabra": (...)}
+MAX_RESULTADOS = 10
+NIVELES = ("producto", "categoria", "otra_palabra")
+_FIN = "\U0010ffff"
+
+
+def _nivel(posicion, cantidad_palabras_categoria):
+    if posicion == cantidad_palabras_categoria:
+        return "producto"
+    return "categoria" if posicion == 0 else "otra_palabra"
+
+
+def crear_indice(stock):
+    entradas = {nivel: [] for nivel in NIVELES}
+    for categoria, productos in stock.items():
+        palabras_categoria = catalogo.normalizar(categoria).split()
+        for producto in productos:
+            palabras = palabras_categoria + catalogo.normalizar(producto).split()
+            for posicion in range(len(palabras)):
+                nivel = _nivel(posicion, len(palabras_categoria))
+                entradas[nivel].append((" ".join(palabras[posicion:]), categoria, producto))
+
+    indice = {}
+    for nivel, lista in entradas.items():
+        lista.sort()
+        indice[nivel] = ([termino for termino, _, _ in lista], [(categoria, producto) for _, categoria, producto in lista])
+    return indice
+
+
+def buscar(indice, texto, stock, limite=MAX_RESULTADOS):
+    """
+    Productos con stock cuyo nombre o categoría tiene una palabra que empieza con `texto`.
+    Devuelve hasta `limite` pares (categoria, producto), los más relevantes primero.
+    """
+    prefijo = " ".join(catalogo.normalizar(texto).split())
+    if not prefijo:
+        return []
+    resultados = {}
+    for nivel in NIVELES:
+        terminos, productos = indice[nivel]
+        desde = bisect.bisect_left(terminos, prefijo)
+        hasta = bisect.bisect_left(terminos, prefijo + _FIN, desde)
+        for posicion in range(desde, hasta):
+            categoria, producto = productos[posicion]
+            if stock.get(categoria, {}).get(producto, 0) > 0:
+                # dict como conjunto ordenado: un producto aparece una vez, en su mejor nivel.
+                resultados.setdefault((categoria, producto))
+                if len(resultados) == limite:
+                    return list(resultados)
+    return list(resultados)
@@ -0,0 +1,130 @@
+# Índice de nombres del catálogo sin distinguir mayúsculas: para el stock o los precios
+# ({categoria: {producto: valor}}) guarda {nombre normalizado: clave original} de las
+# categorías y, por categoría, de los productos. Así buscar lo que escribió el
+# administrador ("Camisas", "BASICA") es una consulta al diccionario en vez de recorrer y
+# pasar a minúsculas todas las claves.
+#
+# Los índices se arman la primera vez que se consulta cada diccionario y se mantienen con
+# registrar_* y quitar_* al agregar o eliminar. Quien cambie las claves por otro camino
+# (por ejemplo al recuperar compras del WAL) llama a invalidar(). Además, por las dudas:
+# si el diccionario cambió de tamaño el índice se vuelve a armar, y si devuelve una clave
+# que ya no está en el diccionario (se renombró o reemplazó sin avisar) también.
+#
+# Se guardan los índices de los últimos MAX_CATALOGOS diccionarios (en la aplicación son el
+# stock y los precios), así los que ya no se usan no quedan vivos para siempre.
+MAX_CATALOGOS = 8
+_indices = {}
+
+
+def normalizar(nombre):
+    return nombre.strip().lower()
+
+
+def _armar(claves):
+    # Con claves que solo difieren en mayúsculas gana la primera, como en la búsqueda lineal.
+    indice = {}
+    for clave in claves:
+        indice.setdefault(normalizar(clave), clave)
+    return indice
+
+
+def _indice(catalogo):
+    entrada = _indices.get(id(catalogo))
+    if entrada is None or entrada["catalogo"] is not catalogo or entrada["cantidad"] != len(catalogo):
+        # Se guarda el diccionario mismo para que su id no pueda reutilizarse mientras tanto.
+        entrada = {"catalogo": catalogo, "cantidad": len(catalogo), "categorias": _armar(catalogo), "productos": {}}
+        _indices.pop(id(catalogo), None)
+        if len(_indices) >= MAX_CATALOGOS:
+            del _indices[next(iter(_indices))]
+        _indices[id(catalogo)] = entrada
+    return entrada
+
+
+def invalidar(catalogo):
+    """Descarta el índice de `catalogo` (después de cambiar sus claves sin registrar_*/quitar_*)."""
+    _indices.pop(id(catalogo), None)
+
+
+def _indice_productos(catalogo, categoria):
+    entrada = _indice(catalogo)
+    productos = catalogo[categoria]
+    indice = entrada["productos"].get(categoria)
+    if indice is None or indice[0] is not productos or indice[1] != len(productos):
+        indice = [productos, len(productos), _armar(productos)]
+        entrada["productos"][categoria] = indice
+    return indice
+
+
+def buscar_categoria(catalogo, nombre):
+    """Clave de la categoría que coincide con `nombre` sin importar mayúsculas, o None."""
+    if nombre in catalogo:
+        return nombre
+    clave = _indice(catalogo)["categorias"].get(normalizar(nombre))
+    if clave is not None and clave not in catalogo:
+        invalidar(catalogo)
+        clave = _indice(catalogo)["categorias"].get(normalizar(nombre))
+    return clave
+
+
+def buscar_producto(catalogo, categoria, nombre):
+    """Clave del producto de `categoria` que coincide con `nombre` sin importar mayúsculas, o None."""
+    if categoria not in catalogo:
+        return None
+    if nombre in catalogo[categoria]:
+        return nombre
+    clave = _indice_productos(catalogo, categoria)[2].get(normalizar(nombre))
+    if clave is not None and clave not in catalogo[categoria]:
+        _indice(catalogo)["productos"].pop(categoria, None)
+        clave = _indice_productos(catalogo, categoria)[2].get(normalizar(nombre))
+    return clave
+
+
+def _vigente(catalogo, diferencia):
+    """Índice de `catalogo` si estaba al día antes del cambio que se quiere registrar."""
+    entrada = _indices.get(id(catalogo))
+    if entrada is None or entrada["catalogo"] is not catalogo or entrada["cantidad"] + diferencia != len(catalogo):
+        return None
+    return entrada
+
+
+def _productos_vigentes(catalogo, categoria, diferencia):
+    entrada = _indices.get(id(catalogo))
+    indice = entrada["productos"].get(categoria) if entrada and entrada["catalogo"] is catalogo else None
+    if indice is None or indice[0] is not catalogo.get(categoria) or indice[1] + diferencia != len(indice[0]):
+        return None
+    return indice
+
+
+def registrar_categoria(catalogo, categoria):
+    """Agrega al índice una categoría que ya se agregó a `catalogo`."""
+    entrada = _vigente(catalogo, 1)
+    if entrada:
+        entrada["categorias"].setdefault(normalizar(categoria), categoria)
+        entrada["cantidad"] += 1
+
+
+def quitar_categoria(catalogo, categoria):
+    """Quita del índice una categoría que ya se eliminó de `catalogo`."""
+    entrada = _vigente(catalogo, -1)
+    if entrada:
+        entrada["productos"].pop(categoria, None)
+        if entrada["categorias"].get(normalizar(categoria)) == categoria:
+            del entrada["categorias"][normalizar(categoria)]
+        entrada["cantidad"] -= 1
+
+
+def registrar_producto(catalogo, categoria, producto):
+    """Agrega al índice un producto que ya se agregó a `catalogo[categoria]`."""
+    indice = _productos_vigentes(catalogo, categoria, 1)
+    if indice:
+        indice[2].setdefault(normalizar(producto), producto)
+        indice[1] += 1
+
+
+def quitar_producto(catalogo, categoria, producto):
+    """Quita del índice un producto que ya se eliminó de `catalogo[categoria]`."""
+    indice = _productos_vigentes(catalogo, categoria, -1)
+    if indice:
+        if indice[2].get(normalizar(producto)) == producto:
+            del indice[2][normalizar(producto)]
+        indice[1] -= 1
@@ -0,0 +1,86 @@
+import os
+import time
+import log.logger as logger
+
+# Claves de idempotencia de las compras: cada compra lleva una clave (la manda quien la
+# origina o se genera al confirmar) y una compra con una clave ya vista se rechaza, así un
+# reintento del mismo pedido no registra la venta ni descuenta el stock dos veces.
+#
+# En memoria las claves están en un diccionario {clave: segundos en que se registró}. Se
+# agregan en orden de llegada, así las más viejas quedan al principio y vencerlas es sacar
+# del frente mientras estén vencidas. El índice queda acotado por la vigencia y por
+# MAX_CLAVES; una clave vencida ya no se reconoce.
+#
+# En disco se agrega una línea "clave<TAB>segundos" por compra. Al abrir se descartan las
+# vencidas, y cuando el archivo tiene muchas más líneas que claves vigentes se reescribe.
+VIGENCIA_SEGUNDOS = 24 * 60 * 60
+MAX_CLAVES = 100_000
+
+_abiertos = {}
+
+
+class IndiceIdempotencia:
+
+    def __init__(self, ruta, vigencia=VIGENCIA_SEGUNDOS, maximo=MAX_CLAVES):
+        self.ruta = ruta
+        self.vigencia = vigencia
+        self.maximo = maximo
+        self.claves = {}
+        self.lineas_en_archivo = 0
+        if os.path.exists(ruta):
+            self._leer()
+
+    def _leer(self):
+        with open(self.ruta, encoding="utf-8") as archivo:
+            for linea in archivo:
+                clave, _, segundos = linea.rstrip("\n").partition("\t")
+                self.lineas_en_archivo += 1
+                if clave and segundos.isdigit():
+                    self.claves[clave] = int(segundos)
+        self._vencer(time.time())
+
+    def _vencer(self, ahora):
+        limite = ahora - self.vigencia
+        while self.claves:
+            clave = next(iter(self.claves))
+            if self.claves[clave] >= limite and len(self.claves) <= self.maximo:
+                break
+            del self.claves[clave]
+
+    def __len__(self):
+        return len(self.claves)
+
+    def contiene(self, clave, ahora=None):
+        """True si la clave se registró y todavía no venció."""
+        self._vencer(time.time() if ahora is None else ahora)
+        return clave in self.claves
+
+    def registrar(self, clave, ahora=None):
+        """Agrega la clave al índice y al archivo. Devuelve False si ya estaba."""
+        ahora = int(time.time() if ahora is None else ahora)
+        self._vencer(ahora)
+        if clave in self.claves:
+            return False
+        self.claves[clave] = ahora
+        with open(self.ruta, "a", encoding="utf-8") as archivo:
+            archivo.write(f"{clave}\t{ahora}\n")
+        self.lineas_en_archivo += 1
+        if self.lineas_en_archivo > 2 * len(self.claves) + 1000:
+            self.compactar()
+        return True
+
+    def compactar(self):
+        """Reescribe el archivo solo con las claves vigentes."""
+        temporal = self.ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            archivo.writelines(f"{clave}\t{segundos}\n" for clave, segundos in self.claves.items())
+        os.replace(temporal, self.ruta)
+        logger.debug(f"Claves de idempotencia compactadas en {self.ruta}: {len(self.claves)} vigentes.")
+        self.lineas_en_archivo = len(self.claves)
+
+
+def abrir(ruta):
+    """Índice de `ruta`, leído del disco la primera vez y compartido después."""
+    if ruta not in _abiertos:
+        _abiertos[ruta] = IndiceIdempotencia(ruta)
+    return _abiertos[ruta]
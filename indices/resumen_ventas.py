@@ -0,0 +1,106 @@
+from datetime import date
+import modelos.ventas as modelo_ventas
+
+# Totales de ventas acumulados por hora, día y mes. Se actualizan con cada venta, así
+# los reportes por período suman unos pocos buckets en vez de recorrer el historial.
+#
+# Estructura (se guarda tal cual en resumen_ventas.json):
+#   {"hora": {"2025-06-01T14": {"ingresos": 120.0, "unidades": 3, "ventas": 2}, ...},
+#    "dia":  {"2025-06-01": {...}, ...},
+#    "mes":  {"2025-06": {...}, ...},
+#    "ultimo_id_venta": 42,
+#    "cantidad_ventas": 42}
+# Las claves salen de recortar la fecha ISO de la venta ("2025-06-01T14:05:09").
+# cantidad_ventas cuenta todas las ventas registradas, también las que no tienen fecha, así
+# se puede comparar con el largo del historial para saber si el resumen quedó atrás.
+NIVELES = {"hora": 13, "dia": 10, "mes": 7}
+
+
+def crear_resumen():
+    return {nivel: {} for nivel in NIVELES}
+
+
+def _sumar(bucket, ingresos, unidades):
+    bucket["ingresos"] = bucket.get("ingresos", 0.0) + ingresos
+    bucket["unidades"] = bucket.get("unidades", 0) + unidades
+    bucket["ventas"] = bucket.get("ventas", 0) + 1
+
+
+def registrar_venta(resumen, venta):
+    """Suma una venta a todos los niveles. Las ventas sin fecha no se pueden ubicar y se ignoran."""
+    # Permite saber qué ventas ya están registradas (por ejemplo al recuperar compras del WAL).
+    resumen["cantidad_ventas"] = resumen.get("cantidad_ventas", 0) + 1
+    if venta.get("id_venta") is not None:
+        resumen["ultimo_id_venta"] = max(resumen.get("ultimo_id_venta", 0), venta["id_venta"])
+    fecha = venta.get("fecha")
+    if not fecha:
+        return False
+    unidades = modelo_ventas.unidades_vendidas(venta)
+    ingresos = venta.get("costo_total", 0.0)
+    for nivel, largo in NIVELES.items():
+        buckets = resumen.setdefault(nivel, {})
+        _sumar(buckets.setdefault(fecha[:largo], {}), ingresos, unidades)
+    return True
+
+
+def al_dia(resumen, historial):
+    """True si el resumen tiene registradas tantas ventas como el historial."""
+    return resumen.get("cantidad_ventas", 0) == len(historial)
+
+
+def reconstruir(historial):
+    """Arma el resumen desde cero recorriendo el historial (por ejemplo si se borró el archivo)."""
+    resumen = crear_resumen()
+    for venta in historial:
+        registrar_venta(resumen, venta)
+    return resumen
+
+
+def _mes_siguiente(anio, mes):
+    return (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+
+
+def _meses_completos(desde, hasta):
+    """Meses (anio, mes) que caen enteros dentro de [desde, hasta]."""
+    anio, mes = (desde.year, desde.month) if desde.day == 1 else _mes_siguiente(desde.year, desde.month)
+    meses = []
+    while date(*_mes_siguiente(anio, mes), 1).toordinal() - 1 <= hasta.toordinal():
+        meses.append((anio, mes))
+        anio, mes = _mes_siguiente(anio, mes)
+    return meses
+
+
+def _acumular(total, bucket):
+    if bucket:
+        for campo in total:
+            total[campo] += bucket.get(campo, 0)
+
+
+def _acumular_dias(total, resumen, desde_ordinal, hasta_ordinal):
+    dias = resumen.get("dia", {})
+    for ordinal in range(desde_ordinal, hasta_ordinal + 1):
+        _acumular(total, dias.get(date.fromordinal(ordinal).isoformat()))
+
+
+def totales_entre(resumen, desde, hasta):
+    """
+    Devuelve {"ingresos", "unidades", "ventas"} de las ventas entre las fechas `desde` y
+    `hasta` (objetos date, ambas incluidas). Usa los buckets mensuales para los meses
+    completos y los diarios solo para los días sueltos de los bordes, sin tocar el historial.
+    """
+    total = {"ingresos": 0.0, "unidades": 0, "ventas": 0}
+    if desde > hasta:
+        return total
+
+    meses = _meses_completos(desde, hasta)
+    if not meses:
+        _acumular_dias(total, resumen, desde.toordinal(), hasta.toordinal())
+        return total
+
+    for anio, mes in meses:
+        _acumular(total, resumen.get("mes", {}).get(f"{anio:04d}-{mes:02d}"))
+    primer_dia = date(*meses[0], 1).toordinal()
+    ultimo_dia = date(*_mes_siguiente(*meses[-1]), 1).toordinal() - 1
+    _acumular_dias(total, resumen, desde.toordinal(), primer_dia - 1)
+    _acumular_dias(total, resumen, ultimo_dia + 1, hasta.toordinal())
+    return total
@@ -0,0 +1,109 @@
+import os
+import persistencia.codec as codec
+import log.logger as logger
+
+# Alertas de stock bajo: cada producto tiene un umbral de reposición y el reporte lista los
+# que están en el umbral o por debajo. Los umbrales se escriben en umbrales_stock.json:
+#
+#   {"por_defecto": 0,
+#    "categorias": {"camisas": 10},
+#    "productos": {"camisas": {"basica blanca": 20}}}
+#
+# El umbral de un producto es el suyo, o si no tiene el de su categoría, o si tampoco el
+# por defecto (0 si no se indica: sin archivo, el reporte muestra los productos sin stock).
+#
+# El índice guarda solo los productos bajo el umbral, {(categoria, producto): (cantidad,
+# umbral)}, y se arma la primera vez que se pide el reporte de cada stock. Después se
+# mantiene con actualizar() cada vez que cambia el stock de un producto, así el reporte no
+# recorre el catálogo: ordena únicamente los productos que ya están en el índice. Si cambian
+# los umbrales o la cantidad de categorías, el índice se vuelve a armar.
+_umbrales = {}
+_indices = {}
+
+
+def _umbral_valido(valor):
+    return isinstance(valor, int) and not isinstance(valor, bool) and valor >= 0
+
+
+def compilar_umbrales(datos):
+    """Pasa los umbrales del archivo a {"por_defecto", "categorias", "productos": {(cat, prod): n}}."""
+    umbrales = {"por_defecto": 0, "categorias": {}, "productos": {}}
+    if _umbral_valido(datos.get("por_defecto")):
+        umbrales["por_defecto"] = datos["por_defecto"]
+    for categoria, umbral in datos.get("categorias", {}).items():
+        if _umbral_valido(umbral):
+            umbrales["categorias"][categoria] = umbral
+        else:
+            logger.error(f"Umbral de stock inválido para la categoría '{categoria}': {umbral!r}")
+    for categoria, productos in datos.get("productos", {}).items():
+        for producto, umbral in productos.items():
+            if _umbral_valido(umbral):
+                umbrales["productos"][(categoria, producto)] = umbral
+            else:
+                logger.error(f"Umbral de stock inválido para '{producto}' en '{categoria}': {umbral!r}")
+    return umbrales
+
+
+def cargar_umbrales(ruta):
+    """Umbrales compilados de `ruta` (solo el por defecto si no existe). Se releen solo si el archivo cambió."""
+    if not os.path.exists(ruta):
+        return _umbrales.setdefault((ruta, None), compilar_umbrales({}))
+    firma = os.stat(ruta).st_mtime_ns
+    if (ruta, firma) not in _umbrales:
+        with open(ruta, "rb") as archivo:
+            _umbrales[(ruta, firma)] = compilar_umbrales(codec.decodificar(archivo.read()))
+        logger.info(f"Umbrales de stock cargados desde {ruta}.")
+    return _umbrales[(ruta, firma)]
+
+
+def umbral(umbrales, categoria, producto):
+    por_producto = umbrales["productos"].get((categoria, producto))
+    if por_producto is not None:
+        return por_producto
+    return umbrales["categorias"].get(categoria, umbrales["por_defecto"])
+
+
+def _anotar(bajos, umbrales, categoria, producto, cantidad):
+    limite = umbral(umbrales, categoria, producto)
+    if cantidad <= limite:
+        bajos[(categoria, producto)] = (cantidad, limite)
+    else:
+        bajos.pop((categoria, producto), None)
+
+
+def _indice(stock, umbrales):
+    entrada = _indices.get(id(stock))
+    if (entrada is None or entrada["stock"] is not stock or entrada["umbrales"] is not umbrales
+            or entrada["categorias"] != len(stock)):
+        bajos = {}
+        for categoria, productos in stock.items():
+            for producto, cantidad in productos.items():
+                _anotar(bajos, umbrales, categoria, producto, cantidad)
+        # Se guarda el stock mismo para que su id no pueda reutilizarse mientras tanto.
+        entrada = {"stock": stock, "umbrales": umbrales, "categorias": len(stock), "bajos": bajos}
+        _indices[id(stock)] = entrada
+    return entrada
+
+
+def actualizar(stock, categoria, producto):
+    """Registra en el índice (si ya está armado) la cantidad actual del producto, o que se eliminó."""
+    entrada = _indices.get(id(stock))
+    if entrada is None or entrada["stock"] is not stock:
+        return
+    cantidad = stock.get(categoria, {}).get(producto)
+    if cantidad is None:
+        entrada["bajos"].pop((categoria, producto), None)
+    else:
+        _anotar(entrada["bajos"], entrada["umbrales"], categoria, producto, cantidad)
+
+
+def invalidar(stock):
+    """Descarta el índice de `stock` (por ejemplo después de cambiar muchos productos juntos)."""
+    _indices.pop(id(stock), None)
+
+
+def productos_bajos(stock, umbrales):
+    """[(categoria, producto, cantidad, umbral)] de los productos en el umbral o por debajo, los más escasos primero."""
+    bajos = _indice(stock, umbrales)["bajos"]
+    filas = [(categoria, producto, cantidad, limite) for (categoria, producto), (cantidad, limite) in bajos.items()]
+    return sorted(filas, key=lambda fila: (fila[2], fila[0], fila[1]))
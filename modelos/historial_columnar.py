@@ -0,0 +1,176 @@
+from array import array
+import modelos.ventas as modelo_ventas
+
+# Historial de ventas guardado por columnas en arreglos del módulo `array`, en vez de una
+# lista de diccionarios. Cada ítem ocupa 16 bytes (producto, cantidad y precio en
+# centavos, este de 8 bytes para no desbordar con precios altos) y cada venta 36, así entran decenas de millones de ítems en memoria.
+#
+# Categoría/producto y email se codifican como enteros que apuntan a una tabla de valores
+# distintos. Los montos se guardan en centavos y las fechas en segundos desde 1970.
+# El subtotal de cada ítem no se guarda cuando es cantidad * precio_unitario, que es casi
+# siempre; los que no coinciden (o faltan) se guardan aparte, igual que las claves extra
+# de las ventas y de los ítems, así ida y vuelta al disco no se pierde nada.
+#
+# Se comporta como la lista de ventas (len, índices, slices, append, iterar), devolviendo
+# registros Venta, así procesar_venta y las funciones que muestran ventas la usan igual.
+
+SIN_ID = -1
+
+
+class _Tabla:
+    """Codificación por diccionario: cada valor distinto recibe un entero."""
+
+    def __init__(self):
+        self.valores = []
+        self.ids = {}
+
+    def id_de(self, valor):
+        id_valor = self.ids.get(valor)
+        if id_valor is None:
+            id_valor = self.ids[valor] = len(self.valores)
+            self.valores.append(valor)
+        return id_valor
+
+
+def _otros(registro, clase):
+    """Claves del registro fuera del formato estándar de `clase` (Venta o ItemVenta)."""
+    if isinstance(registro, clase):
+        return registro.otros
+    return {clave: valor for clave, valor in registro.items() if clave not in clase.CONJUNTO_CAMPOS}
+
+
+class HistorialColumnar:
+
+    def __init__(self, ventas=()):
+        # Por venta. inicio_items tiene una entrada más: la venta i usa los ítems
+        # inicio_items[i]:inicio_items[i + 1].
+        self.inicio_items = array("Q", [0])
+        self.id_venta = array("q")
+        self.fecha = array("q")
+        self.cliente = array("I")
+        self.costo_total = array("q")
+        # Por ítem.
+        self.producto = array("I")
+        self.cantidad = array("i")
+        self.precio_unitario = array("q")
+
+        self.clientes = _Tabla()
+        self.productos = _Tabla()
+        # Claves fuera del formato estándar, por posición de venta y por posición de ítem, y
+        # subtotales que no son cantidad * precio, por posición de ítem (casi siempre vacíos).
+        self.otros = {}
+        self.otros_items = {}
+        self.subtotales = {}
+        self.extend(ventas)
+
+    @classmethod
+    def desde_formato_disco(cls, historial):
+        """Arma el historial columnar desde la lista leída del JSON (o desde uno ya armado)."""
+        if isinstance(historial, cls):
+            return historial
+        return cls(historial)
+
+    def append(self, venta):
+        for item in venta.get("items", []):
+            posicion_item = len(self.producto)
+            precio = modelo_ventas.a_centavos(item["precio_unitario"])
+            self.producto.append(self.productos.id_de((item["categoria"], item["producto"])))
+            self.cantidad.append(item["cantidad"])
+            self.precio_unitario.append(precio)
+
+            subtotal = item.get("subtotal")
+            if subtotal is None or modelo_ventas.a_centavos(subtotal) != item["cantidad"] * precio:
+                self.subtotales[posicion_item] = subtotal
+            otros_item = _otros(item, modelo_ventas.ItemVenta)
+            if otros_item:
+                self.otros_items[posicion_item] = otros_item
+        self.inicio_items.append(len(self.producto))
+
+        id_venta = venta.get("id_venta")
+        self.id_venta.append(SIN_ID if id_venta is None else id_venta)
+        self.fecha.append(modelo_ventas.fecha_a_segundos(venta.get("fecha")))
+        self.cliente.append(self.clientes.id_de(venta.get("cliente_email")))
+        self.costo_total.append(modelo_ventas.a_centavos(venta.get("costo_total", 0.0)))
+
+        otros = _otros(venta, modelo_ventas.Venta)
+        if otros:
+            self.otros[len(self.id_venta) - 1] = otros
+
+    def extend(self, ventas):
+        for venta in ventas:
+            self.append(venta)
+
+    def __len__(self):
+        return len(self.id_venta)
+
+    def _venta(self, posicion):
+        items = []
+        for i in range(self.inicio_items[posicion], self.inicio_items[posicion + 1]):
+            categoria, producto = self.productos.valores[self.producto[i]]
+            cantidad = self.cantidad[i]
+            precio = self.precio_unitario[i]
+            subtotal = self.subtotales[i] if i in self.subtotales else cantidad * precio / 100
+            items.append(modelo_ventas.ItemVenta(categoria, producto, cantidad, precio / 100, subtotal,
+                                                 otros=self.otros_items.get(i)))
+        id_venta = self.id_venta[posicion]
+        return modelo_ventas.Venta(
+            id_venta=None if id_venta == SIN_ID else id_venta,
+            fecha=modelo_ventas.segundos_a_fecha(self.fecha[posicion]),
+            cliente_email=self.clientes.valores[self.cliente[posicion]],
+            items=items,
+            costo_total=self.costo_total[posicion] / 100,
+            otros=self.otros.get(posicion),
+        )
+
+    def __getitem__(self, posicion):
+        if isinstance(posicion, slice):
+            return [self._venta(i) for i in range(*posicion.indices(len(self)))]
+        if posicion < 0:
+            posicion += len(self)
+        if not 0 <= posicion < len(self):
+            raise IndexError("índice de venta fuera de rango")
+        return self._venta(posicion)
+
+    def __iter__(self):
+        for posicion in range(len(self)):
+            yield self._venta(posicion)
+
+    def a_formato_disco(self):
+        return [venta.a_formato_disco() for venta in self]
+
+    def bytes_en_columnas(self):
+        columnas = (self.inicio_items, self.id_venta, self.fecha, self.cliente, self.costo_total,
+                    self.producto, self.cantidad, self.precio_unitario)
+        return sum(columna.itemsize * len(columna) for columna in columnas)
+
+    def columnas_numpy(self):
+        """
+        Devuelve las columnas como arreglos de NumPy que comparten la memoria de los
+        arreglos (sin copiar). Mientras existan, el historial no puede crecer: hay que
+        soltarlos antes de volver a agregar ventas.
+        """
+        import numpy
+
+        nombres = ("inicio_items", "id_venta", "fecha", "cliente", "costo_total",
+                   "producto", "cantidad", "precio_unitario")
+        return {nombre: numpy.frombuffer(getattr(self, nombre), dtype=getattr(self, nombre).typecode)
+                for nombre in nombres}
+
+    def unidades_por_producto(self):
+        """{(categoria, producto): unidades vendidas}, sin las promociones. Usa NumPy si está instalado."""
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+
+        if numpy is not None:
+            columnas = self.columnas_numpy()
+            totales = numpy.bincount(columnas["producto"], weights=columnas["cantidad"],
+                                     minlength=len(self.productos.valores)).astype(int).tolist()
+            del columnas
+        else:
+            totales = [0] * len(self.productos.valores)
+            for producto, cantidad in zip(self.producto, self.cantidad):
+                totales[producto] += cantidad
+        return {clave: unidades for clave, unidades in zip(self.productos.valores, totales)
+                if clave[0] != modelo_ventas.CATEGORIA_PROMOCION}
@@ -0,0 +1,155 @@
+import bisect
+from array import array
+import modelos.ventas as modelo_ventas
+
+# Historial de precios: por producto, los momentos en que cambió su precio (segundos desde
+# 1970) y el precio desde ese momento (en centavos), en dos arreglos ordenados por tiempo.
+# Cada cambio ocupa 16 bytes y "¿cuánto costaba el producto en tal fecha?" es una búsqueda
+# binaria sobre los tiempos de ese producto, sin recorrer nada más.
+#
+# En disco (historial_precios.json):
+#   {"camisas": {"basica": [[1717200000, 1717804800], [1000, 1250]]}, ...}
+# es decir, por producto la lista de tiempos y la de precios en centavos.
+#
+# Los precios que el catálogo ya tenía antes de su primer cambio se registran con momento
+# DESDE_SIEMPRE (ver registrar_base): son el precio anterior del primer cambio y el precio
+# vigente de los productos que nunca cambiaron, pero no cuentan como cambios.
+DESDE_SIEMPRE = 0
+
+
+class HistorialPrecios:
+
+    def __init__(self, datos=None):
+        # {(categoria, producto): (tiempos, centavos)}
+        self.productos = {}
+        for categoria, productos in (datos or {}).items():
+            for producto, (tiempos, centavos) in productos.items():
+                self.productos[(categoria, producto)] = (array("q", tiempos), array("q", centavos))
+
+    @classmethod
+    def desde_formato_disco(cls, datos):
+        if isinstance(datos, cls):
+            return datos
+        return cls(datos)
+
+    def a_formato_disco(self):
+        datos = {}
+        for (categoria, producto), (tiempos, centavos) in self.productos.items():
+            datos.setdefault(categoria, {})[producto] = [tiempos.tolist(), centavos.tolist()]
+        return datos
+
+    def __len__(self):
+        """Cantidad total de cambios de precio registrados."""
+        return sum(len(tiempos) for tiempos, _ in self.productos.values())
+
+    def registrar(self, categoria, producto, precio, momento):
+        """
+        Registra que desde `momento` (segundos) el producto vale `precio`. No agrega nada si el
+        precio vigente en ese momento ya era ese. Devuelve True si se registró un cambio.
+        """
+        tiempos, centavos = self.productos.setdefault((categoria, producto), (array("q"), array("q")))
+        nuevo = modelo_ventas.a_centavos(precio)
+        posicion = bisect.bisect_right(tiempos, momento)
+        if posicion and centavos[posicion - 1] == nuevo:
+            return False
+        # Casi siempre es el final; un cambio con fecha anterior se intercala en su lugar.
+        tiempos.insert(posicion, momento)
+        centavos.insert(posicion, nuevo)
+        return True
+
+    def registrar_base(self, precios):
+        """
+        Registra con momento DESDE_SIEMPRE el precio de los productos de `precios` que todavía
+        no tienen historial. Devuelve cuántos se registraron.
+        """
+        registrados = 0
+        for categoria, productos in precios.items():
+            for producto, precio in productos.items():
+                if (categoria, producto) not in self.productos:
+                    self.productos[(categoria, producto)] = (array("q", [DESDE_SIEMPRE]), array("q", [modelo_ventas.a_centavos(precio)]))
+                    registrados += 1
+        return registrados
+
+    def sincronizar(self, precios, momento):
+        """Registra los precios de `precios` que difieren del último conocido. Devuelve cuántos."""
+        registrados = 0
+        for categoria, productos in precios.items():
+            for producto, precio in productos.items():
+                registrados += self.registrar(categoria, producto, precio, momento)
+        return registrados
+
+    def precio_en(self, categoria, producto, momento):
+        """Precio vigente en `momento` (segundos), o None si todavía no tenía precio registrado."""
+        historial = self.productos.get((categoria, producto))
+        if historial is None:
+            return None
+        tiempos, centavos = historial
+        posicion = bisect.bisect_right(tiempos, momento)
+        return centavos[posicion - 1] / 100 if posicion else None
+
+    def cambios_entre(self, desde, hasta):
+        """
+        Cambios de precio con momento en [desde, hasta], como tuplas
+        (momento, categoria, producto, precio anterior o None, precio nuevo), en orden.
+        """
+        cambios = []
+        for (categoria, producto), (tiempos, centavos) in self.productos.items():
+            inicio = bisect.bisect_left(tiempos, max(desde, DESDE_SIEMPRE + 1))
+            fin = bisect.bisect_right(tiempos, hasta)
+            for posicion in range(inicio, fin):
+                anterior = centavos[posicion - 1] / 100 if posicion else None
+                cambios.append((tiempos[posicion], categoria, producto, anterior, centavos[posicion] / 100))
+        cambios.sort()
+        return cambios
+
+
+def revalorizar(historial_precios, ventas, momento):
+    """
+    Lo que habrían costado las ventas con los precios vigentes en `momento` (segundos).
+    Devuelve (total pagado, total a precios de ese momento, ítems sin precio en ese momento);
+    los ítems sin precio se cuentan con el precio que se pagó.
+    """
+    pagado = revalorizado = 0.0
+    sin_precio = 0
+    for venta in ventas:
+        for item in venta.get("items", []):
+            precio = historial_precios.precio_en(item["categoria"], item["producto"], momento)
+            if precio is None:
+                sin_precio += 1
+                precio = item["precio_unitario"]
+            pagado += item["cantidad"] * item["precio_unitario"]
+            revalorizado += item["cantidad"] * precio
+    return round(pagado, 2), round(revalorizado, 2), sin_precio
+
+
+def impacto_cambios(historial_precios, ventas, desde, hasta):
+    """
+    Para cada cambio de precio en [desde, hasta] (segundos), las unidades vendidas mientras
+    estuvo vigente y la diferencia de ingresos contra el precio anterior. `ventas` alcanza con
+    que sean las de ese período (por ejemplo las de los segmentos del rango).
+    Devuelve una lista de diccionarios, en el orden de los cambios.
+    """
+    cambios = historial_precios.cambios_entre(desde, hasta)
+    reporte = {
+        (categoria, producto, momento): {"momento": momento, "categoria": categoria, "producto": producto,
+                                         "anterior": anterior, "nuevo": nuevo, "unidades": 0, "diferencia": 0.0}
+        for momento, categoria, producto, anterior, nuevo in cambios
+    }
+    for venta in ventas:
+        segundos = modelo_ventas.fecha_a_segundos(venta.get("fecha"))
+        if segundos < desde:
+            continue
+        for item in venta.get("items", []):
+            historial = historial_precios.productos.get((item["categoria"], item["producto"]))
+            if historial is None:
+                continue
+            # El cambio vigente al momento de la venta.
+            posicion = bisect.bisect_right(historial[0], segundos) - 1
+            fila = reporte.get((item["categoria"], item["producto"], historial[0][posicion])) if posicion >= 0 else None
+            if fila is not None:
+                fila["unidades"] += item["cantidad"]
+                if fila["anterior"] is not None:
+                    fila["diferencia"] += item["cantidad"] * (fila["nuevo"] - fila["anterior"])
+    for fila in reporte.values():
+        fila["diferencia"] = round(fila["diferencia"], 2)
+    return list(reporte.values())
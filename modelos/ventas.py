@@ -0,0 +1,159 @@
+import gc
+import sys
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+
+# Registros compactos para las ventas y sus ítems. Con __slots__ cada objeto guarda solo
+# sus valores (sin el diccionario por instancia ni las claves repetidas en cada venta),
+# lo que con historiales grandes reduce bastante la memoria.
+#
+# Se leen igual que los diccionarios del JSON (venta["items"], item.get("subtotal"),
+# "id_venta" in venta), así las funciones que muestran o resumen ventas no cambian.
+# Las claves desconocidas del archivo se conservan en `otros` para no perder datos.
+#
+# Categoría, producto y email se repiten en miles de ventas: se internan, así todas las
+# ventas comparten un único objeto por valor distinto y la memoria crece con la cantidad
+# de valores distintos y no con la de apariciones. Además la comparación de dos strings
+# internados iguales se resuelve por identidad, sin recorrer los caracteres.
+
+
+def _compartido(valor):
+    return sys.intern(valor) if type(valor) is str else valor
+
+
+class _Registro:
+    __slots__ = ("otros",)
+    CAMPOS = ()
+    CONJUNTO_CAMPOS = frozenset()
+
+    def get(self, campo, default=None):
+        if campo in self.CAMPOS:
+            valor = getattr(self, campo)
+            return default if valor is None else valor
+        return self.otros.get(campo, default) if self.otros else default
+
+    def __getitem__(self, campo):
+        valor = self.get(campo)
+        if valor is None:
+            raise KeyError(campo)
+        return valor
+
+    def __contains__(self, campo):
+        return self.get(campo) is not None
+
+    def a_formato_disco(self):
+        """Diccionario con el mismo formato que tiene la venta en el JSON."""
+        datos = {campo: getattr(self, campo) for campo in self.CAMPOS if getattr(self, campo) is not None}
+        if self.otros:
+            datos.update(self.otros)
+        return datos
+
+    @classmethod
+    def desde_formato_disco(cls, datos):
+        # El snapshot puede devolver registros ya armados: esos se usan tal cual.
+        if isinstance(datos, cls):
+            return datos
+        valores = map(datos.get, cls.CAMPOS)
+        if datos.keys() <= cls.CONJUNTO_CAMPOS:
+            return cls(*valores)
+        otros = {clave: valor for clave, valor in datos.items() if clave not in cls.CONJUNTO_CAMPOS}
+        return cls(*valores, otros=otros)
+
+    def __eq__(self, otro):
+        if isinstance(otro, _Registro):
+            otro = otro.a_formato_disco()
+        if isinstance(otro, Mapping):
+            return self.a_formato_disco() == dict(otro)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.a_formato_disco()!r})"
+
+
+class ItemVenta(_Registro):
+    __slots__ = ("categoria", "producto", "cantidad", "precio_unitario", "subtotal")
+    CAMPOS = __slots__
+    CONJUNTO_CAMPOS = frozenset(CAMPOS)
+
+    def __init__(self, categoria, producto, cantidad, precio_unitario, subtotal, otros=None):
+        self.categoria = _compartido(categoria)
+        self.producto = _compartido(producto)
+        self.cantidad = cantidad
+        self.precio_unitario = precio_unitario
+        self.subtotal = subtotal
+        self.otros = otros
+
+
+class Venta(_Registro):
+    # id_venta y fecha quedan en None para las ventas viejas que no los tenían.
+    __slots__ = ("id_venta", "fecha", "cliente_email", "items", "costo_total")
+    CAMPOS = __slots__
+    CONJUNTO_CAMPOS = frozenset(CAMPOS)
+
+    def __init__(self, id_venta, fecha, cliente_email, items, costo_total, otros=None):
+        self.id_venta = id_venta
+        self.fecha = fecha
+        self.cliente_email = _compartido(cliente_email)
+        self.items = items
+        self.costo_total = costo_total
+        self.otros = otros
+
+    @classmethod
+    def desde_formato_disco(cls, datos):
+        if isinstance(datos, cls):
+            return datos
+        venta = super().desde_formato_disco(datos)
+        if venta.items is not None:
+            venta.items = list(map(ItemVenta.desde_formato_disco, venta.items))
+        return venta
+
+
+def ventas_desde_disco(historial):
+    """Convierte la lista de diccionarios leída del JSON en registros Venta."""
+    # Igual que al leer el snapshot: se crean millones de objetos que no forman ciclos,
+    # así que se pausa el recolector mientras se arman.
+    gc_activo = gc.isenabled()
+    gc.disable()
+    try:
+        return list(map(Venta.desde_formato_disco, historial))
+    finally:
+        if gc_activo:
+            gc.enable()
+
+
+# Los descuentos por promociones se guardan como ítems de esta categoría, con el nombre de
+# la promoción como producto, una unidad y precio negativo (ver negocio/promociones.py).
+# Suman al costo total pero no son unidades vendidas.
+CATEGORIA_PROMOCION = "promocion"
+
+
+def es_descuento(item):
+    return item.get("categoria") == CATEGORIA_PROMOCION
+
+
+def unidades_vendidas(venta):
+    return sum(item.get("cantidad", 0) for item in venta.get("items", []) if not es_descuento(item))
+
+
+# Conversiones para los formatos binarios del historial (columnas y libro de ventas):
+# montos en centavos enteros y fechas en segundos desde 1970.
+EPOCA = datetime(1970, 1, 1)
+SIN_FECHA = -(2 ** 63)
+
+
+def a_centavos(monto):
+    return round(monto * 100)
+
+
+def fecha_a_segundos(fecha):
+    if not fecha:
+        return SIN_FECHA
+    return int((datetime.fromisoformat(fecha) - EPOCA).total_seconds())
+
+
+def segundos_a_fecha(segundos):
+    if segundos == SIN_FECHA:
+        return None
+    return (EPOCA + timedelta(seconds=segundos)).isoformat(timespec="seconds")
@@ -0,0 +1,119 @@
+import csv
+import math
+import indices.catalogo as catalogo
+import log.logger as logger
+
+# Cambios de precio en bloque: un porcentaje o un monto fijo aplicado a una categoría o a
+# todo el catálogo, o los precios nuevos leídos de un archivo CSV (categoria,producto,precio).
+# Se modifican los diccionarios de precios en memoria en una sola pasada; guardar
+# precios.json queda a cargo de quien llama, una vez al final.
+#
+# Un ajuste nunca deja un precio negativo ni que no sea un número finito (NaN o infinito):
+# esos productos quedan con su precio anterior y se devuelven como omitidos. Solo se cuentan
+# como modificados los precios que de verdad cambiaron. Con categorías grandes el cálculo se hace con NumPy si está
+# instalado; sin NumPy se usa una comprensión de diccionario, con el mismo resultado.
+UMBRAL_NUMPY = 5_000
+DECIMALES = 2
+
+
+def _validar_finito(valor):
+    if not math.isfinite(valor):
+        raise ValueError(f"el ajuste tiene que ser un número finito y es {valor}")
+
+
+def ajuste_porcentual(porcentaje):
+    """(factor, suma) para subir (o bajar, si es negativo) los precios un porcentaje. Lanza ValueError si no es finito."""
+    _validar_finito(porcentaje)
+    return 1 + porcentaje / 100, 0.0
+
+
+def ajuste_fijo(monto):
+    """(factor, suma) para sumar (o restar, si es negativo) un monto a los precios. Lanza ValueError si no es finito."""
+    _validar_finito(monto)
+    return 1.0, monto
+
+
+def precio_valido(precio):
+    return math.isfinite(precio) and precio >= 0
+
+
+def _ajustar_con_numpy(numpy, precios_categoria, factor, suma):
+    productos = list(precios_categoria)
+    actuales = numpy.fromiter(precios_categoria.values(), dtype=float, count=len(productos))
+    nuevos = numpy.round(actuales * factor + suma, DECIMALES)
+    validos = numpy.isfinite(nuevos) & (nuevos >= 0)
+    cambiados = (validos & (nuevos != actuales)).tolist()
+    cambios = {producto: precio for producto, precio, cambiado in zip(productos, nuevos.tolist(), cambiados) if cambiado}
+    omitidos = [producto for producto, valido in zip(productos, validos.tolist()) if not valido]
+    return cambios, omitidos
+
+
+def _ajustar(precios_categoria, factor, suma):
+    if len(precios_categoria) >= UMBRAL_NUMPY:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        if numpy is not None:
+            return _ajustar_con_numpy(numpy, precios_categoria, factor, suma)
+
+    nuevos = {producto: round(precio * factor + suma, DECIMALES) for producto, precio in precios_categoria.items()}
+    omitidos = [producto for producto, precio in nuevos.items() if not precio_valido(precio)]
+    for producto in omitidos:
+        del nuevos[producto]
+    cambios = {producto: precio for producto, precio in nuevos.items() if precio != precios_categoria[producto]}
+    return cambios, omitidos
+
+
+def aplicar_ajuste(precios, factor, suma, categorias=None):
+    """
+    Aplica precio * factor + suma a las categorías indicadas (todas si es None).
+    Devuelve (cantidad de precios modificados, [(categoria, producto) omitidos]).
+    """
+    modificados = 0
+    omitidos = []
+    for categoria in (precios if categorias is None else categorias):
+        precios_categoria = precios[categoria]
+        nuevos, omitidos_categoria = _ajustar(precios_categoria, factor, suma)
+        precios_categoria.update(nuevos)
+        modificados += len(nuevos)
+        omitidos.extend((categoria, producto) for producto in omitidos_categoria)
+    logger.info(f"Ajuste de precios (x{factor} + {suma}): {modificados} modificados, {len(omitidos)} omitidos.")
+    return modificados, omitidos
+
+
+def aplicar_archivo(ruta_csv, precios):
+    """
+    Asigna los precios de un CSV categoria,producto,precio a productos que ya existen.
+    Devuelve (cantidad modificada, [(número de línea, motivo)] de las filas rechazadas).
+    """
+    modificados = 0
+    rechazados = []
+    with open(ruta_csv, newline="", encoding="utf-8-sig") as archivo:
+        for numero, fila in enumerate(csv.reader(archivo), 1):
+            if not fila or (numero == 1 and [c.strip().lower() for c in fila] == ["categoria", "producto", "precio"]):
+                continue
+            if len(fila) != 3:
+                rechazados.append((numero, f"se esperaban 3 columnas y hay {len(fila)}"))
+                continue
+            try:
+                precio = float(fila[2].replace(',', '.'))
+            except ValueError:
+                rechazados.append((numero, "precio inválido"))
+                continue
+            if not math.isfinite(precio):
+                rechazados.append((numero, "precio inválido"))
+                continue
+            if precio < 0:
+                rechazados.append((numero, "el precio no puede ser negativo"))
+                continue
+            categoria = catalogo.buscar_categoria(precios, fila[0])
+            producto = catalogo.buscar_producto(precios, categoria, fila[1]) if categoria is not None else None
+            if producto is None:
+                rechazados.append((numero, f"no existe el producto '{fila[1].strip()}' en '{fila[0].strip()}'"))
+                continue
+            if precios[categoria][producto] != precio:
+                precios[categoria][producto] = precio
+                modificados += 1
+    logger.info(f"Precios actualizados desde {ruta_csv}: {modificados} modificados, {len(rechazados)} rechazados.")
+    return modificados, rechazados
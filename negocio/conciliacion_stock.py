@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import modelos.ventas as modelo_ventas
+import persistencia.historial_segmentado as historial_segmentado
+import persistencia.indice_ventas as indice_ventas
+import persistencia.inventario_particionado as inventario_particionado
+import persistencia.wal as wal
+import log.logger as logger
+
+# Conciliación del stock contra el historial de ventas: partiendo de un inventario base
+# (por ejemplo una copia de stock.json de cuando se abrió la tienda), el stock de cada
+# producto tendría que ser el inicial menos las unidades vendidas. Los productos donde no
+# da se informan como discrepancias; un esperado negativo es una sobreventa, que
+# actualizar_stock dejó en 0. Las reposiciones cargadas a mano después de la base también
+# aparecen como diferencias, así que la base conviene tomarla después de la última.
+#
+# Las unidades vendidas se suman en varios procesos repartiendo el historial en fragmentos:
+# los segmentos del historial segmentado si existe, o tramos de VENTAS_POR_FRAGMENTO ventas
+# de historial_ventas.json ubicados con su índice (persistencia/indice_ventas.py). Cada
+# proceso lee y decodifica solo su parte y devuelve sus totales por producto.
+#
+# El stock actual se arma como lo ve la aplicación: del directorio particionado o del JSON,
+# con los parches aplicados. Las compras que siguen en el WAL (compras.wal, el RUTA_WAL de
+# TPO_FINAL) todavía no están ni en el stock ni en el historial de disco, así que con el WAL
+# pendiente no se concilia: hay que volcarlo antes abriendo y cerrando la aplicación.
+VENTAS_POR_FRAGMENTO = 50_000
+RUTA_WAL = "compras.wal"
+
+
+def fragmentos(ruta_historial, directorio_segmentos=None):
+    """Partes del historial que se pueden sumar por separado, como tareas para unidades_de_fragmento."""
+    if directorio_segmentos and historial_segmentado.existe(directorio_segmentos):
+        historial = historial_segmentado.HistorialSegmentado(directorio_segmentos)
+        return [("segmento", historial.ruta_segmento(segmento)) for segmento in historial.segmentos]
+    cantidad = indice_ventas.asegurar_indice(ruta_historial)
+    return [("json", ruta_historial, inicio, min(inicio + VENTAS_POR_FRAGMENTO, cantidad))
+            for inicio in range(0, cantidad, VENTAS_POR_FRAGMENTO)]
+
+
+def unidades_de_fragmento(tarea):
+    """{(categoria, producto): unidades vendidas} en un fragmento. Los descuentos no cuentan."""
+    if tarea[0] == "segmento":
+        ventas = historial_segmentado.ventas_de_archivo(tarea[1])
+    else:
+        ventas = indice_ventas.leer_ventas(*tarea[1:])
+    unidades = {}
+    for venta in ventas:
+        for item in venta.get("items", []):
+            if not modelo_ventas.es_descuento(item):
+                clave = (item["categoria"], item["producto"])
+                unidades[clave] = unidades.get(clave, 0) + item["cantidad"]
+    return unidades
+
+
+def unidades_vendidas(tareas, procesos=None):
+    """Suma los fragmentos en `procesos` procesos (uno por CPU si es None; con uno, en este mismo)."""
+    procesos = min(procesos or os.cpu_count() or 1, len(tareas))
+    if procesos <= 1:
+        return _juntar(map(unidades_de_fragmento, tareas))
+    # "spawn", como en la precarga de TPO_FINAL: el hijo importa solo este módulo.
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return _juntar(pool.map(unidades_de_fragmento, tareas))
+
+
+def _juntar(parciales):
+    total = {}
+    for parcial in parciales:
+        for clave, unidades in parcial.items():
+            total[clave] = total.get(clave, 0) + unidades
+    return total
+
+
+def conciliar(stock_base, stock_actual, vendidas):
+    """
+    Compara el stock actual con stock_base menos lo vendido. Devuelve una lista de
+    diccionarios (categoria, producto, inicial, vendidas, esperado, actual, diferencia)
+    con los productos que no coinciden, ordenada por categoría y producto.
+    """
+    productos = set(vendidas)
+    for stock in (stock_base, stock_actual):
+        productos.update((categoria, producto) for categoria, items in stock.items() for producto in items)
+
+    discrepancias = []
+    for categoria, producto in sorted(productos):
+        inicial = stock_base.get(categoria, {}).get(producto, 0)
+        vendidas_producto = vendidas.get((categoria, producto), 0)
+        esperado = inicial - vendidas_producto
+        actual = stock_actual.get(categoria, {}).get(producto, 0)
+        if actual != esperado:
+            discrepancias.append({"categoria": categoria, "producto": producto, "inicial": inicial,
+                                  "vendidas": vendidas_producto, "esperado": esperado, "actual": actual,
+                                  "diferencia": actual - esperado})
+    return discrepancias
+
+
+def conciliar_archivos(ruta_base, ruta_stock, ruta_historial, directorio_segmentos=None, procesos=None, ruta_wal=RUTA_WAL):
+    """
+    Lee los inventarios (JSON o directorio particionado; el actual con sus parches) y el
+    historial de disco y devuelve las discrepancias. Lanza RuntimeError si `ruta_wal` tiene
+    compras sin volcar.
+    """
+    pendientes = len(wal.leer(ruta_wal)) if ruta_wal else 0
+    if pendientes:
+        raise RuntimeError(f"{ruta_wal} tiene {pendientes} compras sin volcar al stock ni al historial: "
+                           f"abrí y cerrá la aplicación para volcarlas antes de conciliar.")
+    stock_base = inventario_particionado.leer(ruta_base)
+    stock_actual = inventario_particionado.leer(ruta_stock)
+    tareas = fragmentos(ruta_historial, directorio_segmentos)
+    vendidas = unidades_vendidas(tareas, procesos)
+    discrepancias = conciliar(stock_base, stock_actual, vendidas)
+    logger.info(f"Conciliación de {ruta_stock} contra {ruta_base}: {len(tareas)} fragmentos del historial, "
+                f"{len(discrepancias)} discrepancias.")
+    return discrepancias
+
+
+if __name__ == "__main__":
+    # python -m negocio.conciliacion_stock stock_base.json stock.json historial_ventas.json [historial]
+    if len(sys.argv) not in (4, 5):
+        print("Uso: python -m negocio.conciliacion_stock <stock base> <stock actual> <historial.json> [directorio de segmentos]")
+        sys.exit(1)
+    try:
+        discrepancias = conciliar_archivos(*sys.argv[1:])
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(2)
+    for fila in discrepancias:
+        aviso = "  (sobreventa)" if fila["esperado"] < 0 else ""
+        print(f"{fila['categoria']:<20} {fila['producto']:<25} inicial {fila['inicial']:>7} vendidas {fila['vendidas']:>7} "
+              f"esperado {fila['esperado']:>7} actual {fila['actual']:>7} diferencia {fila['diferencia']:>+7}{aviso}")
+    print(f"{len(discrepancias)} productos con discrepancias.")
+    sys.exit(1 if discrepancias else 0)
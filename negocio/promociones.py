@@ -0,0 +1,120 @@
+import os
+import persistencia.codec as codec
+import modelos.ventas as modelo_ventas
+import log.logger as logger
+
+# Promociones aplicadas al confirmar una compra. Las reglas se escriben en promociones.json:
+#
+#   [{"nombre": "3x2 en chanclas", "tipo": "lleva_paga", "categoria": "chanclas", "lleva": 3, "paga": 2},
+#    {"nombre": "10% off en zapatos sobre $200", "tipo": "porcentaje", "categoria": "zapatos",
+#     "porcentaje": 10, "minimo": 200},
+#    {"nombre": "$5 off en la taza grande", "tipo": "monto", "categoria": "tazas", "producto": "grande", "monto": 5}]
+#
+# Una regla con "producto" vale solo para ese producto; sin "producto", para toda la
+# categoría (las unidades de distintos productos se juntan, como en "3x2 en chanclas").
+# "minimo" es opcional: el subtotal de lo que cubre la regla tiene que llegar a ese monto.
+# Los productos se comparan con las claves del stock (en minúsculas).
+#
+# Al cargarlas se compilan en dos tablas, {categoria: [reglas]} y {(categoria, producto):
+# [reglas]}, así evaluar un carrito cuesta una consulta por línea del carrito sin importar
+# cuántas reglas haya. Cada promoción que aplica se devuelve como un descuento que se
+# agrega a los ítems de la venta (ver modelos/ventas.py, CATEGORIA_PROMOCION).
+TIPOS = ("lleva_paga", "porcentaje", "monto")
+
+_cache = {}
+
+
+def validar_regla(regla):
+    """Lanza ValueError con el motivo si la regla no se puede usar."""
+    if not regla.get("nombre") or not regla.get("categoria"):
+        raise ValueError("la regla necesita 'nombre' y 'categoria'")
+    tipo = regla.get("tipo")
+    if tipo not in TIPOS:
+        raise ValueError(f"tipo de promoción desconocido '{tipo}'")
+    if tipo == "lleva_paga" and not 0 <= regla.get("paga", -1) < regla.get("lleva", 0):
+        raise ValueError("'lleva' tiene que ser mayor que 'paga'")
+    if tipo == "porcentaje" and not 0 < regla.get("porcentaje", 0) <= 100:
+        raise ValueError("'porcentaje' tiene que estar entre 0 y 100")
+    if tipo == "monto" and not regla.get("monto", 0) > 0:
+        raise ValueError("'monto' tiene que ser positivo")
+
+
+def compilar(reglas):
+    """Arma las tablas de búsqueda por categoría y por producto. Las reglas inválidas se descartan."""
+    compiladas = {"categorias": {}, "productos": {}}
+    for numero, regla in enumerate(reglas, 1):
+        try:
+            validar_regla(regla)
+        except ValueError as e:
+            logger.error(f"Promoción {numero} ('{regla.get('nombre', '?')}') descartada: {e}")
+            continue
+        if regla.get("producto"):
+            compiladas["productos"].setdefault((regla["categoria"], regla["producto"]), []).append(regla)
+        else:
+            compiladas["categorias"].setdefault(regla["categoria"], []).append(regla)
+    return compiladas
+
+
+def cargar(ruta):
+    """Promociones compiladas de `ruta` (ninguna si no existe). Se recompilan solo si el archivo cambió."""
+    if not os.path.exists(ruta):
+        return compilar([])
+    firma = os.stat(ruta).st_mtime_ns
+    guardadas = _cache.get(ruta)
+    if guardadas is None or guardadas[0] != firma:
+        with open(ruta, "rb") as archivo:
+            guardadas = (firma, compilar(codec.decodificar(archivo.read())))
+        _cache[ruta] = guardadas
+        logger.info(f"Promociones cargadas desde {ruta}.")
+    return guardadas[1]
+
+
+def _descuento(regla, cantidad, subtotal, precios_unitarios):
+    if subtotal < regla.get("minimo", 0):
+        return 0.0
+    tipo = regla["tipo"]
+    if tipo == "porcentaje":
+        return subtotal * regla["porcentaje"] / 100
+    if tipo == "monto":
+        return min(regla["monto"], subtotal)
+    # lleva_paga: por cada `lleva` unidades, las `lleva - paga` más baratas no se cobran.
+    gratis = cantidad // regla["lleva"] * (regla["lleva"] - regla["paga"])
+    descuento = 0.0
+    for precio, unidades in sorted(precios_unitarios):
+        if gratis <= 0:
+            break
+        descuento += precio * min(unidades, gratis)
+        gratis -= unidades
+    return descuento
+
+
+def aplicar(promociones, lineas):
+    """
+    Evalúa las promociones sobre las líneas del carrito, (categoria, producto, cantidad,
+    precio unitario). Devuelve [(nombre de la promoción, monto descontado)]; si varias
+    reglas cubren el mismo producto se aplican todas, pero entre todas no descuentan más que
+    el subtotal del carrito (la última que no entra se recorta).
+    """
+    # Por regla: [regla, cantidad, subtotal, [(precio unitario, cantidad)]] de las líneas que cubre.
+    acumulado = {}
+    for categoria, producto, cantidad, precio_unitario in lineas:
+        reglas = promociones["productos"].get((categoria, producto), []) + promociones["categorias"].get(categoria, [])
+        for regla in reglas:
+            grupo = acumulado.setdefault(id(regla), [regla, 0, 0.0, []])
+            grupo[1] += cantidad
+            grupo[2] += cantidad * precio_unitario
+            grupo[3].append((precio_unitario, cantidad))
+
+    descuentos = []
+    disponible = round(sum(cantidad * precio_unitario for _, _, cantidad, precio_unitario in lineas), 2)
+    for regla, cantidad, subtotal, precios_unitarios in acumulado.values():
+        monto = min(round(_descuento(regla, cantidad, subtotal, precios_unitarios), 2), disponible)
+        if monto > 0:
+            descuentos.append((regla["nombre"], monto))
+            disponible = round(disponible - monto, 2)
+    return descuentos
+
+
+def item_de_descuento(nombre, monto):
+    """Línea que se agrega a los ítems de la venta: una unidad de la promoción a precio negativo."""
+    return modelo_ventas.ItemVenta(modelo_ventas.CATEGORIA_PROMOCION, nombre, 1, -monto, -monto)
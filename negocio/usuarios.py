@@ -0,0 +1,114 @@
+import csv
+import re
+import persistencia.codec as codec
+import log.logger as logger
+
+# Reglas de validación de los usuarios y alta de usuarios en bloque desde un archivo.
+#
+# Los patrones se compilan una sola vez al importar el módulo: re.match con el patrón como
+# string lo busca en la caché de re en cada llamada, que con un millón de registros pesa.
+#
+# La importación acepta CSV (email,nombre,contraseña), JSON Lines (.jsonl, un objeto con
+# esas claves por línea) o un arreglo JSON de esos objetos (.json) y devuelve los usuarios aceptados sin tocar `usuarios`: quien llama
+# los agrega todos juntos y guarda usuarios.json una sola vez.
+PATRON_EMAIL = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+# 6 caracteres o más, con al menos una mayúscula, un número y un caracter especial.
+PATRON_CONTRASEÑA = re.compile(r'^(?=.*[A-Z])(?=.*\d)(?=.*[@$!%*?&()])[A-Za-z\d@$!%*?&()]{6,}$')
+COLUMNAS = ("email", "nombre", "contraseña")
+
+
+def formato_email_valido(email):
+    return PATRON_EMAIL.match(email) is not None
+
+
+def contraseña_valida(contraseña):
+    return PATRON_CONTRASEÑA.match(contraseña) is not None
+
+
+def _registros_csv(archivo):
+    for numero, fila in enumerate(csv.reader(archivo), 1):
+        if not fila or (numero == 1 and tuple(c.strip().lower() for c in fila) == COLUMNAS):
+            continue
+        yield numero, dict(zip(COLUMNAS, fila)) if len(fila) == len(COLUMNAS) else None
+
+
+def _registros_jsonl(archivo):
+    for numero, linea in enumerate(archivo, 1):
+        if not linea.strip():
+            continue
+        try:
+            registro = codec.decodificar(linea)
+        except ValueError:
+            registro = None
+        yield numero, registro if isinstance(registro, dict) else None
+
+
+def _registros_json(archivo):
+    # Un arreglo JSON no se puede leer de a partes: se decodifica entero y cada usuario se
+    # numera por su posición en el arreglo.
+    try:
+        registros = codec.decodificar(archivo.read())
+    except ValueError as e:
+        raise ValueError(f"el archivo no es JSON válido: {e}") from e
+    if not isinstance(registros, list):
+        raise ValueError("el archivo JSON tiene que ser un arreglo de usuarios")
+    for numero, registro in enumerate(registros, 1):
+        yield numero, registro if isinstance(registro, dict) else None
+
+
+def leer_registros(ruta):
+    """
+    Recorre el archivo de a un registro: (número de línea, dict o None si la línea no se
+    pudo leer). En un arreglo JSON el número es la posición del usuario en el arreglo.
+    Lanza ValueError si un .json no es un arreglo JSON válido.
+    """
+    extension = ruta.lower().rsplit(".", 1)[-1]
+    lector = {"jsonl": _registros_jsonl, "json": _registros_json}.get(extension, _registros_csv)
+    with open(ruta, newline="", encoding="utf-8-sig") as archivo:
+        yield from lector(archivo)
+
+
+def validar_registro(registro, usuarios, nuevos):
+    """Devuelve (email, datos del usuario) o lanza ValueError con el motivo del rechazo."""
+    if registro is None:
+        raise ValueError("línea con formato inválido")
+    email = str(registro.get("email") or "").strip().lower()
+    nombre = str(registro.get("nombre") or "").strip()
+    contraseña = str(registro.get("contraseña") or "")
+    if not formato_email_valido(email):
+        raise ValueError(f"email inválido '{email}'")
+    if email in usuarios:
+        raise ValueError(f"el email '{email}' ya está registrado")
+    if email in nuevos:
+        raise ValueError(f"el email '{email}' está repetido en el archivo")
+    if not nombre:
+        raise ValueError("el nombre no puede estar vacío")
+    if not contraseña_valida(contraseña):
+        raise ValueError("la contraseña no cumple los requisitos")
+    return email, {"nombre": nombre, "contraseña": contraseña, "rol": "cliente", "activo": True}
+
+
+def importar(ruta, usuarios):
+    """
+    Valida los usuarios del archivo en una pasada contra `usuarios` y contra los ya leídos.
+    Devuelve ({email: datos} aceptados, [(número de línea, motivo)] rechazados).
+    """
+    nuevos = {}
+    rechazados = []
+    for numero, registro in leer_registros(ruta):
+        try:
+            email, datos = validar_registro(registro, usuarios, nuevos)
+        except ValueError as e:
+            rechazados.append((numero, str(e)))
+            continue
+        nuevos[email] = datos
+    logger.info(f"Usuarios leídos de {ruta}: {len(nuevos)} aceptados, {len(rechazados)} rechazados.")
+    return nuevos, rechazados
+
+
+def escribir_rechazos(ruta, rechazados):
+    """Guarda el detalle de los rechazos como CSV linea,motivo."""
+    with open(ruta, "w", newline="", encoding="utf-8") as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(("linea", "motivo"))
+        escritor.writerows(rechazados)
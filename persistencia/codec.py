@@ -0,0 +1,54 @@
+import json
+
+# Codificación JSON de los archivos de datos. Si está instalado orjson se usa para
+# leer y escribir (bastante más rápido); si no, se usa el módulo json estándar.
+# Los dos producen y aceptan el mismo JSON, así que los archivos sirven para ambos.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def a_formato_disco(objeto):
+    """Convierte a algo serializable los objetos propios que sepan hacerlo."""
+    if hasattr(objeto, "a_formato_disco"):
+        return objeto.a_formato_disco()
+    raise TypeError(f"No se puede guardar un objeto de tipo {type(objeto).__name__} en JSON")
+
+
+def _codificar_json(datos, legible):
+    if legible:
+        texto = json.dumps(datos, indent=4, ensure_ascii=False, default=a_formato_disco)
+    else:
+        texto = json.dumps(datos, separators=(",", ":"), ensure_ascii=False, default=a_formato_disco)
+    return texto.encode("utf-8")
+
+
+def _decodificar_json(contenido):
+    return json.loads(contenido)
+
+
+def _codificar_orjson(datos, legible):
+    opciones = orjson.OPT_INDENT_2 if legible else 0
+    return orjson.dumps(datos, default=a_formato_disco, option=opciones)
+
+
+def _decodificar_orjson(contenido):
+    return orjson.loads(contenido)
+
+
+MOTORES = {"json": (_codificar_json, _decodificar_json)}
+if orjson is not None:
+    MOTORES["orjson"] = (_codificar_orjson, _decodificar_orjson)
+
+MOTOR = "orjson" if "orjson" in MOTORES else "json"
+
+
+def codificar(datos, legible=True, motor=None):
+    """Devuelve los bytes UTF-8 del JSON. Con legible=False no agrega sangría ni espacios."""
+    return MOTORES[motor or MOTOR][0](datos, legible)
+
+
+def decodificar(contenido, motor=None):
+    """Interpreta JSON recibido como bytes o como texto."""
+    return MOTORES[motor or MOTOR][1](contenido)
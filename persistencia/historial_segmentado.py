@@ -0,0 +1,343 @@
+import bisect
+import gzip
+import os
+import shutil
+import sys
+import modelos.ventas as modelo_ventas
+import persistencia.codec as codec
+import log.logger as logger
+
+# Historial de ventas partido en segmentos: archivos JSON Lines (una venta por línea) de
+# hasta MAX_VENTAS_POR_SEGMENTO ventas y de un solo mes cada uno. Solo el último segmento
+# recibe ventas nuevas; los anteriores quedan sellados y no se vuelven a modificar.
+#
+# manifiesto.json resume cada segmento (rango de ids y de fechas, cantidad de ventas,
+# ingresos y unidades), así las consultas abren solo los segmentos que necesitan y los
+# totales de los segmentos completos salen del manifiesto sin leerlos.
+#
+# Los segmentos sellados se guardan comprimidos con gzip (segmento_NNNNNN.jsonl.gz): son
+# los que ocupan casi todo el disco y casi no se leen. Se leen descomprimiendo de a
+# bloques mientras se recorren las líneas, sin inflar el archivo entero en memoria.
+#
+# Cada venta se escribe solo en el segmento activo: el manifiesto se reescribe al abrir un
+# segmento nuevo (sellando el anterior) y al llamar a guardar(), por ejemplo al salir. Si
+# el manifiesto quedó atrás (o el proceso se cortó), al abrir se vuelve a contar el segmento
+# activo y se descarta una línea escrita a medias, así los totales nunca quedan viejos.
+# Conviene abrir el historial una sola vez por proceso: cada apertura lee el segmento activo.
+MANIFIESTO = "manifiesto.json"
+MAX_VENTAS_POR_SEGMENTO = 10_000
+COMPRIMIR_SELLADOS = True
+NIVEL_COMPRESION = 6
+
+
+def existe(directorio):
+    return os.path.exists(os.path.join(directorio, MANIFIESTO))
+
+
+def _escribir_atomico(ruta, contenido):
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def _abrir_segmento(ruta):
+    return gzip.open(ruta, "rb") if ruta.endswith(".gz") else open(ruta, "rb")
+
+
+def ventas_de_archivo(ruta):
+    """Recorre las ventas (como diccionarios) de un archivo de segmento, plano o comprimido."""
+    with _abrir_segmento(ruta) as archivo:
+        for linea in archivo:
+            if linea.strip():
+                yield codec.decodificar(linea)
+
+
+def _comprimir(ruta):
+    """Comprime el archivo a <ruta>.gz (sin borrar el original) y devuelve la ruta nueva."""
+    destino = ruta + ".gz"
+    with open(ruta, "rb") as origen, gzip.open(destino + ".tmp", "wb", compresslevel=NIVEL_COMPRESION) as comprimido:
+        shutil.copyfileobj(origen, comprimido, 1 << 20)
+    os.replace(destino + ".tmp", destino)
+    return destino
+
+
+def _nuevo_segmento(numero):
+    return {
+        "archivo": f"segmento_{numero:06d}.jsonl",
+        "primer_id": None, "ultimo_id": None,
+        "desde": None, "hasta": None, "sin_fecha": 0,
+        "ventas": 0, "ingresos": 0.0, "unidades": 0,
+        "sellado": False,
+    }
+
+
+def _sumar_al_segmento(segmento, venta):
+    id_venta, fecha = venta.get("id_venta"), venta.get("fecha")
+    if id_venta is not None:
+        segmento["primer_id"] = id_venta if segmento["primer_id"] is None else segmento["primer_id"]
+        segmento["ultimo_id"] = id_venta
+    if fecha:
+        segmento["desde"] = segmento["desde"] or fecha
+        segmento["hasta"] = fecha
+    else:
+        segmento["sin_fecha"] += 1
+    segmento["ventas"] += 1
+    segmento["ingresos"] += venta.get("costo_total", 0.0)
+    segmento["unidades"] += modelo_ventas.unidades_vendidas(venta)
+
+
+def _hay_que_rotar(segmento, venta, max_ventas):
+    if segmento["ventas"] >= max_ventas:
+        return True
+    fecha = venta.get("fecha")
+    return bool(fecha and segmento["desde"] and fecha[:7] != segmento["desde"][:7])
+
+
+class HistorialSegmentado:
+    """
+    Historial guardado en segmentos. Se comporta como la lista de ventas (len, índices,
+    slices, iterar, append) devolviendo registros Venta, y cada acceso abre solo los
+    segmentos donde están las ventas pedidas.
+    """
+
+    def __init__(self, directorio, max_ventas_por_segmento=MAX_VENTAS_POR_SEGMENTO, comprimir=COMPRIMIR_SELLADOS):
+        self.directorio = directorio
+        self.max_ventas = max_ventas_por_segmento
+        self.comprimir = comprimir
+        ruta = os.path.join(directorio, MANIFIESTO)
+        if os.path.exists(ruta):
+            with open(ruta, "rb") as archivo:
+                self.segmentos = codec.decodificar(archivo.read())["segmentos"]
+        else:
+            self.segmentos = []
+        self._manifiesto_al_dia = True
+        self._recontar_activo()
+        self._recalcular_posiciones()
+
+    def _recontar_activo(self):
+        siguiente = _nuevo_segmento(len(self.segmentos) + 1)
+        if os.path.exists(self.ruta_segmento(siguiente)):
+            # Se cortó justo después de rotar: el segmento nuevo no llegó al manifiesto.
+            if self.segmentos:
+                self.segmentos[-1]["sellado"] = True
+            self.segmentos.append(siguiente)
+        if not self.segmentos or self.segmentos[-1]["sellado"]:
+            return
+        activo = self.segmentos[-1]
+        ruta = self.ruta_segmento(activo)
+        contenido = b""
+        if os.path.exists(ruta):
+            with open(ruta, "r+b") as archivo:
+                contenido = archivo.read()
+                if not contenido.endswith(b"\n"):
+                    contenido = contenido[:contenido.rfind(b"\n") + 1]
+                    archivo.truncate(len(contenido))
+        lineas = [linea for linea in contenido.split(b"\n") if linea.strip()]
+        if len(lineas) == activo["ventas"]:
+            return
+        recontado = _nuevo_segmento(len(self.segmentos))
+        for linea in lineas:
+            _sumar_al_segmento(recontado, codec.decodificar(linea))
+        self.segmentos[-1] = recontado
+        self._guardar_manifiesto()
+        logger.debug(f"Segmento {activo['archivo']} vuelto a contar: el manifiesto decía {activo['ventas']} ventas y tiene {len(lineas)}.")
+
+    def _recalcular_posiciones(self):
+        # inicios[i] es la posición (en todo el historial) de la primera venta del segmento i.
+        self.inicios = []
+        total = 0
+        for segmento in self.segmentos:
+            self.inicios.append(total)
+            total += segmento["ventas"]
+        self.cantidad = total
+
+    def _guardar_manifiesto(self):
+        os.makedirs(self.directorio, exist_ok=True)
+        contenido = codec.codificar({"segmentos": self.segmentos}, legible=False)
+        _escribir_atomico(os.path.join(self.directorio, MANIFIESTO), contenido)
+        self._manifiesto_al_dia = True
+
+    def guardar(self):
+        """Escribe el manifiesto si tiene ventas agregadas desde la última vez. Devuelve True si lo escribió."""
+        if self._manifiesto_al_dia:
+            return False
+        self._guardar_manifiesto()
+        return True
+
+    def ruta_segmento(self, segmento):
+        return os.path.join(self.directorio, segmento["archivo"])
+
+    def leer_segmento(self, segmento):
+        """Recorre las ventas de un segmento línea por línea, sin cargar el archivo entero."""
+        for venta in ventas_de_archivo(self.ruta_segmento(segmento)):
+            yield modelo_ventas.Venta.desde_formato_disco(venta)
+
+    def __len__(self):
+        return self.cantidad
+
+    def ultimo_id(self):
+        """Id de la última venta con id (0 si no hay), leído del manifiesto."""
+        return next((segmento["ultimo_id"] for segmento in reversed(self.segmentos) if segmento["ultimo_id"] is not None), 0)
+
+    def _ventas_entre_posiciones(self, inicio, fin):
+        ventas = []
+        primero = bisect.bisect_right(self.inicios, inicio) - 1
+        for numero in range(max(primero, 0), len(self.segmentos)):
+            base = self.inicios[numero]
+            if base >= fin:
+                break
+            for posicion, venta in enumerate(self.leer_segmento(self.segmentos[numero]), base):
+                if posicion >= fin:
+                    break
+                if posicion >= inicio:
+                    ventas.append(venta)
+        return ventas
+
+    def __getitem__(self, posicion):
+        if isinstance(posicion, slice):
+            inicio, fin, paso = posicion.indices(self.cantidad)
+            ventas = self._ventas_entre_posiciones(inicio, fin) if inicio < fin else []
+            return ventas[::paso] if paso != 1 else ventas
+        if posicion < 0:
+            posicion += self.cantidad
+        if not 0 <= posicion < self.cantidad:
+            raise IndexError("índice de venta fuera de rango")
+        return self._ventas_entre_posiciones(posicion, posicion + 1)[0]
+
+    def __iter__(self):
+        for segmento in list(self.segmentos):
+            yield from self.leer_segmento(segmento)
+
+    def append(self, venta):
+        """
+        Agrega la venta al segmento activo; si está lleno o es de otro mes, lo sella y abre
+        uno nuevo. El manifiesto se escribe solo al abrir un segmento (ver guardar()).
+        """
+        rotar = not self.segmentos or _hay_que_rotar(self.segmentos[-1], venta, self.max_ventas)
+        if rotar:
+            if self.segmentos:
+                self.sellar(self.segmentos[-1])
+            self.segmentos.append(_nuevo_segmento(len(self.segmentos) + 1))
+        activo = self.segmentos[-1]
+
+        os.makedirs(self.directorio, exist_ok=True)
+        with open(self.ruta_segmento(activo), "ab") as archivo:
+            archivo.write(codec.codificar(venta, legible=False) + b"\n")
+        _sumar_al_segmento(activo, venta)
+        self._manifiesto_al_dia = False
+        if rotar:
+            self._guardar_manifiesto()
+        self._recalcular_posiciones()
+
+    def sellar(self, segmento):
+        segmento["sellado"] = True
+        logger.info(f"Segmento {segmento['archivo']} sellado con {segmento['ventas']} ventas.")
+        if self.comprimir:
+            self._comprimir_segmento(segmento)
+
+    def _comprimir_segmento(self, segmento):
+        # El manifiesto pasa a apuntar al .gz antes de borrar el original: si el proceso se
+        # corta en el medio queda un archivo de más, pero nunca un segmento perdido.
+        original = self.ruta_segmento(segmento)
+        segmento["archivo"] = os.path.basename(_comprimir(original))
+        self._guardar_manifiesto()
+        os.remove(original)
+
+    def comprimir_sellados(self):
+        """Comprime los segmentos sellados que todavía estén sin comprimir. Devuelve cuántos."""
+        pendientes = [s for s in self.segmentos if s["sellado"] and not s["archivo"].endswith(".gz")]
+        for segmento in pendientes:
+            self._comprimir_segmento(segmento)
+        return len(pendientes)
+
+    def ventas_entre_ids(self, primer_id, ultimo_id):
+        """Ventas con id en [primer_id, ultimo_id], abriendo solo los segmentos que se cruzan con el rango."""
+        for segmento in self.segmentos:
+            if segmento["primer_id"] is None or segmento["ultimo_id"] < primer_id or segmento["primer_id"] > ultimo_id:
+                continue
+            for venta in self.leer_segmento(segmento):
+                if primer_id <= venta.get("id_venta", 0) <= ultimo_id:
+                    yield venta
+
+    def ventas_entre(self, desde, hasta):
+        """Ventas con fecha entre `desde` y `hasta` (date, ambas incluidas), abriendo solo los segmentos del rango."""
+        desde, hasta = desde.isoformat(), hasta.isoformat()
+        for segmento in self.segmentos:
+            if segmento["desde"] is None or segmento["hasta"][:10] < desde or segmento["desde"][:10] > hasta:
+                continue
+            for venta in self.leer_segmento(segmento):
+                fecha = venta.get("fecha")
+                if fecha and desde <= fecha[:10] <= hasta:
+                    yield venta
+
+    def totales(self):
+        """Totales de todo el historial, sumados desde el manifiesto."""
+        return {campo: sum(segmento[campo] for segmento in self.segmentos) for campo in ("ingresos", "unidades", "ventas")}
+
+    def totales_entre(self, desde, hasta):
+        """
+        Totales de las ventas con fecha entre `desde` y `hasta` (date, ambas incluidas).
+        Los segmentos que caen enteros en el rango se suman desde el manifiesto; los que
+        quedan afuera no se abren y solo se recorren los de los bordes.
+        """
+        desde, hasta = desde.isoformat(), hasta.isoformat()
+        total = {"ingresos": 0.0, "unidades": 0, "ventas": 0}
+        for segmento in self.segmentos:
+            if segmento["desde"] is None or segmento["hasta"][:10] < desde or segmento["desde"][:10] > hasta:
+                continue
+            if segmento["sin_fecha"] == 0 and desde <= segmento["desde"][:10] and segmento["hasta"][:10] <= hasta:
+                for campo in total:
+                    total[campo] += segmento[campo]
+                continue
+            for venta in self.leer_segmento(segmento):
+                fecha = venta.get("fecha")
+                if fecha and desde <= fecha[:10] <= hasta:
+                    total["ingresos"] += venta.get("costo_total", 0.0)
+                    total["unidades"] += modelo_ventas.unidades_vendidas(venta)
+                    total["ventas"] += 1
+        return total
+
+
+def segmentar_json(ruta_json, directorio, max_ventas_por_segmento=MAX_VENTAS_POR_SEGMENTO, comprimir=COMPRIMIR_SELLADOS):
+    """
+    Arma el historial segmentado a partir de historial_ventas.json (los sellados se escriben
+    ya comprimidos si `comprimir`). Devuelve la cantidad de segmentos.
+    """
+    with open(ruta_json, "rb") as archivo:
+        historial = codec.decodificar(archivo.read())
+
+    segmentos = []
+    lineas = []
+
+    def cerrar_segmento(sellado):
+        contenido = b"".join(lineas)
+        if sellado and comprimir:
+            segmentos[-1]["archivo"] += ".gz"
+            contenido = gzip.compress(contenido, compresslevel=NIVEL_COMPRESION)
+        segmentos[-1]["sellado"] = sellado
+        _escribir_atomico(os.path.join(directorio, segmentos[-1]["archivo"]), contenido)
+        lineas.clear()
+
+    os.makedirs(directorio, exist_ok=True)
+    for venta in historial:
+        if not segmentos or _hay_que_rotar(segmentos[-1], venta, max_ventas_por_segmento):
+            if segmentos:
+                cerrar_segmento(sellado=True)
+            segmentos.append(_nuevo_segmento(len(segmentos) + 1))
+        lineas.append(codec.codificar(venta, legible=False) + b"\n")
+        _sumar_al_segmento(segmentos[-1], venta)
+    if segmentos:
+        cerrar_segmento(sellado=False)
+
+    _escribir_atomico(os.path.join(directorio, MANIFIESTO), codec.codificar({"segmentos": segmentos}, legible=False))
+    logger.info(f"Historial {ruta_json} segmentado en {directorio}: {len(historial)} ventas, {len(segmentos)} segmentos.")
+    return len(segmentos)
+
+
+if __name__ == "__main__":
+    # python -m persistencia.historial_segmentado historial_ventas.json historial
+    if len(sys.argv) != 3:
+        print("Uso: python -m persistencia.historial_segmentado <historial.json> <directorio>")
+        sys.exit(1)
+    print(f"{segmentar_json(sys.argv[1], sys.argv[2])} segmentos creados.")
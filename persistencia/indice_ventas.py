@@ -0,0 +1,205 @@
+import hashlib
+import mmap
+import os
+import re
+import struct
+import persistencia.codec as codec
+import log.logger as logger
+
+# Índice de posiciones de cada venta dentro de historial_ventas.json, para poder leer
+# una página del historial sin cargar el archivo entero.
+#
+# El índice se guarda al lado del JSON (<ruta>.idx) con este formato:
+#   encabezado: MAGIA, tamaño y mtime del JSON indexado, cantidad de ventas y un hash
+#               de la última venta indexada
+#   entradas:   (inicio, fin) en bytes de cada venta, como enteros de 8 bytes
+MAGIA = b"IDXVTA01"
+ENCABEZADO = struct.Struct("<8sQQQ16s")
+ENTRADA = struct.Struct("<QQ")
+
+# Cada coincidencia salta strings y caracteres comunes y se detiene en el próximo
+# caracter estructural ({ } [ ]), así el bucle en Python da pocas vueltas por venta.
+# Los strings se recorren "desenrollados" (tramos sin comillas ni barras de una vez).
+_ESTRUCTURA = re.compile(rb'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*([{}\[\]])')
+
+
+def ruta_indice(ruta_historial):
+    return ruta_historial + ".idx"
+
+
+def _hash_venta(datos, inicio, fin):
+    return hashlib.blake2b(datos[inicio:fin], digest_size=16).digest()
+
+
+def _buscar_ventas(datos, desde):
+    """
+    Recorre `datos` desde la posición `desde` y devuelve las posiciones (inicio, fin) de
+    los elementos de primer nivel del arreglo JSON que empiezan ahí.
+    Si `desde` es 0 se espera encontrar el "[" que abre el arreglo.
+    """
+    posiciones = []
+    profundidad = 0 if desde == 0 else 1
+    inicio = None
+    for coincidencia in _ESTRUCTURA.finditer(datos, desde):
+        caracter = coincidencia.group(1)
+        if caracter in b"{[":
+            if profundidad == 1:
+                inicio = coincidencia.end() - 1
+            profundidad += 1
+        else:
+            profundidad -= 1
+            if profundidad == 1:
+                posiciones.append((inicio, coincidencia.end()))
+            elif profundidad == 0:
+                break
+    return posiciones
+
+
+def _leer_encabezado(ruta_idx):
+    try:
+        with open(ruta_idx, "rb") as archivo:
+            magia, tamaño, mtime_ns, cantidad, hash_ultima = ENCABEZADO.unpack(archivo.read(ENCABEZADO.size))
+    except (OSError, struct.error):
+        return None
+    if magia != MAGIA:
+        return None
+    return tamaño, mtime_ns, cantidad, hash_ultima
+
+
+def _leer_entradas(ruta_idx, desde, hasta):
+    with open(ruta_idx, "rb") as archivo:
+        archivo.seek(ENCABEZADO.size + desde * ENTRADA.size)
+        bloque = archivo.read((hasta - desde) * ENTRADA.size)
+    return list(ENTRADA.iter_unpack(bloque))
+
+
+def _escribir_indice(ruta_idx, estado, posiciones, hash_ultima, agregar_desde=None):
+    encabezado_nuevo = lambda cantidad: ENCABEZADO.pack(MAGIA, estado.st_size, estado.st_mtime_ns, cantidad, hash_ultima)
+    entradas = b"".join(ENTRADA.pack(inicio, fin) for inicio, fin in posiciones)
+
+    if agregar_desde is None:
+        temporal = ruta_idx + ".tmp"
+        with open(temporal, "wb") as archivo:
+            archivo.write(encabezado_nuevo(len(posiciones)))
+            archivo.write(entradas)
+        os.replace(temporal, ruta_idx)
+        return len(posiciones)
+
+    # Las ventas viejas no cambiaron: se agregan las nuevas y se actualiza el encabezado.
+    cantidad = agregar_desde + len(posiciones)
+    with open(ruta_idx, "r+b") as archivo:
+        archivo.seek(ENCABEZADO.size + agregar_desde * ENTRADA.size)
+        archivo.write(entradas)
+        archivo.truncate()
+        archivo.seek(0)
+        archivo.write(encabezado_nuevo(cantidad))
+    return cantidad
+
+
+def asegurar_indice(ruta_historial):
+    """
+    Deja el índice al día con el archivo y devuelve la cantidad de ventas.
+
+    Si el archivo no cambió, solo se lee el encabezado. Si creció y la última venta
+    indexada sigue igual y en el mismo lugar (el historial solo se agrega al final),
+    se indexan únicamente las ventas nuevas. En cualquier otro caso se reconstruye.
+    """
+    if not os.path.exists(ruta_historial) or os.path.getsize(ruta_historial) == 0:
+        return 0
+
+    ruta_idx = ruta_indice(ruta_historial)
+    estado = os.stat(ruta_historial)
+    encabezado = _leer_encabezado(ruta_idx)
+    if encabezado and encabezado[0] == estado.st_size and encabezado[1] == estado.st_mtime_ns:
+        return encabezado[2]
+
+    with open(ruta_historial, "rb") as archivo, mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+        agregar_desde = None
+        desde = 0
+        if encabezado and encabezado[2] > 0 and estado.st_size > encabezado[0]:
+            cantidad_previa = encabezado[2]
+            inicio, fin = _leer_entradas(ruta_idx, cantidad_previa - 1, cantidad_previa)[0]
+            if _hash_venta(datos, inicio, fin) == encabezado[3]:
+                agregar_desde, desde = cantidad_previa, fin
+
+        posiciones = _buscar_ventas(datos, desde)
+        if posiciones:
+            hash_ultima = _hash_venta(datos, *posiciones[-1])
+        else:
+            hash_ultima = encabezado[3] if agregar_desde else b"\0" * 16
+
+    cantidad = _escribir_indice(ruta_idx, estado, posiciones, hash_ultima, agregar_desde)
+    logger.debug(f"Índice de {ruta_historial} actualizado: {cantidad} ventas ({len(posiciones)} indexadas ahora).")
+    return cantidad
+
+
+def leer_ventas(ruta_historial, inicio, fin):
+    """Lee del disco las ventas en las posiciones [inicio, fin) usando el índice."""
+    cantidad = asegurar_indice(ruta_historial)
+    inicio, fin = max(inicio, 0), min(fin, cantidad)
+    if inicio >= fin:
+        return []
+
+    entradas = _leer_entradas(ruta_indice(ruta_historial), inicio, fin)
+    desplazamiento = entradas[0][0]
+    with open(ruta_historial, "rb") as archivo:
+        archivo.seek(desplazamiento)
+        bloque = archivo.read(entradas[-1][1] - desplazamiento)
+    return [codec.decodificar(bloque[a - desplazamiento:b - desplazamiento]) for a, b in entradas]
+
+
+def agregar_venta(ruta_historial, venta):
+    """
+    Agrega `venta` al final del historial sin reescribir el archivo: se escribe sobre el
+    "]" de cierre, a continuación de la última venta indexada, y se vuelve a cerrar el
+    arreglo. Lo que hubiera después de esa venta (una escritura cortada a medias) se
+    descarta. El índice se pone al día indexando solo la venta nueva.
+    Devuelve la cantidad de ventas.
+    """
+    cantidad = asegurar_indice(ruta_historial)
+    if cantidad == 0:
+        with open(ruta_historial, "wb") as archivo:
+            archivo.write(codec.codificar([venta], legible=False))
+        return asegurar_indice(ruta_historial)
+
+    _, fin = _leer_entradas(ruta_indice(ruta_historial), cantidad - 1, cantidad)[0]
+    with open(ruta_historial, "r+b") as archivo:
+        archivo.seek(fin)
+        archivo.write(b",\n" + codec.codificar(venta, legible=False) + b"\n]")
+        archivo.truncate()
+    return asegurar_indice(ruta_historial)
+
+
+class HistorialEnDisco:
+    """
+    Vista del historial guardado en disco que se comporta como una lista (len, índices,
+    slices y append), así las funciones de paginado y de ventas la usan igual que a la
+    lista en memoria. Cada acceso lee únicamente las ventas pedidas y append() escribe
+    solo la venta nueva (ver agregar_venta()).
+    """
+
+    def __init__(self, ruta_historial):
+        self.ruta = ruta_historial
+
+    def __len__(self):
+        return asegurar_indice(self.ruta)
+
+    def __getitem__(self, posicion):
+        if isinstance(posicion, slice):
+            inicio, fin, paso = posicion.indices(len(self))
+            ventas = leer_ventas(self.ruta, inicio, fin)
+            return ventas[::paso] if paso != 1 else ventas
+        if posicion < 0:
+            posicion += len(self)
+        ventas = leer_ventas(self.ruta, posicion, posicion + 1)
+        if not ventas:
+            raise IndexError("índice de venta fuera de rango")
+        return ventas[0]
+
+    def append(self, venta):
+        agregar_venta(self.ruta, venta)
+
+    def __iter__(self):
+        cantidad = len(self)
+        for inicio in range(0, cantidad, 1000):
+            yield from leer_ventas(self.ruta, inicio, min(inicio + 1000, cantidad))
@@ -0,0 +1,124 @@
+import csv
+import math
+import os
+import sys
+import indices.catalogo as catalogo
+import persistencia.inventario_particionado as inventario_particionado
+import log.logger as logger
+
+# Importación y exportación del inventario como CSV con las columnas
+# categoria,producto,stock,precio (una fila por producto). Sirve para cargar el catálogo de
+# una temporada entera de una vez en lugar de agregar los productos de a uno.
+#
+# La importación lee el archivo fila por fila y aplica las mismas reglas que la carga manual
+# de un producto (stock entero, precio con punto o coma decimal, ninguno negativo). Un
+# precio vacío deja el precio como está: así se exportan los productos que no tienen precio,
+# y exportar e importar el mismo archivo no cambia nada. Las filas válidas se aplican sobre los diccionarios en memoria y las inválidas se informan con
+# su número de línea; guardar los archivos queda a cargo de quien llama, una sola vez.
+COLUMNAS = ("categoria", "producto", "stock", "precio")
+
+
+def validar_fila(fila):
+    """
+    Devuelve (categoria, producto, stock, precio) normalizados a partir de una fila del CSV;
+    el precio es None si la columna está vacía. Lanza ValueError con el motivo si la fila no
+    es válida.
+    """
+    if len(fila) != len(COLUMNAS):
+        raise ValueError(f"se esperaban {len(COLUMNAS)} columnas y hay {len(fila)}")
+    categoria, producto = fila[0].strip().lower(), fila[1].strip().lower()
+    if not categoria or not producto:
+        raise ValueError("la categoría y el producto no pueden estar vacíos")
+    try:
+        cantidad = int(fila[2])
+        precio = float(fila[3].replace(',', '.')) if fila[3].strip() else None
+    except ValueError:
+        raise ValueError("cantidad o precio inválido") from None
+    if precio is not None and not math.isfinite(precio):
+        raise ValueError("cantidad o precio inválido")
+    if cantidad < 0 or (precio is not None and precio < 0):
+        raise ValueError("el stock y el precio no pueden ser negativos")
+    return categoria, producto, cantidad, precio
+
+
+def _es_encabezado(fila):
+    return tuple(columna.strip().lower() for columna in fila) == COLUMNAS
+
+
+def aplicar_fila(stock, precios, categoria, producto, cantidad, precio):
+    """
+    Agrega el producto o actualiza su stock y precio, respetando las claves que ya existen.
+    Con precio None el precio queda como está (o el producto sigue sin precio).
+    """
+    clave_categoria = catalogo.buscar_categoria(stock, categoria)
+    if clave_categoria is None:
+        clave_categoria = categoria
+        stock[clave_categoria] = {}
+        catalogo.registrar_categoria(stock, clave_categoria)
+    if clave_categoria not in precios:
+        precios[clave_categoria] = {}
+        catalogo.registrar_categoria(precios, clave_categoria)
+
+    clave_producto = catalogo.buscar_producto(stock, clave_categoria, producto) or producto
+    nuevo = clave_producto not in stock[clave_categoria]
+    sin_precio = clave_producto not in precios[clave_categoria]
+    stock[clave_categoria][clave_producto] = cantidad
+    if nuevo:
+        catalogo.registrar_producto(stock, clave_categoria, clave_producto)
+    if precio is not None:
+        precios[clave_categoria][clave_producto] = precio
+        if sin_precio:
+            catalogo.registrar_producto(precios, clave_categoria, clave_producto)
+    return nuevo
+
+
+def importar_csv(ruta_csv, stock, precios):
+    """
+    Aplica el CSV sobre `stock` y `precios`. Devuelve (agregados, actualizados, rechazados),
+    donde rechazados es una lista de (número de línea, motivo).
+    """
+    agregados = actualizados = 0
+    rechazados = []
+    with open(ruta_csv, newline="", encoding="utf-8-sig") as archivo:
+        for numero, fila in enumerate(csv.reader(archivo), 1):
+            if not fila or (numero == 1 and _es_encabezado(fila)):
+                continue
+            try:
+                datos = validar_fila(fila)
+            except ValueError as e:
+                rechazados.append((numero, str(e)))
+                continue
+            if aplicar_fila(stock, precios, *datos):
+                agregados += 1
+            else:
+                actualizados += 1
+    logger.info(f"Inventario importado desde {ruta_csv}: {agregados} agregados, {actualizados} actualizados, {len(rechazados)} rechazados.")
+    return agregados, actualizados, rechazados
+
+
+def exportar_csv(ruta_csv, stock, precios):
+    """Escribe el inventario como CSV ordenado por categoría y producto. Devuelve la cantidad de filas."""
+    filas = 0
+    temporal = ruta_csv + ".tmp"
+    with open(temporal, "w", newline="", encoding="utf-8") as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow(COLUMNAS)
+        for categoria, productos in sorted(stock.items()):
+            precios_categoria = precios.get(categoria, {})
+            for producto, cantidad in sorted(productos.items()):
+                precio = precios_categoria.get(producto)
+                escritor.writerow((categoria, producto, cantidad, "" if precio is None else precio))
+                filas += 1
+    os.replace(temporal, ruta_csv)
+    logger.info(f"Inventario exportado a {ruta_csv}: {filas} productos.")
+    return filas
+
+
+if __name__ == "__main__":
+    # python -m persistencia.inventario_csv exportar stock.json precios.json inventario.csv
+    # (con el inventario particionado: ... exportar inventario/stock inventario/precios inventario.csv)
+    if len(sys.argv) != 5 or sys.argv[1] != "exportar":
+        print("Uso: python -m persistencia.inventario_csv exportar <stock.json o directorio> <precios.json o directorio> <destino.csv>")
+        sys.exit(1)
+    datos = [inventario_particionado.leer(ruta) for ruta in sys.argv[2:4]]
+    print(f"{exportar_csv(sys.argv[4], *datos)} productos exportados.")
@@ -0,0 +1,176 @@
+import os
+import sys
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote
+import persistencia.codec as codec
+import persistencia.parches as parches
+import log.logger as logger
+
+# Stock o precios guardados con un archivo por categoría (<directorio>/<categoria>.json)
+# en vez de un único stock.json / precios.json. Cada categoría se lee recién cuando se la
+# usa y al guardar se reescriben solo las categorías que cambiaron, así modificar un
+# producto cuesta lo mismo con diez categorías que con miles.
+#
+# DiccionarioParticionado se usa igual que el diccionario {categoria: {producto: valor}}.
+# Como los productos se modifican directamente (stock[cat][prod] -= 1), para saber qué
+# categorías cambiaron se guarda una copia de cada una tal como está en disco y se compara
+# al guardar; las que no se llegaron a leer no pueden haber cambiado.
+#
+# Al particionar, el JSON único se renombra a <ruta>.particionado: la aplicación ya no lo
+# actualiza, y así ninguna herramienta lo lee creyendo que está al día. Las herramientas de
+# línea de comandos reciben el directorio en su lugar (ver leer()). Los parches pendientes
+# del JSON (ver persistencia/parches.py) se aplican antes de particionar y se descartan:
+# el inventario particionado no usa registro de parches.
+MAX_HILOS_CARGA = 8
+SUFIJO_REEMPLAZADO = ".particionado"
+
+
+def existe(directorio):
+    return os.path.isdir(directorio)
+
+
+def _archivo_de(categoria):
+    # quote() deja un nombre de archivo válido para cualquier nombre de categoría.
+    return quote(categoria, safe="") + ".json"
+
+
+def _escribir_atomico(ruta, contenido):
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+
+
+class DiccionarioParticionado(MutableMapping):
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        nombres = sorted(n for n in os.listdir(directorio) if n.endswith(".json")) if existe(directorio) else []
+        # dict como conjunto ordenado de categorías: no hace falta leer nada para listarlas.
+        self._categorias = dict.fromkeys(unquote(nombre[:-len(".json")]) for nombre in nombres)
+        self._cargadas = {}
+        self._en_disco = {}
+        self._borradas = set()
+
+    def _ruta(self, categoria):
+        return os.path.join(self.directorio, _archivo_de(categoria))
+
+    def _leer(self, categoria):
+        with open(self._ruta(categoria), "rb") as archivo:
+            return codec.decodificar(archivo.read())
+
+    def _registrar_leida(self, categoria, productos):
+        self._cargadas[categoria] = productos
+        self._en_disco[categoria] = dict(productos)
+
+    def __getitem__(self, categoria):
+        if categoria in self._cargadas:
+            return self._cargadas[categoria]
+        if categoria not in self._categorias:
+            raise KeyError(categoria)
+        self._registrar_leida(categoria, self._leer(categoria))
+        return self._cargadas[categoria]
+
+    def __setitem__(self, categoria, productos):
+        self._categorias[categoria] = None
+        self._cargadas[categoria] = productos
+        self._en_disco.setdefault(categoria, None)
+        self._borradas.discard(categoria)
+
+    def __delitem__(self, categoria):
+        if categoria not in self._categorias:
+            raise KeyError(categoria)
+        del self._categorias[categoria]
+        self._cargadas.pop(categoria, None)
+        self._en_disco.pop(categoria, None)
+        self._borradas.add(categoria)
+
+    def __contains__(self, categoria):
+        return categoria in self._categorias
+
+    def __iter__(self):
+        return iter(list(self._categorias))
+
+    def __len__(self):
+        return len(self._categorias)
+
+    def cargar_todas(self):
+        """Lee en paralelo las categorías que todavía no se leyeron."""
+        pendientes = [categoria for categoria in self._categorias if categoria not in self._cargadas]
+        if not pendientes:
+            return
+        with ThreadPoolExecutor(max_workers=min(MAX_HILOS_CARGA, len(pendientes)), thread_name_prefix="particion") as hilos:
+            for categoria, productos in zip(pendientes, hilos.map(self._leer, pendientes)):
+                self._registrar_leida(categoria, productos)
+
+    def items(self):
+        self.cargar_todas()
+        return super().items()
+
+    def values(self):
+        self.cargar_todas()
+        return super().values()
+
+    def a_formato_disco(self):
+        self.cargar_todas()
+        return {categoria: self._cargadas[categoria] for categoria in self._categorias}
+
+    def guardar_cambios(self):
+        """Reescribe solo las categorías nuevas o modificadas y borra las eliminadas. Devuelve cuántos archivos tocó."""
+        os.makedirs(self.directorio, exist_ok=True)
+        tocados = 0
+        for categoria in self._borradas:
+            if os.path.exists(self._ruta(categoria)):
+                os.remove(self._ruta(categoria))
+                tocados += 1
+        self._borradas.clear()
+
+        for categoria, productos in self._cargadas.items():
+            if productos != self._en_disco.get(categoria):
+                _escribir_atomico(self._ruta(categoria), codec.codificar(productos))
+                self._en_disco[categoria] = dict(productos)
+                tocados += 1
+        logger.debug(f"Inventario particionado en {self.directorio}: {tocados} archivos actualizados.")
+        return tocados
+
+
+def particionar(ruta_json, directorio):
+    """
+    Crea el directorio particionado a partir de stock.json o precios.json (con sus parches
+    aplicados) y renombra el JSON a <ruta>.particionado. Devuelve la cantidad de categorías.
+    """
+    datos = leer(ruta_json)
+    particionado = DiccionarioParticionado(directorio)
+    for categoria, productos in datos.items():
+        particionado[categoria] = productos
+    particionado.guardar_cambios()
+    os.replace(ruta_json, ruta_json + SUFIJO_REEMPLAZADO)
+    parches.descartar(parches.ruta_de(ruta_json))
+    logger.info(f"{ruta_json} particionado en {directorio}: {len(datos)} categorías; el original quedó como "
+                f"{ruta_json + SUFIJO_REEMPLAZADO}.")
+    return len(datos)
+
+
+def leer(ruta):
+    """
+    {categoria: {producto: valor}} completo, de un directorio particionado o de un JSON único
+    con sus parches pendientes aplicados.
+    """
+    if existe(ruta):
+        return DiccionarioParticionado(ruta).a_formato_disco()
+    if not os.path.exists(ruta) and os.path.exists(ruta + SUFIJO_REEMPLAZADO):
+        raise FileNotFoundError(f"{ruta} se particionó y ya no se actualiza: usá el directorio de la partición.")
+    with open(ruta, "rb") as archivo:
+        datos = codec.decodificar(archivo.read())
+    parches.aplicar(parches.ruta_de(ruta), datos)
+    return datos
+
+
+if __name__ == "__main__":
+    # python -m persistencia.inventario_particionado stock.json inventario/stock
+    # python -m persistencia.inventario_particionado precios.json inventario/precios
+    if len(sys.argv) != 3:
+        print("Uso: python -m persistencia.inventario_particionado <stock.json|precios.json> <directorio>")
+        sys.exit(1)
+    print(f"{particionar(sys.argv[1], sys.argv[2])} categorías particionadas.")
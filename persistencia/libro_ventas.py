@@ -0,0 +1,308 @@
+import mmap
+import os
+import struct
+import sys
+import modelos.ventas as modelo_ventas
+import persistencia.codec as codec
+import log.logger as logger
+
+# Libro de ventas binario: una alternativa a historial_ventas.json para historiales muy
+# grandes. Cada ítem vendido es un registro de ancho fijo, así la venta N se ubica con una
+# cuenta y los archivos se leen con mmap (el sistema operativo trae y cachea las páginas
+# que se usan, sin copiar el archivo a memoria).
+#
+# Archivos:
+#   <ruta>              MAGIA + registros (segundos, id_venta, cliente, producto, cantidad,
+#                       precio unitario en centavos), uno por ítem
+#   <ruta>.ventas       por venta, (primer registro, último registro + 1, costo total en
+#                       centavos)
+#   <ruta>.tablas.json  emails de clientes y pares [categoria, producto]; los registros
+#                       guardan su posición en estas listas
+#
+# Una venta sin ítems se guarda como un registro con producto SIN_PRODUCTO, para no perder
+# su cliente, id y fecha. El costo total se guarda con la venta (puede no ser la suma de los
+# ítems, por ejemplo con descuentos). Los registros que no quedan dentro de ningún rango de
+# <ruta>.ventas son de una venta que se cortó antes de escribirse y no se cuentan.
+#
+# Los libros LIBVTA01 (sin el costo total) hay que volver a importarlos desde el JSON.
+MAGIA = b"LIBVTA02"
+REGISTRO = struct.Struct("<qqIIiq")
+VENTA = struct.Struct("<QQq")
+SIN_PRODUCTO = 0xFFFFFFFF
+
+
+def ruta_ventas(ruta_libro):
+    return ruta_libro + ".ventas"
+
+
+def ruta_tablas(ruta_libro):
+    return ruta_libro + ".tablas.json"
+
+
+def _escribir_atomico(ruta, contenido):
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def _agregar_alineado(ruta, encabezado, tamaño_registro, bloque):
+    """
+    Agrega `bloque` al final del archivo y devuelve la posición (en registros) donde quedó.
+    Si una escritura anterior se cortó a mitad de un registro, se pisa ese pedazo.
+    """
+    with open(ruta, "r+b" if os.path.exists(ruta) else "w+b") as archivo:
+        tamaño = archivo.seek(0, os.SEEK_END)
+        if tamaño < len(encabezado):
+            archivo.seek(0)
+            archivo.write(encabezado)
+            tamaño = len(encabezado)
+        posicion = (tamaño - len(encabezado)) // tamaño_registro
+        archivo.seek(len(encabezado) + posicion * tamaño_registro)
+        archivo.write(bloque)
+        archivo.truncate()
+    return posicion
+
+
+class _Tablas:
+    """Codificación por diccionario de clientes y productos, guardada en <ruta>.tablas.json."""
+
+    def __init__(self, ruta, cargar=True):
+        self.ruta = ruta
+        datos = {"clientes": [], "productos": []}
+        if cargar and os.path.exists(ruta):
+            with open(ruta, "rb") as archivo:
+                datos = codec.decodificar(archivo.read())
+        self.clientes = [sys.intern(email) if email else email for email in datos["clientes"]]
+        self.productos = [(sys.intern(categoria), sys.intern(producto)) for categoria, producto in datos["productos"]]
+        self._id_cliente = {email: i for i, email in enumerate(self.clientes)}
+        self._id_producto = {producto: i for i, producto in enumerate(self.productos)}
+        self.modificadas = False
+
+    def id_cliente(self, email):
+        if email not in self._id_cliente:
+            self._id_cliente[email] = len(self.clientes)
+            self.clientes.append(email)
+            self.modificadas = True
+        return self._id_cliente[email]
+
+    def id_producto(self, categoria, producto):
+        clave = (categoria, producto)
+        if clave not in self._id_producto:
+            self._id_producto[clave] = len(self.productos)
+            self.productos.append(clave)
+            self.modificadas = True
+        return self._id_producto[clave]
+
+    def guardar(self):
+        if self.modificadas:
+            _escribir_atomico(self.ruta, codec.codificar({"clientes": self.clientes, "productos": self.productos}, legible=False))
+            self.modificadas = False
+
+
+def _registros_de_venta(tablas, venta, id_venta):
+    segundos = modelo_ventas.fecha_a_segundos(venta.get("fecha"))
+    cliente = tablas.id_cliente(venta.get("cliente_email"))
+    registros = [
+        REGISTRO.pack(segundos, id_venta, cliente, tablas.id_producto(item["categoria"], item["producto"]),
+                      item["cantidad"], modelo_ventas.a_centavos(item["precio_unitario"]))
+        for item in venta.get("items", [])
+    ]
+    return registros or [REGISTRO.pack(segundos, id_venta, cliente, SIN_PRODUCTO, 0, 0)]
+
+
+def _centavos_total(venta):
+    costo_total = venta.get("costo_total")
+    if costo_total is None:
+        return sum(modelo_ventas.a_centavos(item["subtotal"]) for item in venta.get("items", []))
+    return modelo_ventas.a_centavos(costo_total)
+
+
+def _verificar_formato(libro, ruta):
+    if len(libro) and libro[:len(MAGIA)] != MAGIA:
+        raise ValueError(f"El libro de ventas {ruta} tiene otro formato; hay que volver a importarlo desde el JSON.")
+
+
+class LibroVentas:
+    """
+    Vista del libro de ventas que se comporta como la lista del historial (len, índices,
+    slices, iterar) y devuelve registros Venta. Lee directamente de los archivos mapeados.
+    """
+
+    def __init__(self, ruta_libro):
+        self.ruta = ruta_libro
+        self._mapas = {}
+        self._tablas = None
+
+    def _mapa(self, ruta):
+        """Devuelve el mmap del archivo, rehaciéndolo si el archivo creció desde la última vez."""
+        tamaño = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+        actual = self._mapas.get(ruta)
+        if actual and actual[0] == tamaño:
+            return actual[1]
+        if actual:
+            actual[1].close()
+        if tamaño == 0:
+            self._mapas.pop(ruta, None)
+            return b""
+        with open(ruta, "rb") as archivo:
+            datos = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mapas[ruta] = (tamaño, datos)
+        return datos
+
+    def cerrar(self):
+        for _, datos in self._mapas.values():
+            datos.close()
+        self._mapas.clear()
+
+    def tablas(self):
+        # Se vuelven a leer si cambiaron, por ejemplo porque una venta nueva agregó un cliente.
+        ruta = ruta_tablas(self.ruta)
+        firma = os.stat(ruta).st_mtime_ns if os.path.exists(ruta) else None
+        if self._tablas is None or self._tablas[0] != firma:
+            self._tablas = (firma, _Tablas(ruta))
+        return self._tablas[1]
+
+    def cantidad_registros(self):
+        return max(len(self._mapa(self.ruta)) - len(MAGIA), 0) // REGISTRO.size
+
+    def __len__(self):
+        return len(self._mapa(ruta_ventas(self.ruta))) // VENTA.size
+
+    def _libro(self):
+        libro = self._mapa(self.ruta)
+        _verificar_formato(libro, self.ruta)
+        return libro
+
+    def _archivos(self):
+        return self.tablas(), self._mapa(ruta_ventas(self.ruta)), self._libro()
+
+    def _venta(self, posicion, tablas, ventas, libro):
+        inicio, fin, centavos_total = VENTA.unpack_from(ventas, posicion * VENTA.size)
+        items = []
+        for numero in range(inicio, fin):
+            segundos, id_venta, cliente, producto, cantidad, centavos = REGISTRO.unpack_from(libro, len(MAGIA) + numero * REGISTRO.size)
+            if producto == SIN_PRODUCTO:
+                continue
+            categoria, nombre = tablas.productos[producto]
+            items.append(modelo_ventas.ItemVenta(categoria, nombre, cantidad, centavos / 100, cantidad * centavos / 100))
+        return modelo_ventas.Venta(
+            id_venta=id_venta,
+            fecha=modelo_ventas.segundos_a_fecha(segundos),
+            cliente_email=tablas.clientes[cliente],
+            items=items,
+            costo_total=centavos_total / 100,
+        )
+
+    def __getitem__(self, posicion):
+        cantidad = len(self)
+        archivos = self._archivos()
+        if isinstance(posicion, slice):
+            return [self._venta(i, *archivos) for i in range(*posicion.indices(cantidad))]
+        if posicion < 0:
+            posicion += cantidad
+        if not 0 <= posicion < cantidad:
+            raise IndexError("índice de venta fuera de rango")
+        return self._venta(posicion, *archivos)
+
+    def __iter__(self):
+        archivos = self._archivos()
+        for posicion in range(len(self)):
+            yield self._venta(posicion, *archivos)
+
+    def ultimo_id(self):
+        cantidad = len(self)
+        if cantidad == 0:
+            return 0
+        inicio, _, _ = VENTA.unpack_from(self._mapa(ruta_ventas(self.ruta)), (cantidad - 1) * VENTA.size)
+        return REGISTRO.unpack_from(self._libro(), len(MAGIA) + inicio * REGISTRO.size)[1]
+
+    def agregar(self, venta):
+        """Agrega una venta al final del libro. Si no trae id se numera después de la última."""
+        tablas = _Tablas(ruta_tablas(self.ruta))
+        id_venta = venta.get("id_venta") or self.ultimo_id() + 1
+        registros = _registros_de_venta(tablas, venta, id_venta)
+        _verificar_formato(self._mapa(self.ruta), self.ruta)
+        self.cerrar()
+
+        # Primero las tablas y los ítems; la venta existe recién cuando se escribe su entrada
+        # en <ruta>.ventas, así un corte a mitad de camino no deja una venta incompleta.
+        tablas.guardar()
+        inicio = _agregar_alineado(self.ruta, MAGIA, REGISTRO.size, b"".join(registros))
+        _agregar_alineado(ruta_ventas(self.ruta), b"", VENTA.size, VENTA.pack(inicio, inicio + len(registros), _centavos_total(venta)))
+
+    def unidades_por_producto(self):
+        """
+        {(categoria, producto): unidades vendidas}, sin las promociones, recorriendo sin
+        copiarlos los registros de las ventas de <ruta>.ventas. Los rangos seguidos se leen
+        juntos, de a un tramo.
+        """
+        tablas, ventas, libro = self._archivos()
+        totales = [0] * len(tablas.productos)
+        with memoryview(libro) as vista:
+            for inicio, fin in _tramos(VENTA.iter_unpack(ventas)):
+                tramo = vista[len(MAGIA) + inicio * REGISTRO.size:len(MAGIA) + fin * REGISTRO.size]
+                for _, _, _, producto, cantidad, _ in REGISTRO.iter_unpack(tramo):
+                    if producto != SIN_PRODUCTO:
+                        totales[producto] += cantidad
+                tramo.release()
+        return {clave: unidades for clave, unidades in zip(tablas.productos, totales)
+                if clave[0] != modelo_ventas.CATEGORIA_PROMOCION}
+
+
+def _tramos(rangos):
+    """Junta los rangos (inicio, fin, _) consecutivos en tramos (inicio, fin)."""
+    actual = None
+    for inicio, fin, _ in rangos:
+        if actual and actual[1] == inicio:
+            actual[1] = fin
+            continue
+        if actual:
+            yield tuple(actual)
+        actual = [inicio, fin]
+    if actual:
+        yield tuple(actual)
+
+
+def agregar_venta(ruta_libro, venta):
+    LibroVentas(ruta_libro).agregar(venta)
+
+
+def importar_json(ruta_json, ruta_libro):
+    """Arma el libro a partir de historial_ventas.json (reemplaza uno existente). Devuelve la cantidad de ventas."""
+    with open(ruta_json, "rb") as archivo:
+        historial = codec.decodificar(archivo.read())
+
+    tablas = _Tablas(ruta_tablas(ruta_libro), cargar=False)
+    registros = []
+    ventas = []
+    for posicion, venta in enumerate(historial):
+        de_la_venta = _registros_de_venta(tablas, venta, venta.get("id_venta") or posicion + 1)
+        ventas.append(VENTA.pack(len(registros), len(registros) + len(de_la_venta), _centavos_total(venta)))
+        registros.extend(de_la_venta)
+
+    tablas.guardar()
+    _escribir_atomico(ruta_libro, MAGIA + b"".join(registros))
+    _escribir_atomico(ruta_ventas(ruta_libro), b"".join(ventas))
+    logger.info(f"Libro de ventas {ruta_libro} importado desde {ruta_json}: {len(ventas)} ventas, {len(registros)} registros.")
+    return len(ventas)
+
+
+def exportar_json(ruta_libro, ruta_json):
+    """Escribe el contenido del libro como historial_ventas.json. Devuelve la cantidad de ventas."""
+    libro = LibroVentas(ruta_libro)
+    ventas = list(libro)
+    libro.cerrar()
+    _escribir_atomico(ruta_json, codec.codificar(ventas, legible=False))
+    logger.info(f"Libro de ventas {ruta_libro} exportado a {ruta_json}: {len(ventas)} ventas.")
+    return len(ventas)
+
+
+if __name__ == "__main__":
+    # python -m persistencia.libro_ventas importar historial_ventas.json historial_ventas.libro
+    # python -m persistencia.libro_ventas exportar historial_ventas.libro historial_ventas.json
+    if len(sys.argv) != 4 or sys.argv[1] not in ("importar", "exportar"):
+        print("Uso: python -m persistencia.libro_ventas importar|exportar <origen> <destino>")
+        sys.exit(1)
+    convertir = importar_json if sys.argv[1] == "importar" else exportar_json
+    print(f"{convertir(sys.argv[2], sys.argv[3])} ventas convertidas.")
@@ -0,0 +1,54 @@
+import os
+import persistencia.codec as codec
+import persistencia.wal as wal
+import log.logger as logger
+
+# Registro de parches para datos {categoria: {producto: valor}} como el stock. En vez de
+# reescribir el archivo entero por cada compra, se agrega una línea con los productos que
+# cambiaron y su valor nuevo; al cargar, los parches se aplican en orden sobre el archivo
+# completo. Cada tanto se vuelve a escribir el archivo completo y se descarta el registro.
+#
+# Los valores son absolutos (no "restar 2"), así aplicar un parche dos veces no cambia el
+# resultado: si el proceso se corta entre escribir el archivo completo y borrar el
+# registro, al cargar de nuevo queda todo igual.
+#
+# El registro de <ruta> es <ruta>.parches. Quien lea el archivo completo por su cuenta (por
+# ejemplo las herramientas de línea de comandos) tiene que usar inventario_particionado.leer(),
+# que aplica los parches igual que la aplicación al cargar.
+SUFIJO = ".parches"
+
+
+def ruta_de(ruta_datos):
+    return ruta_datos + SUFIJO
+
+
+def agregar(ruta_parches, cambios):
+    """
+    Agrega un parche {categoria: {producto: valor}} y espera a que llegue al disco (como el
+    WAL, descartando antes un parche cortado a medias). Devuelve el tamaño del registro.
+    """
+    return wal.agregar_linea(ruta_parches, codec.codificar(cambios, legible=False) + b"\n")
+
+
+def aplicar(ruta_parches, datos):
+    """Aplica sobre `datos` los parches registrados y devuelve cuántos se aplicaron."""
+    if not os.path.exists(ruta_parches):
+        return 0
+    aplicados = 0
+    with open(ruta_parches, "rb") as archivo:
+        for linea in archivo:
+            try:
+                cambios = codec.decodificar(linea)
+            except ValueError:
+                logger.error(f"Parche incompleto en {ruta_parches}, se ignora.")
+                continue
+            for categoria, productos in cambios.items():
+                datos.setdefault(categoria, {}).update(productos)
+            aplicados += 1
+    logger.debug(f"Se aplicaron {aplicados} parches de {ruta_parches}.")
+    return aplicados
+
+
+def descartar(ruta_parches):
+    if os.path.exists(ruta_parches):
+        os.remove(ruta_parches)
@@ -0,0 +1,138 @@
+import gc
+import hashlib
+import os
+import pickle
+import shutil
+import log.logger as logger
+
+# Copias binarias (pickle) de los datos ya interpretados, para no volver a parsear
+# el JSON en cada arranque. Cada copia guarda la firma del archivo del que salió
+# (tamaño, fecha de modificación y hash) y solo se usa mientras esa firma coincida.
+#
+# El archivo tiene dos pickles seguidos: primero un encabezado chico con la firma y después
+# los datos. Así comprobar si la copia sigue vigente lee solo el encabezado, sin
+# reconstruir todo el conjunto de datos para después descartarlo.
+DIRECTORIO_SNAPSHOTS = ".snapshots"
+
+
+def ruta_snapshot(ruta_archivo):
+    """Devuelve dónde se guarda la copia binaria de un archivo de datos."""
+    nombre = os.path.normpath(ruta_archivo).replace(os.sep, "_")
+    return os.path.join(DIRECTORIO_SNAPSHOTS, nombre + ".pickle")
+
+
+def existe(ruta_archivo):
+    return os.path.exists(ruta_snapshot(ruta_archivo))
+
+
+def calcular_hash(ruta_archivo, contenido=None):
+    """Hash del contenido del archivo; si ya se tiene en memoria no se vuelve a leer."""
+    h = hashlib.blake2b(digest_size=16)
+    if contenido is not None:
+        h.update(contenido)
+        return h.hexdigest()
+    with open(ruta_archivo, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _firma(ruta_archivo, hash_contenido):
+    estado = os.stat(ruta_archivo)
+    return {"tamaño": estado.st_size, "mtime_ns": estado.st_mtime_ns, "hash": hash_contenido}
+
+
+def _leer_encabezado(archivo):
+    encabezado = pickle.load(archivo)
+    if not isinstance(encabezado, dict) or "tamaño" not in encabezado:
+        raise ValueError("formato de snapshot desconocido")
+    return encabezado
+
+
+def vigente(ruta_archivo):
+    """True si hay snapshot y su firma coincide con el archivo (sin leer los datos ni el hash)."""
+    destino = ruta_snapshot(ruta_archivo)
+    if not os.path.exists(destino) or not os.path.exists(ruta_archivo):
+        return False
+    try:
+        with open(destino, "rb") as archivo:
+            encabezado = _leer_encabezado(archivo)
+        estado = os.stat(ruta_archivo)
+    except Exception:
+        return False
+    return encabezado["tamaño"] == estado.st_size and encabezado["mtime_ns"] == estado.st_mtime_ns
+
+
+def escribir(ruta_archivo, datos, contenido=None):
+    """
+    Guarda la copia binaria de `datos` junto con la firma actual de `ruta_archivo`.
+    `contenido` son los bytes del archivo, si quien llama ya los tiene.
+    """
+    try:
+        encabezado = _firma(ruta_archivo, calcular_hash(ruta_archivo, contenido))
+        os.makedirs(DIRECTORIO_SNAPSHOTS, exist_ok=True)
+        destino = ruta_snapshot(ruta_archivo)
+        temporal = destino + ".tmp"
+        with open(temporal, "wb") as archivo:
+            pickle.dump(encabezado, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(datos, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporal, destino)
+        logger.debug(f"Snapshot de {ruta_archivo} actualizado en {destino}.")
+    except (OSError, pickle.PicklingError) as e:
+        # El snapshot es solo una optimización: si falla, se sigue usando el JSON.
+        logger.error(f"No se pudo escribir el snapshot de {ruta_archivo}: {e}")
+
+
+def leer(ruta_archivo):
+    """
+    Devuelve los datos del snapshot si sigue siendo válido para `ruta_archivo`,
+    o None si no existe, está corrupto o el archivo cambió desde que se escribió.
+    """
+    destino = ruta_snapshot(ruta_archivo)
+    if not os.path.exists(destino) or not os.path.exists(ruta_archivo):
+        return None
+
+    # Con millones de objetos chicos el recolector de ciclos se dispara muchas veces
+    # durante la carga sin liberar nada; se lo pausa mientras dura.
+    gc_activo = gc.isenabled()
+    gc.disable()
+    try:
+        with open(destino, "rb") as archivo:
+            encabezado = _leer_encabezado(archivo)
+            estado = os.stat(ruta_archivo)
+            if encabezado["tamaño"] != estado.st_size:
+                return None
+            mtime_distinto = encabezado["mtime_ns"] != estado.st_mtime_ns
+            # Misma longitud pero otra fecha: solo se confía si el contenido es idéntico.
+            if mtime_distinto and encabezado["hash"] != calcular_hash(ruta_archivo):
+                return None
+            inicio_datos = archivo.tell()
+            datos = pickle.load(archivo)
+            if mtime_distinto:
+                _actualizar_encabezado(ruta_archivo, archivo, inicio_datos, encabezado["hash"])
+    except Exception as e:
+        logger.error(f"Snapshot ilegible para {ruta_archivo}, se ignora: {e}")
+        return None
+    finally:
+        if gc_activo:
+            gc.enable()
+
+    logger.debug(f"Se usó el snapshot de {ruta_archivo}.")
+    return datos
+
+
+def _actualizar_encabezado(ruta_archivo, archivo, inicio_datos, hash_contenido):
+    """Reescribe el snapshot con la firma actual copiando los datos tal cual, sin volver a serializarlos."""
+    destino = ruta_snapshot(ruta_archivo)
+    temporal = destino + ".tmp"
+    archivo.seek(inicio_datos)
+    with open(temporal, "wb") as nuevo:
+        pickle.dump(_firma(ruta_archivo, hash_contenido), nuevo, protocol=pickle.HIGHEST_PROTOCOL)
+        shutil.copyfileobj(archivo, nuevo, 1 << 20)
+    os.replace(temporal, destino)
+
+
+def eliminar(ruta_archivo):
+    destino = ruta_snapshot(ruta_archivo)
+    if os.path.exists(destino):
+        os.remove(destino)
@@ -0,0 +1,77 @@
+import os
+import persistencia.codec as codec
+import log.logger as logger
+
+# Registro de escritura anticipada (write-ahead log) para las compras. Cada compra se
+# agrega como una línea JSON que describe todo lo que cambia (la venta y los valores
+# nuevos de stock). Esa línea, escrita y sincronizada a disco, es lo que confirma la
+# compra: los archivos de datos se actualizan más tarde, de a varias compras juntas, y si
+# el proceso se corta antes, al arrancar se vuelven a aplicar las compras del registro.
+#
+# Las entradas tienen que poder aplicarse más de una vez sin cambiar el resultado (el
+# stock se guarda como valor absoluto y las ventas llevan su id), porque un corte durante
+# la actualización de los archivos puede dejar algunas ya aplicadas.
+
+
+def _fin_ultima_linea(archivo, tamaño):
+    """Posición justo después del último salto de línea del archivo (0 si no tiene ninguno)."""
+    fin = tamaño
+    while fin > 0:
+        inicio = max(fin - 4096, 0)
+        archivo.seek(inicio)
+        posicion = archivo.read(fin - inicio).rfind(b"\n")
+        if posicion >= 0:
+            return inicio + posicion + 1
+        fin = inicio
+    return 0
+
+
+def agregar_linea(ruta, linea):
+    """
+    Agrega `linea` (terminada en salto de línea) a un registro de líneas y espera a que
+    llegue al disco. Devuelve el tamaño del registro. Si la escritura anterior se cortó a
+    mitad de línea, primero se descarta ese pedazo: si no, la línea nueva quedaría pegada a
+    él y se perdería al leer.
+    """
+    with open(ruta, "r+b" if os.path.exists(ruta) else "w+b") as archivo:
+        tamaño = archivo.seek(0, os.SEEK_END)
+        if tamaño:
+            archivo.seek(tamaño - 1)
+            if archivo.read(1) != b"\n":
+                fin = _fin_ultima_linea(archivo, tamaño)
+                logger.error(f"Línea incompleta al final de {ruta}: se descartan {tamaño - fin} bytes.")
+                archivo.truncate(fin)
+                tamaño = fin
+        archivo.seek(tamaño)
+        archivo.write(linea)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+        return archivo.tell()
+
+
+def agregar(ruta_wal, entrada):
+    """Agrega la entrada y espera a que llegue al disco. Devuelve el tamaño del registro."""
+    return agregar_linea(ruta_wal, codec.codificar(entrada, legible=False) + b"\n")
+
+
+def leer(ruta_wal):
+    """Devuelve las entradas del registro, en orden. Una última línea cortada a medias se ignora."""
+    if not os.path.exists(ruta_wal):
+        return []
+    entradas = []
+    with open(ruta_wal, "rb") as archivo:
+        for numero, linea in enumerate(archivo, 1):
+            if not linea.strip():
+                continue
+            try:
+                entradas.append(codec.decodificar(linea))
+            except ValueError:
+                # Solo puede pasar con la última línea, si se cortó mientras se escribía:
+                # esa compra nunca se llegó a confirmar.
+                logger.error(f"Entrada incompleta en la línea {numero} de {ruta_wal}, se descarta.")
+    return entradas
+
+
+def vaciar(ruta_wal):
+    if os.path.exists(ruta_wal):
+        os.remove(ruta_wal)
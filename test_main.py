@@ -1,9 +1,36 @@
 import os
+import shutil
+from concurrent.futures.process import BrokenProcessPool
+import persistencia.codec as codec
+import persistencia.historial_segmentado as historial_segmentado
+import persistencia.indice_ventas as indice_ventas
+import persistencia.inventario_csv as inventario_csv
+import persistencia.inventario_particionado as inventario_particionado
+import persistencia.libro_ventas as libro_ventas
+import persistencia.parches as parches
+import persistencia.snapshot as snapshot
+import persistencia.wal as wal
+import indices.busqueda_productos as busqueda_productos
+import indices.catalogo as catalogo
+import indices.claves_idempotencia as claves_idempotencia
+import indices.resumen_ventas as resumen_ventas
+import indices.stock_bajo as stock_bajo
+import modelos.historial_columnar as historial_columnar
+import modelos.historial_precios as historial_precios
+import modelos.ventas as modelo_ventas
+import negocio.ajustes_precios as ajustes_precios
+import negocio.conciliacion_stock as conciliacion_stock
+import negocio.promociones as promociones
+import negocio.usuarios as reglas_usuarios
+from datetime import date
 from TPO_FINAL import (
     usuarios,
     sesion_activa,
     cargar_datos,
+    ContextoDatos,
+    decodificar_en_proceso,
     guardar_datos,
+    exportar_datos_legibles,
     es_contraseña_valida,
     es_email_valido,
     registrar_usuario_en_memoria,
@@ -17,14 +44,26 @@ from TPO_FINAL import (
     armar_item_para_historial,
     calcular_costo_total,
     actualizar_stock,
+    modificar_stock_producto,
     procesar_venta,
+    siguiente_id_venta,
     confirmar_y_procesar_venta,
+    aplicar_entrada_wal,
+    volcar_wal,
+    guardar_stock,
+    importar_inventario_csv,
+    registrar_precios_base,
+    importar_usuarios,
+    mostrar_resumen_carrito_modificado,
     validar_cantidad,
     manejar_agregado_producto_al_carrito,
     mostrar_carrito_actual,
     buscar_clientes_por_nombre,
     buscar_administradores,
-    calcular_indices_paginacion
+    calcular_indices_paginacion,
+    mostrar_pagina,
+    mostrar_resultados_busqueda,
+    porcentaje_objetivo_ganancias
 )
 
 # --- BASE ---
@@ -44,6 +83,162 @@ def test_guardar_y_cargar_datos():
     assert leido == datos
     os.remove(ruta)
 
+def test_contexto_datos_carga_recien_al_acceder():
+    ruta = "contexto_test.json"
+    contexto = ContextoDatos({"stock": (ruta, dict)})
+    assert not contexto.esta_cargado("stock")
+    assert not os.path.exists(ruta)
+
+    stock = contexto.stock
+    assert stock == {}
+    assert contexto.esta_cargado("stock")
+    assert contexto.stock is stock  # No vuelve a leer el archivo
+    os.remove(ruta)
+
+def test_contexto_datos_guarda_solo_lo_cargado():
+    ruta_cargada = "contexto_cargado_test.json"
+    ruta_sin_usar = "contexto_sin_usar_test.json"
+    contexto = ContextoDatos({
+        "usuarios": (ruta_cargada, dict),
+        "historial_ventas": (ruta_sin_usar, list),
+    })
+    contexto.usuarios["a@a.com"] = {"nombre": "A"}
+    contexto.guardar_cargados()
+
+    assert cargar_datos(ruta_cargada, {}) == {"a@a.com": {"nombre": "A"}}
+    assert not os.path.exists(ruta_sin_usar)
+    os.remove(ruta_cargada)
+
+def test_precargar_carga_todo_en_paralelo_y_mide_tiempos():
+    rutas = {"stock": "precarga_stock_test.json", "historial_ventas": "precarga_historial_test.json"}
+    guardar_datos(rutas["stock"], {"ropa": {"camisa": 3}})
+    guardar_datos(rutas["historial_ventas"], [{"costo_total": 10.0}])
+    contexto = ContextoDatos({
+        "stock": (rutas["stock"], dict),
+        "historial_ventas": (rutas["historial_ventas"], list),
+    })
+
+    tiempos = contexto.precargar(esperar=True)
+
+    assert set(tiempos) == {"stock", "historial_ventas"}
+    assert contexto.esta_cargado("stock") and contexto.esta_cargado("historial_ventas")
+    assert contexto.stock == {"ropa": {"camisa": 3}}
+    # El historial no se lee al precargar: se lee del disco a medida que se pide
+    assert isinstance(contexto.historial_ventas, indice_ventas.HistorialEnDisco)
+    assert tiempos["historial_ventas"] == 0.0
+    assert list(contexto.historial_ventas) == [{"costo_total": 10.0}]
+    os.remove(indice_ventas.ruta_indice(rutas["historial_ventas"]))
+    for ruta in rutas.values():
+        snapshot.eliminar(ruta)
+        os.remove(ruta)
+
+def test_decodificar_en_proceso():
+    assert decodificar_en_proceso('{"a": [1, 2]}') == {"a": [1, 2]}
+
+def test_decodificar_en_proceso_sin_pool_interpreta_en_este_proceso(monkeypatch):
+    import TPO_FINAL
+
+    class PoolRoto:
+        def submit(self, *args):
+            raise BrokenProcessPool("el proceso terminó de golpe")
+
+        def shutdown(self, **kwargs):
+            pass
+
+    monkeypatch.setattr(TPO_FINAL.os, "cpu_count", lambda: 2)
+    monkeypatch.setattr(TPO_FINAL, "_pool_parseo", PoolRoto())
+    assert decodificar_en_proceso('{"a": [1, 2]}') == {"a": [1, 2]}
+    assert TPO_FINAL._pool_parseo is None
+
+def test_cargar_datos_usa_snapshot_vigente():
+    ruta = "snapshot_test.json"
+    guardar_datos(ruta, {"a": 1})
+    assert cargar_datos(ruta, {}, usar_snapshot=True) == {"a": 1}
+    assert snapshot.existe(ruta)
+
+    # guardar_datos no rehace el snapshot: queda vencido y la próxima carga lo reescribe
+    guardar_datos(ruta, {"a": 2})
+    assert not snapshot.vigente(ruta) and snapshot.leer(ruta) is None
+    assert cargar_datos(ruta, {}, usar_snapshot=True) == {"a": 2}
+    assert snapshot.vigente(ruta) and snapshot.leer(ruta) == {"a": 2}
+
+    snapshot.eliminar(ruta)
+    os.remove(ruta)
+
+def test_snapshot_vencido_no_se_deserializa(monkeypatch):
+    ruta = "snapshot_encabezado_test.json"
+    guardar_datos(ruta, {"a": 1})
+    cargar_datos(ruta, {}, usar_snapshot=True)
+    guardar_datos(ruta, {"a": 10})
+
+    cargados = []
+    cargar_pickle = snapshot.pickle.load
+    monkeypatch.setattr(snapshot.pickle, "load", lambda archivo: cargados.append(1) or cargar_pickle(archivo))
+    assert snapshot.leer(ruta) is None
+    assert len(cargados) == 1  # solo el encabezado
+
+    contexto = ContextoDatos({"usuarios": (ruta, dict)})
+    contexto.usuarios["b"] = 2
+    guardar_datos(ruta, contexto.usuarios)
+    assert contexto.actualizar_snapshots() == 1
+    assert contexto.actualizar_snapshots() == 0
+    assert snapshot.leer(ruta) == {"a": 10, "b": 2}
+    snapshot.eliminar(ruta)
+    os.remove(ruta)
+
+def test_actualizar_snapshots_omite_datos_que_no_se_pudieron_guardar(tmp_path, monkeypatch):
+    import TPO_FINAL
+    ruta = str(tmp_path / "snapshot_guardado_fallido_test.json")
+    guardar_datos(ruta, {"a": 1})
+    contexto = ContextoDatos({"usuarios": (ruta, dict)})
+    contexto.usuarios["b"] = 2
+    guardar_datos(ruta, contexto.usuarios)
+
+    def escribir_roto(*args):
+        raise IOError("disco lleno")
+    monkeypatch.setattr(TPO_FINAL, "escribir_json", escribir_roto)
+    contexto.usuarios["c"] = 3
+    assert guardar_datos(ruta, contexto.usuarios) is False
+
+    assert contexto.actualizar_snapshots() == 0
+    assert snapshot.leer(ruta) is None
+
+def test_snapshot_se_ignora_si_el_archivo_cambio():
+    ruta = "snapshot_viejo_test.json"
+    guardar_datos(ruta, [1, 2, 3])
+    cargar_datos(ruta, [], usar_snapshot=True)
+
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        archivo.write("[1, 2, 3, 4]")
+
+    assert snapshot.leer(ruta) is None
+    assert cargar_datos(ruta, [], usar_snapshot=True) == [1, 2, 3, 4]
+    snapshot.eliminar(ruta)
+    os.remove(ruta)
+
+def test_codec_motores_son_intercambiables():
+    datos = {"camisas": {"basica blanca": 10.0}, "email": "ñandú@correo.com", "items": [1, 2]}
+    for motor_escritura in codec.MOTORES:
+        for legible in (True, False):
+            contenido = codec.codificar(datos, legible=legible, motor=motor_escritura)
+            for motor_lectura in codec.MOTORES:
+                assert codec.decodificar(contenido, motor=motor_lectura) == datos
+
+def test_guardar_compacto_y_exportar_legible():
+    ruta = "compacto_test.json"
+    datos = [{"cliente_email": "a@a.com", "costo_total": 10.0}]
+    guardar_datos(ruta, datos, compacto=True)
+    with open(ruta, "rb") as archivo:
+        assert b"\n" not in archivo.read()
+
+    ruta_legible = exportar_datos_legibles(ruta)
+    assert ruta_legible == "compacto_test_legible.json"
+    with open(ruta_legible, "rb") as archivo:
+        assert b"\n" in archivo.read()
+    assert cargar_datos(ruta_legible, []) == datos
+    os.remove(ruta)
+    os.remove(ruta_legible)
+
 
 # CREAR USUARIO
 def test_contraseña_valida():
@@ -159,6 +354,11 @@ def test_opcion_cancelar_compra():
     resultado = interpretar_opcion_categoria(4, categorias)  # len = 2, entonces +2 = 4
     assert resultado == "CANCELAR_COMPRA_TOTAL"
 
+def test_opcion_buscar_producto():
+    categorias = ["frutas", "bebidas"]
+    resultado = interpretar_opcion_categoria(5, categorias)  # len = 2, entonces +3 = 5
+    assert resultado == "BUSCAR_PRODUCTO"
+
 def test_opcion_invalida():
     categorias = ["frutas"]
     resultado = interpretar_opcion_categoria(10, categorias)  # opción inválida
@@ -180,6 +380,93 @@ def test_armar_item_para_historial():
         "subtotal": 10.0
     }
 
+def test_registros_de_venta_se_leen_como_diccionarios():
+    item = armar_item_para_historial("camisas", "basica blanca", 2, 10.0, 20.0)
+    venta = modelo_ventas.Venta(None, None, "a@a.com", [item], 20.0)
+
+    assert venta["items"][0].get("subtotal") == 20.0
+    assert venta.get("fecha", "sin fecha") == "sin fecha"
+    assert "cliente_email" in venta and "id_venta" not in venta
+    assert calcular_costo_total(venta["items"]) == 20.0
+
+def test_registros_de_venta_ida_y_vuelta_al_disco():
+    datos = [
+        {"cliente_email": "a@a.com", "costo_total": 5.0, "items": [{"categoria": "c", "producto": "p", "cantidad": 1, "precio_unitario": 5.0, "subtotal": 5.0}]},
+        {"id_venta": 2, "fecha": "2025-06-01T10:00:00", "cliente_email": "b@b.com", "items": [], "costo_total": 0.0, "nota": "regalo"},
+    ]
+    registros = modelo_ventas.ventas_desde_disco(datos)
+
+    assert isinstance(registros[0]["items"][0], modelo_ventas.ItemVenta)
+    assert registros[1]["nota"] == "regalo"
+    assert modelo_ventas.ventas_desde_disco(registros)[1] is registros[1]
+    for motor in codec.MOTORES:
+        assert codec.decodificar(codec.codificar(registros, motor=motor), motor=motor) == datos
+
+def test_registros_de_venta_comparten_strings_repetidos():
+    datos = [
+        {"cliente_email": "".join(["a@", "a.com"]), "costo_total": 5.0, "items": [{"categoria": "".join(["cami", "sas"]), "producto": "jean", "cantidad": 1, "precio_unitario": 5.0, "subtotal": 5.0}]},
+        {"cliente_email": "".join(["a@a", ".com"]), "costo_total": 5.0, "items": [{"categoria": "".join(["cam", "isas"]), "producto": "jean", "cantidad": 1, "precio_unitario": 5.0, "subtotal": 5.0}]},
+    ]
+    assert datos[0]["cliente_email"] is not datos[1]["cliente_email"]
+
+    primera, segunda = modelo_ventas.ventas_desde_disco(datos)
+
+    assert primera["cliente_email"] is segunda["cliente_email"]
+    assert primera["items"][0]["categoria"] is segunda["items"][0]["categoria"]
+
+def test_historial_columnar_ida_y_vuelta_al_disco():
+    datos = [
+        {"cliente_email": "a@a.com", "costo_total": 70.0, "items": [
+            {"categoria": "camisas", "producto": "basica", "cantidad": 2, "precio_unitario": 25.0, "subtotal": 50.0},
+            {"categoria": "zapatos", "producto": "botas", "cantidad": 1, "precio_unitario": 20.0, "subtotal": 20.0}]},
+        {"id_venta": 2, "fecha": "2025-06-01T10:00:00", "cliente_email": "b@b.com", "items": [], "costo_total": 0.0, "nota": "regalo"},
+    ]
+    historial = historial_columnar.HistorialColumnar(datos)
+
+    assert len(historial) == 2
+    assert historial[0]["items"][1]["producto"] == "botas"
+    assert historial[-1].get("nota") == "regalo"
+    assert codec.decodificar(codec.codificar(historial)) == datos
+    assert historial.bytes_en_columnas() == 2 * 36 + 8 + 2 * 16
+
+def test_historial_columnar_guarda_precios_altos():
+    item = {"categoria": "autos", "producto": "sedan", "cantidad": 1, "precio_unitario": 25_000_000.5, "subtotal": 25_000_000.5}
+    datos = [{"id_venta": 1, "fecha": "2025-06-01T10:00:00", "cliente_email": "a@a.com", "items": [item], "costo_total": 25_000_000.5}]
+    assert historial_columnar.HistorialColumnar(datos).a_formato_disco() == datos
+
+def test_contexto_con_historial_columnar_lo_carga_y_lo_guarda(tmp_path, monkeypatch):
+    import TPO_FINAL
+    monkeypatch.setattr(TPO_FINAL, "HISTORIAL_COLUMNAR", True)
+    monkeypatch.setattr(TPO_FINAL, "USAR_SNAPSHOTS", False)
+    ruta = str(tmp_path / "historial_columnar_test.json")
+    guardar_datos(ruta, [{"id_venta": 1, "fecha": "2025-06-01T10:00:00", "cliente_email": "a@a.com", "items": [], "costo_total": 5.0}])
+    contexto = ContextoDatos({"historial_ventas": (ruta, list)})
+
+    assert isinstance(contexto.historial_ventas, historial_columnar.HistorialColumnar)
+    procesar_venta("b@b.com", [], 7.0, contexto.historial_ventas, [], lambda ruta, datos: None, {"historial_ventas": ruta, "ventas_realizadas": "v.json"})
+    assert contexto.guardar_cargados()
+    assert [venta["id_venta"] for venta in cargar_datos(ruta, [], usar_snapshot=False)] == [1, 2]
+
+def test_historial_columnar_conserva_extras_y_subtotales_de_los_items():
+    datos = [{"id_venta": 1, "fecha": "2025-06-01T10:00:00", "cliente_email": "a@a.com", "costo_total": 45.0, "items": [
+        {"categoria": "camisas", "producto": "basica", "cantidad": 2, "precio_unitario": 25.0, "subtotal": 45.0, "talle": "M"},
+        {"categoria": "tazas", "producto": "grande", "cantidad": 1, "precio_unitario": 5.0}]}]
+    historial = historial_columnar.HistorialColumnar(datos)
+
+    assert historial[0]["items"][0].get("talle") == "M"
+    assert historial.a_formato_disco() == datos
+    assert historial_columnar.HistorialColumnar(historial[:]).a_formato_disco() == datos
+
+def test_historial_columnar_con_procesar_venta():
+    historial = historial_columnar.HistorialColumnar()
+    rutas = {"historial_ventas": "h.json", "ventas_realizadas": "v.json"}
+    for _ in range(2):
+        item = armar_item_para_historial("camisas", "basica", 3, 10.0, 30.0)
+        procesar_venta("m@g.com", [item], 30.0, historial, [], lambda ruta, datos: None, rutas)
+
+    assert [venta["id_venta"] for venta in historial] == [1, 2]
+    assert historial.unidades_por_producto() == {("camisas", "basica"): 6}
+
 def test_calcular_costo_total():
     items = [
         {"subtotal": 10.0},
@@ -227,6 +514,70 @@ def test_procesar_venta():
     assert len(ventas) == 1
     assert len(guardados) == 2
 
+def test_procesar_venta_asigna_id_y_fecha():
+    historial = [{"id_venta": 7, "cliente_email": "x@g.com", "items": [], "costo_total": 0}]
+    ventas = []
+    rutas = {"historial_ventas": "h.json", "ventas_realizadas": "v.json"}
+
+    procesar_venta("m@g.com", [{"producto": "Remera", "cantidad": 1, "precio_unitario": 50, "subtotal": 50}], 50, historial, ventas, lambda ruta, datos: None, rutas)
+
+    assert historial[-1]["id_venta"] == 8
+    assert ventas[-1]["id_venta"] == 8
+    assert date.fromisoformat(historial[-1]["fecha"][:10]) == date.today()
+
+def test_procesar_venta_actualiza_el_resumen_que_recibe():
+    import TPO_FINAL
+    guardados = []
+    rutas = {"historial_ventas": "h.json", "ventas_realizadas": "v.json", "resumen_ventas": "r.json"}
+    resumen = resumen_ventas.crear_resumen()
+    global_antes = TPO_FINAL.contexto.__dict__.get("resumen_ventas")
+
+    procesar_venta("m@g.com", [{"producto": "Remera", "cantidad": 2, "precio_unitario": 50, "subtotal": 100}], 100,
+                   [], [], lambda ruta, datos: guardados.append((ruta, datos)), rutas, resumen)
+
+    assert resumen["ultimo_id_venta"] == 1
+    assert guardados[-1] == ("r.json", resumen)
+    assert TPO_FINAL.contexto.__dict__.get("resumen_ventas") is global_antes
+
+def test_siguiente_id_venta_con_historial_sin_ids():
+    assert siguiente_id_venta([]) == 1
+    assert siguiente_id_venta([{"costo_total": 10}, {"costo_total": 20}]) == 3
+
+def test_contexto_reconstruye_el_resumen_que_no_coincide_con_el_historial(tmp_path, monkeypatch):
+    import TPO_FINAL
+    monkeypatch.setattr(TPO_FINAL, "USAR_SNAPSHOTS", False)
+    ruta_historial, ruta_resumen = str(tmp_path / "historial_test.json"), str(tmp_path / "resumen_test.json")
+    ventas = [{"id_venta": 1, "fecha": "2025-06-01T10:00:00", "items": [], "costo_total": 5.0},
+              {"id_venta": 2, "items": [], "costo_total": 1.0}]
+    guardar_datos(ruta_historial, ventas[:1])
+    archivos = {"historial_ventas": (ruta_historial, list), "resumen_ventas": (ruta_resumen, resumen_ventas.crear_resumen)}
+
+    # Sin archivo de resumen se arma desde el historial y se guarda
+    resumen = ContextoDatos(archivos).resumen_ventas
+    assert resumen["dia"]["2025-06-01"]["ventas"] == 1
+    assert cargar_datos(ruta_resumen, {}) == resumen
+
+    # Una venta que llegó al historial pero no al resumen (aunque no tenga fecha)
+    guardar_datos(ruta_historial, ventas)
+    resumen = ContextoDatos(archivos).resumen_ventas
+    assert resumen["cantidad_ventas"] == 2 and resumen["ultimo_id_venta"] == 2
+
+def test_resumen_ventas_totales_entre_fechas():
+    resumen = resumen_ventas.crear_resumen()
+    ventas = [
+        {"fecha": "2025-01-31T10:00:00", "items": [{"cantidad": 1}], "costo_total": 10.0},
+        {"fecha": "2025-02-10T11:30:00", "items": [{"cantidad": 2}], "costo_total": 20.0},
+        {"fecha": "2025-03-01T09:00:00", "items": [{"cantidad": 3}], "costo_total": 40.0},
+        {"items": [{"cantidad": 5}], "costo_total": 99.0},
+    ]
+    registrados = [resumen_ventas.registrar_venta(resumen, venta) for venta in ventas]
+
+    assert registrados == [True, True, True, False]
+    assert resumen["hora"]["2025-02-10T11"]["ingresos"] == 20.0
+    assert resumen_ventas.totales_entre(resumen, date(2025, 1, 31), date(2025, 2, 28)) == {"ingresos": 30.0, "unidades": 3, "ventas": 2}
+    assert resumen_ventas.totales_entre(resumen, date(2025, 2, 1), date(2025, 3, 1))["ingresos"] == 60.0
+    assert resumen_ventas.totales_entre(resumen, date(2025, 3, 2), date(2025, 1, 1))["ventas"] == 0
+
 def test_confirmar_y_procesar_venta():
     guardados = []
 
@@ -253,6 +604,200 @@ def test_confirmar_y_procesar_venta():
     assert len(ventas) == 1
     assert len(guardados) == 3
 
+def test_confirmar_venta_con_wal_escribe_una_sola_vez():
+    guardados = []
+    rutas = {"stock": "s.json", "ventas_realizadas": "v.json", "historial_ventas": "h.json", "wal": "compra_test.wal"}
+    resumen = lambda carrito: (100, [{"categoria": "Electrónica", "producto": "Mouse", "cantidad": 1, "precio_unitario": 100, "subtotal": 100}])
+    carrito = {"Electrónica:Mouse": {"cantidad": 1, "precio_unitario_registrado": 100}}
+    stock = {"Electrónica": {"Mouse": 3, "Teclado": 5}}
+    historial, ventas = [], []
+
+    ok = confirmar_y_procesar_venta(carrito, "a@a.com", stock, {}, historial, ventas,
+                                    lambda ruta, datos: guardados.append(ruta), rutas, resumen, lambda: True)
+
+    assert ok and stock["Electrónica"]["Mouse"] == 2
+    assert len(historial) == 1 and len(ventas) == 1
+    assert guardados == []
+    entradas = wal.leer(rutas["wal"])
+    assert entradas[0]["stock"] == {"Electrónica": {"Mouse": 2}}
+    assert entradas[0]["venta"]["id_venta"] == 1
+
+    assert volcar_wal(stock, historial, ventas, lambda ruta, datos: guardados.append(ruta), rutas) == 1
+    assert guardados == ["s.json", "h.json", "v.json"]
+    assert not os.path.exists(rutas["wal"])
+
+def test_recuperar_compra_del_wal_tras_un_corte():
+    ruta_wal = "recuperar_test.wal"
+    venta = {"id_venta": 2, "fecha": "2025-06-01T10:00:00", "cliente_email": "a@a.com", "items": [], "costo_total": 30.0}
+    wal.agregar(ruta_wal, {"venta": venta, "stock": {"ropa": {"camisa": 1}}})
+    with open(ruta_wal, "ab") as archivo:
+        archivo.write(b'{"venta": {"id_venta": 3')  # compra cortada a mitad de la escritura
+
+    # El corte ocurrió después de escribir el stock pero antes del historial.
+    stock = {"ropa": {"camisa": 1}}
+    historial = [{"id_venta": 1, "cliente_email": "b@b.com", "items": [], "costo_total": 10.0}]
+    ventas = [{"id_venta": 1, "subtotal": 10.0}]
+    resumen = resumen_ventas.crear_resumen()
+    for entrada in wal.leer(ruta_wal) * 2:
+        aplicar_entrada_wal(entrada, stock, historial, ventas, resumen)
+
+    assert stock == {"ropa": {"camisa": 1}}
+    assert [v["id_venta"] for v in historial] == [1, 2]
+    assert [v["id_venta"] for v in ventas] == [1, 2]
+    assert resumen["dia"]["2025-06-01"]["ventas"] == 1
+    wal.vaciar(ruta_wal)
+
+def test_wal_descarta_la_linea_cortada_antes_de_agregar():
+    ruta_wal = "cortada_test.wal"
+    wal.agregar(ruta_wal, {"venta": {"id_venta": 1}, "stock": {}})
+    with open(ruta_wal, "ab") as archivo:
+        archivo.write(b'{"venta": {"id_venta": 2')  # compra cortada a mitad de la escritura
+    wal.agregar(ruta_wal, {"venta": {"id_venta": 3}, "stock": {}})
+
+    assert [entrada["venta"]["id_venta"] for entrada in wal.leer(ruta_wal)] == [1, 3]
+    wal.vaciar(ruta_wal)
+
+def test_salir_sin_sesion_vuelca_el_wal(monkeypatch):
+    import TPO_FINAL
+    volcados = []
+    monkeypatch.setattr(TPO_FINAL, "volcar_compras_pendientes", lambda: volcados.append(1))
+    monkeypatch.setattr(TPO_FINAL.contexto, "actualizar_snapshots", lambda: 0)
+    monkeypatch.setitem(TPO_FINAL.sesion_activa, "email", None)
+    monkeypatch.setattr("builtins.input", lambda _: "3")
+
+    TPO_FINAL.menu_principal()
+    assert volcados == [1]
+
+def test_parches_de_stock_se_aplican_sobre_el_archivo_completo():
+    ruta_parches = "stock_test.json.parches"
+    parches.agregar(ruta_parches, {"ropa": {"camisa": 4}})
+    parches.agregar(ruta_parches, {"ropa": {"camisa": 3}, "tazas": {"grande": 1}})
+    with open(ruta_parches, "ab") as archivo:
+        archivo.write(b'{"ropa": {"cami')  # parche cortado a mitad de la escritura
+
+    stock = {"ropa": {"camisa": 5, "gorra": 2}}
+    assert parches.aplicar(ruta_parches, stock) == 2
+    assert parches.aplicar(ruta_parches, stock) == 2
+    assert stock == {"ropa": {"camisa": 3, "gorra": 2}, "tazas": {"grande": 1}}
+    parches.descartar(ruta_parches)
+    assert not os.path.exists(ruta_parches)
+
+def test_parche_despues_de_uno_cortado_no_se_pierde_y_se_ve_al_leer_el_archivo():
+    ruta_stock = "stock_parches_leer_test.json"
+    ruta_parches = parches.ruta_de(ruta_stock)
+    guardar_datos(ruta_stock, {"ropa": {"camisa": 5}})
+    parches.agregar(ruta_parches, {"ropa": {"camisa": 4}})
+    with open(ruta_parches, "ab") as archivo:
+        archivo.write(b'{"ropa": {"cami')  # parche cortado a mitad de la escritura
+    parches.agregar(ruta_parches, {"ropa": {"camisa": 2}})
+
+    assert inventario_particionado.leer(ruta_stock) == {"ropa": {"camisa": 2}}
+    parches.descartar(ruta_parches)
+    os.remove(ruta_stock)
+
+def test_confirmar_venta_con_parches_no_reescribe_el_stock():
+    guardados = []
+    rutas = {"stock": "s.json", "ventas_realizadas": "v.json", "historial_ventas": "h.json", "parches_stock": "s_test.json.parches"}
+    resumen = lambda carrito: (100, [{"categoria": "Electrónica", "producto": "Mouse", "cantidad": 1, "precio_unitario": 100, "subtotal": 100}])
+    carrito = {"Electrónica:Mouse": {"cantidad": 1, "precio_unitario_registrado": 100}}
+    stock = {"Electrónica": {"Mouse": 3, "Teclado": 5}}
+
+    ok = confirmar_y_procesar_venta(carrito, "a@a.com", stock, {}, [], [],
+                                    lambda ruta, datos: guardados.append(ruta), rutas, resumen, lambda: True)
+
+    assert ok and "s.json" not in guardados
+    en_disco = {"Electrónica": {"Mouse": 3, "Teclado": 5}}
+    parches.aplicar(rutas["parches_stock"], en_disco)
+    assert en_disco == stock
+    parches.descartar(rutas["parches_stock"])
+
+def test_guardar_stock_escribe_todo_cuando_el_registro_crece(monkeypatch):
+    import TPO_FINAL
+    monkeypatch.setattr(TPO_FINAL, "MAX_BYTES_PARCHES", 64)
+    guardados = []
+    rutas = {"stock": "s.json", "parches_stock": "compactar_test.json.parches"}
+    stock = {"ropa": {"camisa": 1}}
+
+    assert guardar_stock(stock, {"ropa": {"camisa": 1}}, lambda ruta, datos: guardados.append(ruta), rutas)
+    assert guardados == [] and os.path.exists(rutas["parches_stock"])
+    assert guardar_stock(stock, {"ropa": {"camisa": 1}, "tazas": {"grande": 7, "chica": 2}},
+                         lambda ruta, datos: guardados.append(ruta), rutas)
+    assert guardados == ["s.json"]
+    assert not os.path.exists(rutas["parches_stock"])
+
+def test_claves_idempotencia_vencen_y_se_conservan_al_reabrir():
+    ruta = "claves_test.log"
+    indice = claves_idempotencia.IndiceIdempotencia(ruta, vigencia=100, maximo=2)
+    assert indice.registrar("a", ahora=1000)
+    assert not indice.registrar("a", ahora=1001)
+    assert indice.registrar("b", ahora=1050)
+    assert indice.registrar("c", ahora=1060)  # supera el máximo: sale la más vieja
+    assert not indice.contiene("a", ahora=1060) and indice.contiene("b", ahora=1060)
+    assert not indice.contiene("b", ahora=1151) and indice.contiene("c", ahora=1151)
+
+    reabierto = claves_idempotencia.IndiceIdempotencia(ruta, vigencia=10**12, maximo=2)
+    assert list(reabierto.claves) == ["b", "c"]
+    reabierto.compactar()
+    with open(ruta, encoding="utf-8") as archivo:
+        assert archivo.read() == "b\t1050\nc\t1060\n"
+    os.remove(ruta)
+
+def test_confirmar_venta_rechaza_una_compra_repetida():
+    guardados = []
+    rutas = {"stock": "s.json", "ventas_realizadas": "v.json", "historial_ventas": "h.json",
+             "claves_idempotencia": "claves_compra_test.log"}
+    resumen = lambda carrito: (100, [{"categoria": "Electrónica", "producto": "Mouse", "cantidad": 1, "precio_unitario": 100, "subtotal": 100}])
+    carrito = {"Electrónica:Mouse": {"cantidad": 1, "precio_unitario_registrado": 100}}
+    stock = {"Electrónica": {"Mouse": 3}}
+    historial, ventas = [], []
+
+    for _ in range(2):
+        ok = confirmar_y_procesar_venta(carrito, "a@a.com", stock, {}, historial, ventas,
+                                        lambda ruta, datos: guardados.append(ruta), rutas, resumen, lambda: True,
+                                        clave_idempotencia="pedido-1")
+    assert not ok
+    assert stock["Electrónica"]["Mouse"] == 2
+    assert len(historial) == 1 and len(ventas) == 1
+    assert confirmar_y_procesar_venta(carrito, "a@a.com", stock, {}, historial, ventas,
+                                      lambda ruta, datos: guardados.append(ruta), rutas, resumen, lambda: True,
+                                      clave_idempotencia="pedido-2")
+    assert stock["Electrónica"]["Mouse"] == 1
+    os.remove(rutas["claves_idempotencia"])
+    claves_idempotencia._abiertos.clear()
+
+def test_clave_de_compra_no_se_registra_si_la_venta_fallo():
+    rutas = {"stock": "s.json", "ventas_realizadas": "v.json", "historial_ventas": "h.json",
+             "claves_idempotencia": "claves_fallo_test.log"}
+    resumen = lambda carrito: (100, [{"categoria": "Electrónica", "producto": "Mouse", "cantidad": 1, "precio_unitario": 100, "subtotal": 100}])
+    carrito = {"Electrónica:Mouse": {"cantidad": 1, "precio_unitario_registrado": 100}}
+    stock = {"Electrónica": {"Mouse": 3}}
+
+    def guardar_roto(ruta, datos):
+        if ruta == "h.json":
+            raise OSError("disco lleno")
+
+    assert not confirmar_y_procesar_venta(carrito, "a@a.com", stock, {}, [], [], guardar_roto, rutas, resumen, lambda: True,
+                                          clave_idempotencia="pedido-1")
+    assert stock["Electrónica"]["Mouse"] == 3
+    assert confirmar_y_procesar_venta(carrito, "a@a.com", stock, {}, [], [], lambda ruta, datos: None, rutas, resumen,
+                                      lambda: True, clave_idempotencia="pedido-1")
+    assert stock["Electrónica"]["Mouse"] == 2
+    os.remove(rutas["claves_idempotencia"])
+    claves_idempotencia._abiertos.clear()
+
+def test_finalizar_compra_usa_la_clave_del_carrito(monkeypatch):
+    import TPO_FINAL
+    claves = []
+    monkeypatch.setattr(TPO_FINAL, "confirmar_y_procesar_venta", lambda *args, **kwargs: claves.append(kwargs["clave_idempotencia"]))
+    monkeypatch.setitem(TPO_FINAL.contexto.__dict__, "resumen_ventas", {})
+    monkeypatch.setattr("builtins.input", lambda _: "f")
+    carrito = {"Electrónica:Mouse": {"cantidad": 1, "precio_unitario_registrado": 100}}
+
+    for _ in range(2):
+        TPO_FINAL.manejar_opcion_post_agregado(carrito, {"email": "a@a.com"}, {}, [], [], {}, "carrito-1")
+        TPO_FINAL.manejar_accion_categoria("FINALIZAR_COMPRA", carrito, {"email": "a@a.com"}, {}, [], [], {}, "carrito-1")
+    assert claves == ["carrito-1"] * 4
+
 def test_validar_cantidad_none():
     assert validar_cantidad(None, 5) == -1
 
@@ -307,6 +852,101 @@ def test_manejar_agregado_producto_simple():
     }
     assert stock["ropa"]["camisa"] == 2
 
+def test_manejar_agregado_producto_precio_con_otra_capitalizacion():
+    carrito = {}
+    stock = {"ropa": {"Camisa": 3}}
+    precios = {"ropa": {"camisa": 15.0}}
+
+    manejar_agregado_producto_al_carrito(carrito, "ropa", "Camisa", stock, precios, lambda *_: 2)
+
+    assert carrito["ropa:Camisa"]["precio_unitario_registrado"] == 15.0
+    assert stock["ropa"]["Camisa"] == 1
+
+def test_indice_catalogo_busca_sin_distinguir_mayusculas():
+    stock = {"Camisas": {"Basica Blanca": 3, "lino": 1}, "zapatos": {}}
+
+    assert catalogo.buscar_categoria(stock, "CAMISAS") == "Camisas"
+    assert catalogo.buscar_categoria(stock, " zapatos ") == "zapatos"
+    assert catalogo.buscar_categoria(stock, "chanclas") is None
+    assert catalogo.buscar_producto(stock, "Camisas", "basica blanca") == "Basica Blanca"
+    assert catalogo.buscar_producto(stock, "Camisas", "jean") is None
+    assert catalogo.buscar_producto(stock, "chanclas", "playa") is None
+
+def test_indice_catalogo_detecta_reemplazos_del_mismo_tamaño():
+    stock = {"Camisas": {"Basica": 3}, "zapatos": {}}
+    assert catalogo.buscar_categoria(stock, "camisas") == "Camisas"
+    assert catalogo.buscar_producto(stock, "Camisas", "basica") == "Basica"
+
+    # Renombres sin avisar al índice, con la misma cantidad de claves
+    stock["Camisas"]["Lisa"] = stock["Camisas"].pop("Basica")
+    assert catalogo.buscar_producto(stock, "Camisas", "basica") is None
+    assert catalogo.buscar_producto(stock, "Camisas", "LISA") == "Lisa"
+    stock["CAMISAS"] = stock.pop("Camisas")
+    assert catalogo.buscar_categoria(stock, "camisas") == "CAMISAS"
+
+    stock["Remeras"] = stock.pop("zapatos")
+    catalogo.invalidar(stock)
+    assert catalogo.buscar_categoria(stock, "remeras") == "Remeras"
+
+def test_indice_catalogo_no_retiene_catalogos_viejos():
+    for _ in range(catalogo.MAX_CATALOGOS + 3):
+        catalogo.buscar_categoria({"Camisas": {}}, "camisas")
+    assert len(catalogo._indices) <= catalogo.MAX_CATALOGOS
+
+def test_indice_catalogo_se_mantiene_al_agregar_y_eliminar():
+    stock = {"camisas": {"basica": 3}}
+    catalogo.buscar_producto(stock, "camisas", "BASICA")
+
+    stock["Chanclas"] = {}
+    catalogo.registrar_categoria(stock, "Chanclas")
+    stock["Chanclas"]["Playa"] = 4
+    catalogo.registrar_producto(stock, "Chanclas", "Playa")
+    assert catalogo.buscar_categoria(stock, "chanclas") == "Chanclas"
+    assert catalogo.buscar_producto(stock, "Chanclas", "PLAYA") == "Playa"
+
+    del stock["camisas"]["basica"]
+    catalogo.quitar_producto(stock, "camisas", "basica")
+    del stock["Chanclas"]
+    catalogo.quitar_categoria(stock, "Chanclas")
+    assert catalogo.buscar_producto(stock, "camisas", "BASICA") is None
+    assert catalogo.buscar_categoria(stock, "CHANCLAS") is None
+
+    # Cambios hechos sin avisar al índice: se vuelve a armar en la próxima búsqueda.
+    stock["Zapatos"] = {"Botas": 1}
+    assert catalogo.buscar_categoria(stock, "zapatos") == "Zapatos"
+
+def test_busqueda_productos_por_prefijo_ordena_y_filtra_sin_stock():
+    stock = {
+        "camisas": {"basica blanca": 3, "basica negra": 0, "manga larga": 2},
+        "basicos": {"medias": 5},
+        "pantalones": {"cargo": 1, "basica": 4},
+    }
+    indice = busqueda_productos.crear_indice(stock)
+
+    assert busqueda_productos.buscar(indice, "BASICA", stock) == [
+        ("pantalones", "basica"), ("camisas", "basica blanca")]
+    assert busqueda_productos.buscar(indice, "bas", stock) == [
+        ("pantalones", "basica"), ("camisas", "basica blanca"), ("basicos", "medias")]
+    assert busqueda_productos.buscar(indice, "camisas ma", stock) == [("camisas", "manga larga")]
+    assert busqueda_productos.buscar(indice, "larga", stock) == [("camisas", "manga larga")]
+    assert busqueda_productos.buscar(indice, "zapato", stock) == []
+    assert busqueda_productos.buscar(indice, "  ", stock) == []
+
+def test_busqueda_productos_respeta_el_limite():
+    stock = {"tazas": {f"taza {i:03d}": 1 for i in range(50)}}
+    indice = busqueda_productos.crear_indice(stock)
+
+    resultados = busqueda_productos.buscar(indice, "taza", stock, limite=5)
+    assert resultados == [("tazas", f"taza {i:03d}") for i in range(5)]
+
+def test_resultados_de_busqueda_muestran_el_precio_de_productos_con_mayusculas(capsys):
+    stock = {"camisas": {"Lino Azul": 2}}
+    precios = {"camisas": {"Lino Azul": 30.0}}
+    indice = busqueda_productos.crear_indice(stock)
+
+    mostrar_resultados_busqueda(busqueda_productos.buscar(indice, "lino", stock), stock, precios)
+    assert "Precio: $30.00" in capsys.readouterr().out
+
 def test_mostrar_carrito_actual():
     # Solo verifica que no lance excepciones
     try:
@@ -517,6 +1157,30 @@ def test_buscar_administradores():
         - Obtenido: {resultado}
         """
 
+def test_historial_en_disco_agrega_ventas_sin_reescribir_el_archivo(tmp_path):
+    ruta = str(tmp_path / "historial_agregar_test.json")
+    historial = indice_ventas.HistorialEnDisco(ruta)
+    historial.append({"id_venta": 1, "costo_total": 5.0})
+    historial.append(modelo_ventas.Venta(2, "2025-01-02T10:00:00", "a@b.com", [], 7.5))
+    with open(ruta, "ab") as archivo:
+        archivo.write(b',\n{"id_venta": 3, "cos')  # venta cortada a mitad de la escritura
+    historial.append({"id_venta": 3, "costo_total": 1.0})
+
+    assert [venta["id_venta"] for venta in historial] == [1, 2, 3]
+    assert [venta["id_venta"] for venta in cargar_datos(ruta, [])] == [1, 2, 3]
+
+def test_procesar_venta_con_historial_en_disco_no_lo_reescribe(tmp_path):
+    ruta = str(tmp_path / "historial_procesar_test.json")
+    guardar_datos(ruta, [{"id_venta": 1, "costo_total": 5.0}])
+    historial = indice_ventas.HistorialEnDisco(ruta)
+    guardados = []
+
+    assert procesar_venta("a@b.com", [], 3.0, historial, [], lambda r, d: guardados.append(r),
+                          {"historial_ventas": ruta, "ventas_realizadas": "v.json"})
+
+    assert guardados == ["v.json"]
+    assert [venta["id_venta"] for venta in cargar_datos(ruta, [])] == [1, 2]
+
 def test_calcular_indices_paginacion():
     # Casos de prueba
     casos_prueba = [
@@ -540,3 +1204,586 @@ def test_calcular_indices_paginacion():
         """
 
     print("✅ Todos los casos de prueba pasaron correctamente")
+
+def test_historial_en_disco_lee_paginas_con_el_indice():
+    ruta = "historial_indice_test.json"
+    historial = [
+        {"cliente_email": f"c{i}@a.com", "items": [{"producto": "llave {[", "cantidad": i}], "costo_total": float(i)}
+        for i in range(10)
+    ]
+    guardar_datos(ruta, historial, compacto=False)
+    en_disco = indice_ventas.HistorialEnDisco(ruta)
+
+    assert len(en_disco) == 10
+    assert en_disco[3:6] == historial[3:6]
+    assert en_disco[-1] == historial[-1]
+    mostrar_pagina(en_disco, 4, 3)  # Última página, incompleta
+
+    # Al agregar una venta, el índice se actualiza sin perder las anteriores
+    historial.append({"cliente_email": "nuevo@a.com", "items": [], "costo_total": 0.0})
+    guardar_datos(ruta, historial, compacto=False)
+    assert len(en_disco) == 11
+    assert en_disco[10] == historial[10]
+    assert list(en_disco) == historial
+
+    os.remove(ruta)
+    os.remove(indice_ventas.ruta_indice(ruta))
+
+def _borrar_libro(ruta):
+    for archivo in (ruta, libro_ventas.ruta_ventas(ruta), libro_ventas.ruta_tablas(ruta)):
+        if os.path.exists(archivo):
+            os.remove(archivo)
+
+def test_libro_ventas_importar_y_exportar_json():
+    ruta_json, ruta_libro = "libro_origen_test.json", "libro_test.libro"
+    historial = [
+        {"id_venta": 1, "fecha": "2025-06-01T10:00:00", "cliente_email": "a@a.com", "costo_total": 70.0, "items": [
+            {"categoria": "camisas", "producto": "basica", "cantidad": 2, "precio_unitario": 25.0, "subtotal": 50.0},
+            {"categoria": "zapatos", "producto": "botas", "cantidad": 1, "precio_unitario": 20.0, "subtotal": 20.0}]},
+        {"id_venta": 2, "fecha": "2025-06-02T11:30:00", "cliente_email": "b@b.com", "costo_total": 0.0, "items": []},
+    ]
+    guardar_datos(ruta_json, historial)
+
+    assert libro_ventas.importar_json(ruta_json, ruta_libro) == 2
+    libro = libro_ventas.LibroVentas(ruta_libro)
+    assert len(libro) == 2
+    assert libro[0]["items"][1]["producto"] == "botas"
+    assert libro[-1]["items"] == [] and libro[-1]["cliente_email"] == "b@b.com"
+    libro.cerrar()
+
+    assert libro_ventas.exportar_json(ruta_libro, ruta_json) == 2
+    assert cargar_datos(ruta_json, []) == historial
+    os.remove(ruta_json)
+    _borrar_libro(ruta_libro)
+
+def test_procesar_venta_agrega_al_libro_si_existe():
+    ruta_libro = "libro_procesar_test.libro"
+    rutas = {"historial_ventas": "h.json", "ventas_realizadas": "v.json", "libro_ventas": ruta_libro}
+    item = armar_item_para_historial("camisas", "basica", 3, 10.0, 30.0)
+
+    procesar_venta("m@g.com", [item], 30.0, [], [], lambda ruta, datos: None, rutas)
+    assert not os.path.exists(ruta_libro)
+
+    libro = libro_ventas.LibroVentas(ruta_libro)
+    libro.agregar({"cliente_email": "x@g.com", "items": [], "costo_total": 0.0})
+    historial = [libro[0]]
+    for _ in range(2):
+        procesar_venta("m@g.com", [item], 30.0, historial, [], lambda ruta, datos: None, rutas)
+
+    assert [venta["id_venta"] for venta in libro] == [1, 2, 3]
+    assert libro[2]["costo_total"] == 30.0
+    assert libro.unidades_por_producto() == {("camisas", "basica"): 6}
+    libro.cerrar()
+    _borrar_libro(ruta_libro)
+
+def test_libro_ventas_guarda_el_costo_total_y_no_cuenta_registros_huerfanos():
+    ruta_libro = "libro_huerfanos_test.libro"
+    libro = libro_ventas.LibroVentas(ruta_libro)
+    item = {"categoria": "camisas", "producto": "basica", "cantidad": 2, "precio_unitario": 10.0, "subtotal": 20.0}
+    libro.agregar({"cliente_email": "a@a.com", "items": [item], "costo_total": 15.0})
+
+    # Ítems de una venta que se cortó antes de escribir su entrada en .ventas
+    tablas = libro_ventas._Tablas(libro_ventas.ruta_tablas(ruta_libro))
+    huerfanos = libro_ventas._registros_de_venta(tablas, {"cliente_email": "a@a.com", "items": [item]}, 2)
+    libro_ventas._agregar_alineado(ruta_libro, libro_ventas.MAGIA, libro_ventas.REGISTRO.size, b"".join(huerfanos))
+    libro.agregar({"cliente_email": "b@b.com", "items": [item], "costo_total": 20.0})
+
+    assert [venta["costo_total"] for venta in libro] == [15.0, 20.0]
+    assert libro.unidades_por_producto() == {("camisas", "basica"): 4}
+    libro.cerrar()
+    _borrar_libro(ruta_libro)
+
+def _venta_de_prueba(id_venta, fecha, monto):
+    item = {"categoria": "camisas", "producto": "basica", "cantidad": 1, "precio_unitario": monto, "subtotal": monto}
+    return {"id_venta": id_venta, "fecha": fecha, "cliente_email": "a@a.com", "items": [item], "costo_total": monto}
+
+def test_historial_segmentado_rota_por_cantidad_y_por_mes():
+    directorio = "segmentos_test"
+    historial = historial_segmentado.HistorialSegmentado(directorio, max_ventas_por_segmento=2)
+    fechas = ["2025-05-30T10:00:00", "2025-06-01T10:00:00", "2025-06-02T10:00:00", "2025-06-03T10:00:00"]
+    for id_venta, fecha in enumerate(fechas, 1):
+        historial.append(_venta_de_prueba(id_venta, fecha, 10.0 * id_venta))
+
+    reabierto = historial_segmentado.HistorialSegmentado(directorio)
+    assert [segmento["ventas"] for segmento in reabierto.segmentos] == [1, 2, 1]
+    assert [segmento["sellado"] for segmento in reabierto.segmentos] == [True, True, False]
+    assert len(reabierto) == 4
+    assert [venta["id_venta"] for venta in reabierto[1:3]] == [2, 3]
+    assert reabierto[-1]["costo_total"] == 40.0
+    assert [venta["id_venta"] for venta in reabierto.ventas_entre_ids(3, 9)] == [3, 4]
+    shutil.rmtree(directorio)
+
+def test_historial_segmentado_totales_usan_el_manifiesto():
+    ruta_json, directorio = "segmentar_test.json", "segmentos_json_test"
+    fechas = ["2025-05-30T10:00:00", "2025-06-01T10:00:00", "2025-06-20T10:00:00", "2025-07-03T10:00:00"]
+    guardar_datos(ruta_json, [_venta_de_prueba(i, fecha, 10.0) for i, fecha in enumerate(fechas, 1)])
+
+    assert historial_segmentado.segmentar_json(ruta_json, directorio) == 3
+    historial = historial_segmentado.HistorialSegmentado(directorio)
+    # El segmento de junio cae entero en el rango: se borra para comprobar que no se abre.
+    os.remove(historial.ruta_segmento(historial.segmentos[1]))
+
+    assert historial.totales() == {"ingresos": 40.0, "unidades": 4, "ventas": 4}
+    assert historial.totales_entre(date(2025, 6, 1), date(2025, 7, 1))["ventas"] == 2
+    os.remove(ruta_json)
+    shutil.rmtree(directorio)
+
+def test_historial_segmentado_comprime_los_sellados():
+    directorio = "segmentos_gzip_test"
+    historial = historial_segmentado.HistorialSegmentado(directorio, max_ventas_por_segmento=2, comprimir=False)
+    for id_venta in range(1, 6):
+        historial.append(_venta_de_prueba(id_venta, "2025-06-01T10:00:00", 5.0))
+    assert not any(segmento["archivo"].endswith(".gz") for segmento in historial.segmentos)
+
+    assert historial.comprimir_sellados() == 2
+    archivos = sorted(os.listdir(directorio))
+    assert archivos == ["manifiesto.json", "segmento_000001.jsonl.gz", "segmento_000002.jsonl.gz", "segmento_000003.jsonl"]
+
+    reabierto = historial_segmentado.HistorialSegmentado(directorio, max_ventas_por_segmento=2)
+    reabierto.append(_venta_de_prueba(6, "2025-06-02T10:00:00", 5.0))
+    reabierto.append(_venta_de_prueba(7, "2025-06-02T10:00:00", 5.0))
+    assert reabierto.segmentos[2]["archivo"].endswith(".gz")
+    assert [venta["id_venta"] for venta in reabierto] == list(range(1, 8))
+    assert reabierto[2]["id_venta"] == 3
+    shutil.rmtree(directorio)
+
+def test_historial_segmentado_vuelve_a_contar_el_segmento_activo():
+    directorio = "segmentos_recontar_test"
+    historial = historial_segmentado.HistorialSegmentado(directorio)
+    historial.append(_venta_de_prueba(1, "2025-06-01T10:00:00", 10.0))
+    # Una venta que llegó al segmento pero no al manifiesto, y otra cortada a mitad de línea
+    with open(historial.ruta_segmento(historial.segmentos[-1]), "ab") as archivo:
+        archivo.write(codec.codificar(_venta_de_prueba(2, "2025-06-01T11:00:00", 5.0), legible=False) + b"\n")
+        archivo.write(b'{"id_venta": 3, "fe')
+
+    reabierto = historial_segmentado.HistorialSegmentado(directorio)
+    assert len(reabierto) == 2 and reabierto.ultimo_id() == 2
+    assert reabierto.totales() == {"ingresos": 15.0, "unidades": 2, "ventas": 2}
+    reabierto.append(_venta_de_prueba(3, "2025-06-01T12:00:00", 1.0))
+    assert [venta["id_venta"] for venta in historial_segmentado.HistorialSegmentado(directorio)] == [1, 2, 3]
+    shutil.rmtree(directorio)
+
+def test_procesar_venta_con_historial_segmentado_escribe_solo_los_segmentos():
+    directorio, ruta_libro = "segmentos_procesar_test", "libro_segmentos_test.libro"
+    historial = historial_segmentado.HistorialSegmentado(directorio)
+    historial.append(_venta_de_prueba(1, "2025-06-01T10:00:00", 10.0))
+    libro_ventas.LibroVentas(ruta_libro).agregar(_venta_de_prueba(1, "2025-06-01T10:00:00", 10.0))
+    guardados = []
+    rutas = {"historial_ventas": "h.json", "ventas_realizadas": "v.json", "libro_ventas": ruta_libro,
+             "historial_segmentado": directorio}
+    item = armar_item_para_historial("camisas", "basica", 1, 10.0, 10.0)
+
+    procesar_venta("m@g.com", [item], 10.0, historial, [], lambda ruta, datos: guardados.append(ruta), rutas)
+
+    assert guardados == []
+    reabierto = historial_segmentado.HistorialSegmentado(directorio)
+    assert [venta["id_venta"] for venta in reabierto] == [1, 2]
+    assert len(libro_ventas.LibroVentas(ruta_libro)) == 1
+    shutil.rmtree(directorio)
+    _borrar_libro(ruta_libro)
+
+def test_historial_segmentado_escribe_el_manifiesto_solo_al_rotar_o_guardar():
+    directorio = "segmentos_manifiesto_test"
+    ruta_manifiesto = os.path.join(directorio, historial_segmentado.MANIFIESTO)
+    historial = historial_segmentado.HistorialSegmentado(directorio, max_ventas_por_segmento=3)
+    historial.append(_venta_de_prueba(1, "2025-06-01T10:00:00", 10.0))
+    manifiesto = open(ruta_manifiesto, "rb").read()
+    historial.append(_venta_de_prueba(2, "2025-06-01T11:00:00", 10.0))
+    assert open(ruta_manifiesto, "rb").read() == manifiesto and b"\n" not in manifiesto
+
+    assert historial.guardar() and not historial.guardar()
+    assert codec.decodificar(open(ruta_manifiesto, "rb").read())["segmentos"][0]["ventas"] == 2
+    shutil.rmtree(directorio)
+
+def test_contexto_comparte_el_historial_segmentado_y_el_objetivo_usa_su_manifiesto(monkeypatch, capsys):
+    directorio = "segmentos_contexto_test"
+    historial = historial_segmentado.HistorialSegmentado(directorio)
+    for id_venta, fecha in enumerate(["2025-05-30T10:00:00", "2025-06-01T10:00:00", "2025-06-20T10:00:00"], 1):
+        historial.append(_venta_de_prueba(id_venta, fecha, 10.0))
+    contexto = ContextoDatos({})
+    segmentos = contexto.abrir_segmentos(directorio)
+    assert contexto.abrir_segmentos(directorio) is segmentos
+    respuestas = iter(["40", "2025-06-01", "2025-06-30"])
+    monkeypatch.setattr("builtins.input", lambda _: next(respuestas))
+    monkeypatch.setattr(segmentos, "leer_segmento", lambda segmento: iter(()))
+
+    # Junio cae entero en el rango: el total sale del manifiesto sin leer segmentos
+    porcentaje_objetivo_ganancias([], None, segmentos)
+    salida = capsys.readouterr().out
+    assert "$20.00" in salida and "50.00%" in salida
+    shutil.rmtree(directorio)
+    assert contexto.abrir_segmentos(directorio) is None
+
+def test_inventario_particionado_lee_solo_lo_que_se_usa():
+    ruta_json, directorio = "stock_particionar_test.json", "stock_particionado_test"
+    guardar_datos(ruta_json, {"camisas": {"basica": 3}, "zapatos de cuero": {"botas": 1}, "chanclas": {}})
+
+    assert inventario_particionado.particionar(ruta_json, directorio) == 3
+    stock = inventario_particionado.DiccionarioParticionado(directorio)
+    assert list(stock) == ["camisas", "chanclas", "zapatos de cuero"]
+    assert "zapatos de cuero" in stock and stock["camisas"] == {"basica": 3}
+    assert set(stock._cargadas) == {"camisas"}
+    assert stock.a_formato_disco()["zapatos de cuero"] == {"botas": 1}
+
+    # El JSON único queda renombrado y las herramientas leen el directorio
+    assert not os.path.exists(ruta_json)
+    assert inventario_particionado.leer(directorio)["camisas"] == {"basica": 3}
+    try:
+        inventario_particionado.leer(ruta_json)
+        assert False, "no debería leer el JSON reemplazado"
+    except FileNotFoundError:
+        pass
+    os.remove(ruta_json + inventario_particionado.SUFIJO_REEMPLAZADO)
+    shutil.rmtree(directorio)
+
+def test_particionar_aplica_los_parches_pendientes_y_los_descarta():
+    ruta_json, directorio = "stock_particionar_parches_test.json", "stock_particionado_parches_test"
+    guardar_datos(ruta_json, {"camisas": {"basica": 3}})
+    parches.agregar(parches.ruta_de(ruta_json), {"camisas": {"basica": 1}, "gorras": {"lana": 2}})
+
+    assert inventario_particionado.particionar(ruta_json, directorio) == 2
+    assert inventario_particionado.leer(directorio) == {"camisas": {"basica": 1}, "gorras": {"lana": 2}}
+    assert not os.path.exists(parches.ruta_de(ruta_json))
+    os.remove(ruta_json + inventario_particionado.SUFIJO_REEMPLAZADO)
+    shutil.rmtree(directorio)
+
+def test_inventario_particionado_guarda_solo_categorias_modificadas():
+    directorio = "precios_particionado_test"
+    precios = inventario_particionado.DiccionarioParticionado(directorio)
+    precios.update({"camisas": {"basica": 10.0}, "zapatos": {"botas": 50.0}, "chanclas": {"playa": 5.0}})
+    assert precios.guardar_cambios() == 3
+
+    precios = inventario_particionado.DiccionarioParticionado(directorio)
+    precios["camisas"]["basica"] = 12.0
+    precios["zapatos"]
+    del precios["chanclas"]
+    assert guardar_datos("precios.json", precios)
+    assert precios.guardar_cambios() == 0
+
+    assert sorted(os.listdir(directorio)) == ["camisas.json", "zapatos.json"]
+    assert dict(inventario_particionado.DiccionarioParticionado(directorio).items()) == {"camisas": {"basica": 12.0}, "zapatos": {"botas": 50.0}}
+    shutil.rmtree(directorio)
+
+def test_importar_inventario_csv_valida_y_guarda_una_sola_vez(tmp_path):
+    ruta_csv = str(tmp_path / "inventario_test.csv")
+    with open(ruta_csv, "w", encoding="utf-8") as archivo:
+        archivo.write("categoria,producto,stock,precio\n"
+                      "Camisas,Basica,7,\"12,50\"\n"
+                      "camisas,lino,2,30\n"
+                      "Tazas,Grande,-1,5\n"
+                      "tazas,chica,dos,5\n"
+                      ",sin categoria,1,1\n"
+                      "gorras,visera,4\n"
+                      "Gorras,Visera,4,9.5\n")
+    stock = {"camisas": {"basica": 1}}
+    precios = {"camisas": {"basica": 10.0}}
+    guardados = []
+    historial = historial_precios.HistorialPrecios()
+
+    agregados, actualizados, rechazados = importar_inventario_csv(
+        stock, precios, ruta_csv, lambda ruta, datos: guardados.append(ruta), historial)
+
+    assert (agregados, actualizados) == (2, 1)
+    assert [numero for numero, _ in rechazados] == [4, 5, 6, 7]
+    assert stock == {"camisas": {"basica": 7, "lino": 2}, "gorras": {"visera": 4}}
+    assert precios == {"camisas": {"basica": 12.5, "lino": 30.0}, "gorras": {"visera": 9.5}}
+    assert guardados == ["stock.json", "precios.json", "historial_precios.json"]
+    assert historial.precio_en("camisas", "basica", 0) == 10.0
+
+def test_exportar_e_importar_inventario_csv():
+    ruta_csv = "inventario_export_test.csv"
+    stock = {"zapatos": {"botas": 1, "mocasines": 0}, "camisas": {"basica": 3, "sin precio": 2}}
+    precios = {"zapatos": {"botas": 50.0, "mocasines": 45.5}, "camisas": {"basica": 10.0}}
+
+    assert inventario_csv.exportar_csv(ruta_csv, stock, precios) == 4
+    with open(ruta_csv, encoding="utf-8") as archivo:
+        assert archivo.readline().strip() == "categoria,producto,stock,precio"
+        assert archivo.readline().strip() == "camisas,basica,3,10.0"
+        assert archivo.readline().strip() == "camisas,sin precio,2,"
+
+    stock_nuevo, precios_nuevos = {}, {}
+    assert inventario_csv.importar_csv(ruta_csv, stock_nuevo, precios_nuevos) == (4, 0, [])
+    assert stock_nuevo == stock and precios_nuevos == precios
+    # Volver a importar el mismo archivo no cambia nada
+    assert inventario_csv.importar_csv(ruta_csv, stock_nuevo, precios_nuevos) == (0, 4, [])
+    assert stock_nuevo == stock and precios_nuevos == precios
+    os.remove(ruta_csv)
+
+def test_importar_inventario_csv_rechaza_precios_no_finitos():
+    assert inventario_csv.validar_fila(["camisas", "basica", "1", ""]) == ("camisas", "basica", 1, None)
+    for precio in ("nan", "inf"):
+        try:
+            inventario_csv.validar_fila(["camisas", "basica", "1", precio])
+            assert False, "debería rechazar un precio no finito"
+        except ValueError:
+            pass
+
+def test_ajuste_de_precios_por_categoria_y_en_todo_el_catalogo():
+    precios = {"camisas": {"basica": 10.0, "lino": 25.0}, "tazas": {"grande": 3.0}}
+
+    assert ajustes_precios.aplicar_ajuste(precios, *ajustes_precios.ajuste_porcentual(10), categorias=["camisas"]) == (2, [])
+    assert precios == {"camisas": {"basica": 11.0, "lino": 27.5}, "tazas": {"grande": 3.0}}
+
+    modificados, omitidos = ajustes_precios.aplicar_ajuste(precios, *ajustes_precios.ajuste_fijo(-5))
+    assert modificados == 2 and omitidos == [("tazas", "grande")]
+    assert precios == {"camisas": {"basica": 6.0, "lino": 22.5}, "tazas": {"grande": 3.0}}
+
+def test_ajuste_de_precios_rechaza_valores_no_finitos_y_cuenta_solo_cambios():
+    for valor in (float("nan"), float("inf")):
+        try:
+            ajustes_precios.ajuste_porcentual(valor)
+            assert False, "debería rechazar un ajuste no finito"
+        except ValueError:
+            pass
+    precios = {"camisas": {"basica": 10.0, "gratis": 0.0}, "tazas": {"grande": 1.5e308}}
+
+    # El precio en 0 no cambia y el que se desborda a infinito se omite
+    assert ajustes_precios.aplicar_ajuste(precios, *ajustes_precios.ajuste_porcentual(50)) == (1, [("tazas", "grande")])
+    assert precios == {"camisas": {"basica": 15.0, "gratis": 0.0}, "tazas": {"grande": 1.5e308}}
+
+def test_ajuste_de_precios_desde_archivo():
+    ruta_csv = "precios_test.csv"
+    with open(ruta_csv, "w", encoding="utf-8") as archivo:
+        archivo.write("categoria,producto,precio\nCamisas,BASICA,\"9,99\"\ncamisas,jean,10\ntazas,grande,-1\n"
+                      "tazas,grande,nan\ntazas,grande,3\n")
+    precios = {"camisas": {"basica": 10.0}, "tazas": {"grande": 3.0}}
+
+    modificados, rechazados = ajustes_precios.aplicar_archivo(ruta_csv, precios)
+
+    assert modificados == 1 and [numero for numero, _ in rechazados] == [3, 4, 5]
+    assert precios == {"camisas": {"basica": 9.99}, "tazas": {"grande": 3.0}}
+    os.remove(ruta_csv)
+
+def test_importar_usuarios_csv_deduplica_y_guarda_una_sola_vez():
+    ruta = "usuarios_test.csv"
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        archivo.write("email,nombre,contraseña\n"
+                      "Nueva@Ejemplo.com,Ana Perez,Clave1*\n"
+                      "viejo@ejemplo.com,Otro,Clave1*\n"
+                      "nueva@ejemplo.com,Ana Repetida,Clave1*\n"
+                      "sin-arroba.com,Nadie,Clave1*\n"
+                      "debil@ejemplo.com,Debil,clave\n"
+                      "incompleto@ejemplo.com,Sin Clave\n"
+                      "otro@ejemplo.com,Luis Gomez,Segura9!\n")
+    usuarios = {"viejo@ejemplo.com": {"nombre": "Viejo", "contraseña": "X", "rol": "cliente", "activo": True}}
+    guardados = []
+
+    nuevos, rechazados = importar_usuarios(usuarios, ruta, lambda ruta, datos: guardados.append(ruta))
+
+    assert list(nuevos) == ["nueva@ejemplo.com", "otro@ejemplo.com"]
+    assert usuarios["nueva@ejemplo.com"] == {"nombre": "Ana Perez", "contraseña": "Clave1*", "rol": "cliente", "activo": True}
+    assert [numero for numero, _ in rechazados] == [3, 4, 5, 6, 7]
+    assert len(guardados) == 1
+    with open(ruta + ".rechazados.csv", encoding="utf-8") as archivo:
+        assert len(archivo.readlines()) == 6
+    os.remove(ruta)
+    os.remove(ruta + ".rechazados.csv")
+
+def test_importar_usuarios_jsonl():
+    ruta = "usuarios_test.jsonl"
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        archivo.write('{"email": "a@ejemplo.com", "nombre": "A", "contraseña": "Clave1*"}\n')
+        archivo.write('{"email": "b@ejemplo.com", "nombre": "B"\n')
+        archivo.write('["no", "es", "un", "objeto"]\n')
+
+    nuevos, rechazados = reglas_usuarios.importar(ruta, {})
+
+    assert list(nuevos) == ["a@ejemplo.com"]
+    assert rechazados == [(2, "línea con formato inválido"), (3, "línea con formato inválido")]
+    os.remove(ruta)
+
+def test_importar_usuarios_json_acepta_un_arreglo(tmp_path):
+    ruta = str(tmp_path / "usuarios_test.json")
+    guardar_datos(ruta, [{"email": "a@ejemplo.com", "nombre": "A", "contraseña": "Clave1*"}, "no es un objeto"])
+    nuevos, rechazados = reglas_usuarios.importar(ruta, {})
+    assert list(nuevos) == ["a@ejemplo.com"] and rechazados == [(2, "línea con formato inválido")]
+
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        archivo.write('{"email": "a@ejemplo.com", "nombre": "A", "contraseña": "Clave1*"}\n')
+    guardados = []
+    assert importar_usuarios({}, ruta, lambda r, d: guardados.append(r)) is None
+    assert guardados == []
+
+def test_ventas_desde_fecha_busca_la_primera_por_biseccion(tmp_path, monkeypatch):
+    import TPO_FINAL
+    ruta = str(tmp_path / "historial_fechas_test.json")
+    guardar_datos(ruta, [{"id_venta": numero, "fecha": f"2025-01-{numero:02d}T10:00:00", "cliente_email": "a@b.com",
+                          "items": [], "costo_total": 1.0} for numero in range(1, 29)])
+    lecturas = []
+    leer_ventas = indice_ventas.leer_ventas
+    monkeypatch.setattr(indice_ventas, "leer_ventas", lambda *args: lecturas.append(args[1:]) or leer_ventas(*args))
+    monkeypatch.setattr(TPO_FINAL, "historial_para_admin", lambda: indice_ventas.HistorialEnDisco(ruta))
+
+    ventas = TPO_FINAL.ventas_desde_fecha(date(2025, 1, 25))
+
+    assert [venta["id_venta"] for venta in ventas] == [25, 26, 27, 28]
+    # Unas pocas lecturas de una venta para bisecar y una sola para el período
+    assert len(lecturas) <= 7 and lecturas[-1] == (24, 28)
+
+def test_historial_precios_busca_el_precio_vigente():
+    historial = historial_precios.HistorialPrecios()
+    assert historial.registrar("camisas", "basica", 10.0, 100)
+    assert historial.registrar("camisas", "basica", 12.5, 300)
+    assert not historial.registrar("camisas", "basica", 12.5, 400)  # mismo precio, no es un cambio
+    assert historial.registrar("camisas", "basica", 11.0, 200)  # cambio cargado tarde, se intercala
+
+    assert historial.precio_en("camisas", "basica", 50) is None
+    assert [historial.precio_en("camisas", "basica", t) for t in (100, 199, 250, 1000)] == [10.0, 10.0, 11.0, 12.5]
+    assert historial.precio_en("tazas", "grande", 1000) is None
+    assert historial.cambios_entre(150, 300) == [(200, "camisas", "basica", 10.0, 11.0), (300, "camisas", "basica", 11.0, 12.5)]
+
+    copia = historial_precios.HistorialPrecios.desde_formato_disco(codec.decodificar(codec.codificar(historial)))
+    assert copia.a_formato_disco() == {"camisas": {"basica": [[100, 200, 300], [1000, 1100, 1250]]}}
+
+def test_historial_precios_impacto_y_revalorizacion():
+    historial = historial_precios.HistorialPrecios()
+    historial.sincronizar({"camisas": {"basica": 10.0}, "tazas": {"grande": 5.0}}, modelo_ventas.fecha_a_segundos("2025-01-01T00:00:00"))
+    historial.registrar("camisas", "basica", 12.0, modelo_ventas.fecha_a_segundos("2025-03-01T00:00:00"))
+    item = lambda categoria, producto, cantidad, precio: {"categoria": categoria, "producto": producto, "cantidad": cantidad, "precio_unitario": precio}
+    ventas = [
+        {"fecha": "2025-02-10T10:00:00", "items": [item("camisas", "basica", 2, 10.0)]},
+        {"fecha": "2025-03-05T10:00:00", "items": [item("camisas", "basica", 3, 12.0), item("tazas", "grande", 1, 5.0)]},
+    ]
+
+    impacto = historial_precios.impacto_cambios(historial, ventas, modelo_ventas.fecha_a_segundos("2025-02-15T00:00:00"),
+                                                modelo_ventas.fecha_a_segundos("2025-03-31T00:00:00"))
+    assert [(f["producto"], f["anterior"], f["nuevo"], f["unidades"], f["diferencia"]) for f in impacto] == [("basica", 10.0, 12.0, 3, 6.0)]
+    assert historial_precios.revalorizar(historial, ventas, modelo_ventas.fecha_a_segundos("2025-04-01T00:00:00")) == (61.0, 65.0, 0)
+
+def test_primer_cambio_de_precio_conserva_el_precio_anterior():
+    historial = historial_precios.HistorialPrecios()
+    precios = {"camisas": {"basica": 10.0}, "tazas": {"grande": 5.0}}
+    assert registrar_precios_base(precios, historial) == 2
+    assert registrar_precios_base(precios, historial) == 0
+
+    momento = modelo_ventas.fecha_a_segundos("2025-03-01T00:00:00")
+    historial.registrar("camisas", "basica", 12.0, momento)
+    # El precio de base no es un cambio, pero es el anterior del primero
+    assert historial.cambios_entre(0, momento) == [(momento, "camisas", "basica", 10.0, 12.0)]
+    venta = {"fecha": "2025-04-01T10:00:00", "items": [
+        {"categoria": "tazas", "producto": "grande", "cantidad": 2, "precio_unitario": 4.0}]}
+    assert historial_precios.revalorizar(historial, [venta], momento) == (8.0, 10.0, 0)
+
+def test_promociones_compiladas_por_categoria_y_producto():
+    reglas = promociones.compilar([
+        {"nombre": "3x2 en chanclas", "tipo": "lleva_paga", "categoria": "chanclas", "lleva": 3, "paga": 2},
+        {"nombre": "10% en zapatos sobre $200", "tipo": "porcentaje", "categoria": "zapatos", "porcentaje": 10, "minimo": 200},
+        {"nombre": "$5 en la taza grande", "tipo": "monto", "categoria": "tazas", "producto": "grande", "monto": 5},
+        {"nombre": "mal escrita", "tipo": "2x1", "categoria": "tazas"},
+    ])
+    assert set(reglas["categorias"]) == {"chanclas", "zapatos"}
+    assert set(reglas["productos"]) == {("tazas", "grande")}
+
+    carrito = [("chanclas", "playa", 2, 10.0), ("chanclas", "piscina", 2, 6.0), ("zapatos", "botas", 1, 150.0),
+               ("tazas", "grande", 1, 4.0), ("tazas", "chica", 1, 3.0)]
+    # 4 chanclas: una gratis, la más barata. Las botas no llegan al mínimo. La taza grande se descuenta hasta su precio.
+    assert promociones.aplicar(reglas, carrito) == [("3x2 en chanclas", 6.0), ("$5 en la taza grande", 4.0)]
+    assert promociones.aplicar(reglas, [("zapatos", "botas", 2, 150.0)]) == [("10% en zapatos sobre $200", 30.0)]
+
+def test_promociones_acumuladas_no_superan_el_subtotal_del_carrito():
+    reglas = promociones.compilar([
+        {"nombre": "$8 en la taza grande", "tipo": "monto", "categoria": "tazas", "producto": "grande", "monto": 8},
+        {"nombre": "50% en tazas", "tipo": "porcentaje", "categoria": "tazas", "porcentaje": 50},
+    ])
+    assert promociones.aplicar(reglas, [("tazas", "grande", 1, 10.0)]) == [("$8 en la taza grande", 8.0), ("50% en tazas", 2.0)]
+
+def test_unidades_por_producto_no_cuentan_las_promociones():
+    venta = {"id_venta": 1, "fecha": "2025-06-01T10:00:00", "cliente_email": "a@a.com", "costo_total": 20.0, "items": [
+        {"categoria": "chanclas", "producto": "playa", "cantidad": 3, "precio_unitario": 10.0, "subtotal": 30.0},
+        {"categoria": "promocion", "producto": "3x2 en chanclas", "cantidad": 1, "precio_unitario": -10.0, "subtotal": -10.0}]}
+    ruta_libro = "libro_promociones_test.libro"
+    libro = libro_ventas.LibroVentas(ruta_libro)
+    libro.agregar(venta)
+    columnar = historial_columnar.HistorialColumnar()
+    columnar.append(venta)
+
+    assert libro.unidades_por_producto() == {("chanclas", "playa"): 3}
+    assert columnar.unidades_por_producto() == {("chanclas", "playa"): 3}
+    libro.cerrar()
+    _borrar_libro(ruta_libro)
+
+def test_resumen_del_carrito_agrega_los_descuentos_a_los_items():
+    reglas = promociones.compilar([{"nombre": "3x2 en chanclas", "tipo": "lleva_paga", "categoria": "chanclas", "lleva": 3, "paga": 2}])
+    carrito = {"chanclas:playa": {"cantidad": 3, "precio_unitario_registrado": 10.0}}
+
+    costo_total, items = mostrar_resumen_carrito_modificado(carrito, reglas)
+
+    assert costo_total == 20.0
+    assert items[-1] == {"categoria": "promocion", "producto": "3x2 en chanclas", "cantidad": 1, "precio_unitario": -10.0, "subtotal": -10.0}
+    resumen = resumen_ventas.crear_resumen()
+    resumen_ventas.registrar_venta(resumen, {"fecha": "2025-06-01T10:00:00", "items": items, "costo_total": costo_total})
+    assert resumen["dia"]["2025-06-01"] == {"ingresos": 20.0, "unidades": 3, "ventas": 1}
+
+def test_conciliacion_de_stock_por_fragmentos_del_historial(monkeypatch):
+    monkeypatch.setattr(conciliacion_stock, "VENTAS_POR_FRAGMENTO", 2)
+    ruta = "conciliacion_test.json"
+    ventas = [_venta_de_prueba(id_venta, "2025-06-01T10:00:00", 10.0) for id_venta in range(1, 6)]
+    ventas[0]["items"].append({"categoria": "promocion", "producto": "2x1", "cantidad": 1, "precio_unitario": -10.0, "subtotal": -10.0})
+    ventas[1]["items"].append({"categoria": "tazas", "producto": "grande", "cantidad": 4, "precio_unitario": 5.0, "subtotal": 20.0})
+    guardar_datos(ruta, ventas, compacto=True)
+
+    tareas = conciliacion_stock.fragmentos(ruta)
+    assert [tarea[2:] for tarea in tareas] == [(0, 2), (2, 4), (4, 5)]
+    vendidas = conciliacion_stock.unidades_vendidas(tareas, procesos=2)
+    assert vendidas == {("camisas", "basica"): 5, ("tazas", "grande"): 4}
+
+    base = {"camisas": {"basica": 8}, "tazas": {"grande": 3}, "gorras": {"visera": 2}}
+    actual = {"camisas": {"basica": 3}, "tazas": {"grande": 0}, "gorras": {"visera": 2}}
+    assert conciliacion_stock.conciliar(base, actual, vendidas) == [
+        {"categoria": "tazas", "producto": "grande", "inicial": 3, "vendidas": 4, "esperado": -1, "actual": 0, "diferencia": 1}]
+    os.remove(ruta)
+    os.remove(indice_ventas.ruta_indice(ruta))
+
+def test_conciliacion_de_archivos_usa_los_parches_y_no_corre_con_el_wal_pendiente():
+    ruta_base, ruta_stock, ruta_historial, ruta_wal = "base_conc_test.json", "stock_conc_test.json", "hist_conc_test.json", "conc_test.wal"
+    guardar_datos(ruta_base, {"camisas": {"basica": 8}})
+    guardar_datos(ruta_stock, {"camisas": {"basica": 8}})
+    guardar_datos(ruta_historial, [_venta_de_prueba(1, "2025-06-01T10:00:00", 10.0)], compacto=True)
+    parches.agregar(parches.ruta_de(ruta_stock), {"camisas": {"basica": 7}})
+
+    assert conciliacion_stock.conciliar_archivos(ruta_base, ruta_stock, ruta_historial, procesos=1, ruta_wal=ruta_wal) == []
+
+    wal.agregar(ruta_wal, {"venta": _venta_de_prueba(2, "2025-06-01T11:00:00", 10.0), "stock": {"camisas": {"basica": 6}}})
+    try:
+        conciliacion_stock.conciliar_archivos(ruta_base, ruta_stock, ruta_historial, procesos=1, ruta_wal=ruta_wal)
+        assert False, "no debería conciliar con compras en el WAL"
+    except RuntimeError:
+        pass
+    wal.vaciar(ruta_wal)
+    parches.descartar(parches.ruta_de(ruta_stock))
+    for ruta in (ruta_base, ruta_stock, ruta_historial, indice_ventas.ruta_indice(ruta_historial)):
+        os.remove(ruta)
+
+def test_conciliacion_de_stock_con_historial_segmentado():
+    directorio = "conciliacion_segmentos_test"
+    historial = historial_segmentado.HistorialSegmentado(directorio, max_ventas_por_segmento=2)
+    for id_venta in range(1, 6):
+        historial.append(_venta_de_prueba(id_venta, "2025-06-01T10:00:00", 10.0))
+
+    tareas = conciliacion_stock.fragmentos("no_existe.json", directorio)
+    assert len(tareas) == 3 and tareas[0][1].endswith(".gz")
+    assert conciliacion_stock.unidades_vendidas(tareas, procesos=1) == {("camisas", "basica"): 5}
+    shutil.rmtree(directorio)
+
+def test_umbrales_de_stock_por_producto_categoria_y_defecto():
+    umbrales = stock_bajo.compilar_umbrales({"por_defecto": 1, "categorias": {"camisas": 5, "tazas": -2},
+                                             "productos": {"camisas": {"lino": 0}}})
+    assert stock_bajo.umbral(umbrales, "camisas", "lino") == 0
+    assert stock_bajo.umbral(umbrales, "camisas", "basica") == 5
+    assert stock_bajo.umbral(umbrales, "tazas", "grande") == 1
+
+def test_indice_stock_bajo_se_actualiza_con_compras_y_modificaciones(monkeypatch):
+    umbrales = stock_bajo.compilar_umbrales({"categorias": {"camisas": 3}})
+    stock = {"camisas": {"basica": 5, "lino": 2}, "tazas": {"grande": 0, "chica": 4}}
+    assert stock_bajo.productos_bajos(stock, umbrales) == [("tazas", "grande", 0, 0), ("camisas", "lino", 2, 3)]
+
+    actualizar_stock({"camisas:basica": {"cantidad": 3}, "tazas:chica": {"cantidad": 1}}, stock)
+    assert stock_bajo.productos_bajos(stock, umbrales) == [("tazas", "grande", 0, 0), ("camisas", "basica", 2, 3),
+                                                           ("camisas", "lino", 2, 3)]
+
+    respuestas = iter(["camisas", "lino", "10"])
+    monkeypatch.setattr("builtins.input", lambda _: next(respuestas))
+    monkeypatch.setattr("TPO_FINAL.guardar_datos", lambda ruta, datos: None)
+    modificar_stock_producto(stock)
+    assert stock_bajo.productos_bajos(stock, umbrales) == [("tazas", "grande", 0, 0), ("camisas", "basica", 2, 3)]
+    stock_bajo.invalidar(stock)